@@ -5,15 +5,44 @@ A web-based chat interface for real estate assistance
 """
 
 import os
+import json
+import atexit
+import base64
+import contextlib
+import hashlib
+import hmac
+import io
 import logging
-from datetime import datetime
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
 
-from flask import Flask, request, jsonify, session
+_import_started = time.perf_counter()
+
+import click
+from flask import Flask, Response, g, has_app_context, has_request_context, request, jsonify, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import DeclarativeBase, Session
 
 # Import AI chat model
-from chat_model import get_ai_response
+from chat_model import (anchor_history, get_ai_reply, stream_ai_response, forget_conversation, generation_budget,
+                        registry, batch_scheduler, response_cache, inference_client, intent_router)
+from intent_router import CATEGORY_LABELS, CATEGORY_MATCHER
+from chat_search import create_search_index, decode_offset_cursor, encode_offset_cursor, search_terms
+from chat_transfer import encode_ndjson, export_records, import_ndjson
+from retention import ChatPurger, Purge, archive_inactive_sessions, delete_sessions, purge_chunk
+from session_cache import ActivityTracker, SessionCache, SessionInfo
+from sqlite_tuning import (connection_pragmas, create_read_engine, enable_wal, is_sqlite_file, set_pragmas,
+                           writer_engine_options)
+from job_queue import ChatJobQueue, QueueFullError
+from static_assets import IMMUTABLE_CACHE_CONTROL, ShellPage, bundle_page_assets
+from metrics import (REGISTRY, IMPORT_SECONDS, REQUESTS_IN_FLIGHT, REQUEST_SECONDS, DB_QUERIES,
+                     DB_QUERY_SECONDS, process_memory, record_timing, server_timing_header,
+                     start_request_timing, stop_request_timing, timed)
+from write_behind import WriteBehindBuffer
 import re
 
 # Database setup
@@ -32,12 +61,19 @@ class ChatSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    # Relationship to messages
-    messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade='all, delete-orphan')
+    # Relationship to messages (deleted by the database's ON DELETE CASCADE, not loaded to delete them)
+    messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade='all, delete-orphan',
+                               passive_deletes=True)
     
-    def to_dict(self):
-        message_count = len(self.messages)
-        last_message = self.messages[-1] if self.messages else None
+    # Keyset pagination of the sidebar listing
+    __table_args__ = (
+        db.Index('ix_chat_sessions_last_activity_id', 'last_activity', 'id'),
+    )
+    
+    def to_dict(self, message_count=None, last_message_at=None):
+        # Count in SQL rather than loading every message
+        if message_count is None:
+            message_count = ChatMessage.query.filter_by(session_id=self.session_id).count()
         
         # Create a more subtle preview with just the time
         time_preview = self.last_activity.strftime('%H:%M') if self.last_activity else ''
@@ -49,6 +85,7 @@ class ChatSession(db.Model):
             'created_at': self.created_at.isoformat(),
             'last_activity': self.last_activity.isoformat(),
             'message_count': message_count,
+            'last_message_at': last_message_at.isoformat() if last_message_at else None,
             'last_message_preview': time_preview
         }
 
@@ -56,11 +93,17 @@ class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
     
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(255), db.ForeignKey('chat_sessions.session_id'), nullable=False, index=True)
+    session_id = db.Column(db.String(255), db.ForeignKey('chat_sessions.session_id', ondelete='CASCADE'),
+                           nullable=False, index=True)
     message_text = db.Column(db.Text, nullable=False)
     is_user = db.Column(db.Boolean, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    # Cursor pagination of a session's history
+    __table_args__ = (
+        db.Index('ix_chat_messages_session_timestamp_id', 'session_id', 'timestamp', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -70,6 +113,74 @@ class ChatMessage(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+class ArchivedSession(db.Model):
+    __tablename__ = 'chat_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    session_name = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_activity = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    # The session and its messages as gzipped NDJSON in the export format
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+class CachedResponse(db.Model):
+    __tablename__ = 'response_cache'
+    
+    cache_key = db.Column(db.String(64), primary_key=True)
+    response_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class DatabaseResponseStore:
+    """Persistent response cache tier backed by the application database
+    
+    Every `prune_every` writes, rows older than `max_age` seconds and the oldest
+    beyond `max_rows` are deleted, so the table stays bounded like the in-memory LRU.
+    """
+    
+    def __init__(self, max_rows=100000, max_age=3600, prune_every=100):
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key, max_age):
+        # A session of its own, closed before the caller goes on to generate: a request's
+        # db.session would keep the (in SQLite production mode, only) writer connection meanwhile
+        with database_context(), Session(read_engine or db.engine) as lookup:
+            cached = lookup.get(CachedResponse, key)
+            if cached is None or (datetime.utcnow() - cached.created_at).total_seconds() > max_age:
+                return None
+            return cached.response_text
+    
+    def set(self, key, value):
+        with database_context():
+            db.session.merge(CachedResponse(cache_key=key, response_text=value, created_at=datetime.utcnow()))
+            db.session.commit()
+        
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+    
+    def prune(self):
+        """Delete expired rows and the oldest beyond max_rows; returns how many"""
+        table = CachedResponse.__table__
+        with database_context():
+            deleted = db.session.execute(db.delete(table).where(
+                table.c.created_at < datetime.utcnow() - timedelta(seconds=self.max_age)
+            )).rowcount
+            # Older than the max_rows-th newest row (NULL, deleting nothing, while there are fewer)
+            oldest_kept = (db.select(table.c.created_at).order_by(table.c.created_at.desc())
+                           .offset(self.max_rows - 1).limit(1).scalar_subquery())
+            deleted += db.session.execute(db.delete(table).where(table.c.created_at < oldest_kept)).rowcount
+            db.session.commit()
+        return deleted
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -86,32 +197,186 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# SQLite production mode: WAL, tuned pragmas, one serialized writer connection and a read-only pool
+SQLITE_OPTIMIZED = is_sqlite_file(app.config["SQLALCHEMY_DATABASE_URI"]) and \
+    os.environ.get("SQLITE_OPTIMIZED", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_PRAGMAS = connection_pragmas(
+    busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+    synchronous=os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    cache_mb=float(os.environ.get("SQLITE_CACHE_MB", 64)),
+    mmap_mb=float(os.environ.get("SQLITE_MMAP_MB", 256))
+)
+if SQLITE_OPTIMIZED:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = writer_engine_options(SQLITE_BUSY_TIMEOUT_MS)
+
+# Engine for reads in SQLite production mode (None: reads share db.session)
+read_engine = None
+
+def database_context():
+    """An app context for database work, reusing the current one (and its session) if there is one
+    
+    A nested context would open a second session, which in SQLite production mode
+    queues for the single writer connection the outer session may be holding.
+    """
+    return contextlib.nullcontext() if has_app_context() else app.app_context()
+
 # Initialize database
 db.init_app(app)
 
+# Keep cached responses across restarts and share them between workers
+if response_cache is not None and os.environ.get("RESPONSE_CACHE_PERSIST", "false").lower() in ("1", "true", "yes"):
+    response_cache.store = DatabaseResponseStore(
+        max_rows=int(os.environ.get("RESPONSE_CACHE_PERSIST_ROWS", 100000)),
+        max_age=response_cache.ttl
+    )
+
+# Most earlier messages loaded as context (0 answers each message on its own); the model's
+# context window usually binds first and drops the oldest turns in chunks
+CONVERSATION_HISTORY_LIMIT = int(os.environ.get("CONVERSATION_HISTORY_LIMIT", 200))
+
+# Conversations generate one at a time on their session's cached state; only context-free prompts are batched
+if batch_scheduler is not None and CONVERSATION_HISTORY_LIMIT > 0:
+    logger.warning("INFERENCE_BATCHING has no effect while conversation history is on (CONVERSATION_HISTORY_LIMIT=0 "
+                   "turns it off)")
+
+# Bearer token for the bulk export/import endpoints, which cover every user's chats (unset disables them)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Rows per transaction when importing chat data
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 5000))
+
+# Rows per transaction when purging; larger deletes finish in the background
+PURGE_CHUNK_SIZE = int(os.environ.get("PURGE_CHUNK_SIZE", 5000))
+
+# Sessions inactive for this many days are moved to the archive table (0 disables)
+RETENTION_DAYS = float(os.environ.get("RETENTION_DAYS", 0))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 100))
+
+# A chat exchange waiting to be written
+ChatTurn = namedtuple('ChatTurn', 'session_id user_message bot_response received_at responded_at')
+
+# Session metadata for chat turns and switches, with last_activity bumps written in coalesced batches
+session_cache = SessionCache(
+    max_entries=int(os.environ.get("SESSION_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("SESSION_CACHE_TTL", 300))
+)
+session_activity = ActivityTracker(
+    lambda updates: flush_session_activity(updates),
+    flush_interval=float(os.environ.get("ACTIVITY_FLUSH_INTERVAL", 1.0))
+)
+session_activity.start()
+atexit.register(session_activity.stop)  # runs after the write-behind flush below, which may add bumps
+
+# Optionally batch chat writes on a background flusher instead of writing per request
+chat_writes = None
+if os.environ.get("CHAT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes"):
+    chat_writes = WriteBehindBuffer(
+        lambda turns: flush_chat_turns(turns),
+        max_pending=int(os.environ.get("WRITE_BEHIND_MAX_PENDING", 1000)),
+        flush_interval=float(os.environ.get("WRITE_BEHIND_INTERVAL", 0.5))
+    )
+    chat_writes.start()
+    atexit.register(chat_writes.stop)
+
+# Background purges and retention
+chat_purger = ChatPurger(
+    lambda purge: run_purge_chunk(purge),
+    archive_chunk=(lambda: archive_chunk()) if RETENTION_DAYS > 0 else None,
+    retention_interval=float(os.environ.get("RETENTION_INTERVAL", 3600))
+)
+chat_purger.start()
+atexit.register(chat_purger.stop)
+
+# Dedicated inference workers for queued chat jobs
+chat_jobs = ChatJobQueue(
+    workers=int(os.environ.get("CHAT_JOB_WORKERS", 2)),
+    max_queue_size=int(os.environ.get("CHAT_JOB_QUEUE_SIZE", 32))
+)
+
+# Load the chat model at startup instead of on the first chat message
+if os.environ.get("MODEL_WARMUP", "false").lower() in ("1", "true", "yes"):
+    registry.warm_up_async()
+
+# Report per-stage durations to the browser in a Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Component statistics exposed on /metrics
+REGISTRY.register_collector('chat_jobs', 'Chat job queue', chat_jobs.stats)
+if batch_scheduler is not None:
+    REGISTRY.register_collector('inference_batching', 'Inference micro-batching', batch_scheduler.stats)
+if response_cache is not None:
+    REGISTRY.register_collector('response_cache', 'Response cache', response_cache.stats)
+if chat_writes is not None:
+    REGISTRY.register_collector('write_behind', 'Write-behind buffer', chat_writes.stats)
+REGISTRY.register_collector('retention', 'Background purges and retention', chat_purger.stats)
+REGISTRY.register_collector('session_cache', 'Session metadata cache', session_cache.stats)
+REGISTRY.register_collector('session_activity', 'Coalesced last_activity updates', session_activity.stats)
+if intent_router is not None:
+    REGISTRY.register_collector('intent_router', 'Intent routing and FAQ answers', intent_router.stats)
+if inference_client is not None:
+    REGISTRY.register_collector('inference_pool', 'Out-of-process inference pool', lambda: inference_pool_stats())
+REGISTRY.register_collector(
+    'conversation_cache', 'Conversation key/value cache',
+    lambda: next((m.conversation_cache.stats() for m in registry.loaded_models()
+                  if hasattr(m, 'conversation_cache')), None))
+
+def inference_pool_stats():
+    """Worker states of the inference pool, or None if it cannot be reached"""
+    try:
+        return inference_client.stats()
+    except Exception as e:
+        logger.error(f"Inference pool stats error: {e}")
+        return None
+
+def metrics_endpoint():
+    """Label for per-endpoint metrics; work outside a request is counted as background"""
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unknown'
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.request_timings = start_request_timing()
+    REQUESTS_IN_FLIGHT.inc(endpoint=metrics_endpoint())
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_SECONDS.observe(elapsed, endpoint=metrics_endpoint(), method=request.method,
+                            status=response.status_code)
+    if SERVER_TIMING:
+        timings = dict(g.request_timings, total=elapsed)
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'request_started' in g:
+        REQUESTS_IN_FLIGHT.dec(endpoint=metrics_endpoint())
+    stop_request_timing()
+
+# The start time lives on the statement's execution context, so a statement that raises leaves nothing behind
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    endpoint = metrics_endpoint()
+    DB_QUERIES.inc(endpoint=endpoint)
+    DB_QUERY_SECONDS.observe(elapsed, endpoint=endpoint)
+    record_timing('db', elapsed)
+
 def generate_contextual_session_name(user_message):
     """Generate a contextual session name based on the user's first message"""
     # Clean the message - remove extra whitespace and normalize
     cleaned_message = re.sub(r'\s+', ' ', user_message.strip())
     
-    # Real estate keywords and patterns to create meaningful names
-    real_estate_keywords = {
-        r'\bbuy|buying|purchase\b': 'Buying Property',
-        r'\bsell|selling|sale\b': 'Selling Property',
-        r'\brent|rental|renting\b': 'Rental Inquiry',
-        r'\binvest|investment|investing\b': 'Investment Advice',
-        r'\bmarket|price|value|appraisal\b': 'Market Analysis',
-        r'\bmortgage|loan|financing\b': 'Financing Help',
-        r'\bcondo|apartment|house|home\b': 'Property Search',
-        r'\bneighborhood|area|location\b': 'Location Guide',
-        r'\bcommercial|office|retail\b': 'Commercial Real Estate',
-        r'\bfirst.time|first time\b': 'First-Time Buyer'
-    }
-    
-    # Check for real estate patterns
-    for pattern, category in real_estate_keywords.items():
-        if re.search(pattern, cleaned_message, re.IGNORECASE):
-            return f"{category} - {datetime.now().strftime('%m/%d %H:%M')}"
+    # Real estate categories (intent_router.py) make meaningful names
+    category = CATEGORY_MATCHER.first(cleaned_message)
+    if category:
+        return f"{CATEGORY_LABELS[category]} - {datetime.now().strftime('%m/%d %H:%M')}"
     
     # If no specific patterns, use first few words
     words = cleaned_message.split()
@@ -127,85 +392,407 @@ def generate_contextual_session_name(user_message):
         # Fallback to generic name
         return f"Chat - {datetime.now().strftime('%m/%d %H:%M')}"
 
+def current_chat_session_id():
+    """Return the current session ID, assigning a new one if needed (the row is written with the first turn)"""
+    # Generate or get session ID
+    if 'session_id' not in session:
+        import uuid
+        session['session_id'] = str(uuid.uuid4())
+    return session['session_id']
+
+def load_session_info(session_ids):
+    """SessionInfo of the sessions that exist, from the cache and one query for the rest"""
+    found = {}
+    missing = []
+    for session_id in session_ids:
+        info = session_cache.get(session_id)
+        if info is not None:
+            found[session_id] = info
+        else:
+            missing.append(session_id)
+    
+    if missing:
+        rows = read_session().execute(
+            db.select(ChatSession.session_id, ChatSession.session_name, ChatSession.last_activity)
+            .where(ChatSession.session_id.in_(missing))
+        ).all()
+        for row in rows:
+            info = SessionInfo(*row)
+            session_cache.put(info)
+            found[info.session_id] = info
+    return found
+
+def touch_session(session_id, when):
+    """Bump a session's last_activity with the next coalesced flush rather than a write now"""
+    session_activity.touch(session_id, when)
+    session_cache.touch(session_id, when)
+
+def flush_session_activity(updates):
+    """Write coalesced last_activity bumps in one bulk UPDATE"""
+    with database_context():
+        sessions_table = ChatSession.__table__
+        db.session.execute(
+            db.update(sessions_table)
+            .where(sessions_table.c.session_id == db.bindparam('target_session_id'),
+                   sessions_table.c.last_activity < db.bindparam('activity'))
+            .values(last_activity=db.bindparam('activity')),
+            [{'target_session_id': session_id, 'activity': when} for session_id, when in updates.items()]
+        )
+        db.session.commit()
+
+def insert_new_sessions(rows):
+    """Insert sessions, skipping any that a concurrent request created first; returns the session_ids inserted"""
+    dialect_insert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(db.engine.dialect.name)
+    if dialect_insert is None:
+        db.session.execute(db.insert(ChatSession), rows)
+        return {row['session_id'] for row in rows}
+    
+    return set(db.session.execute(
+        dialect_insert(ChatSession).values(rows)
+        .on_conflict_do_nothing(index_elements=['session_id'])
+        .returning(ChatSession.session_id)
+    ).scalars())
+
+def save_chat_turns(turns):
+    """Write chat turns in one transaction: missing sessions, placeholder renames and message pairs
+    
+    Sessions known to exist come from the session cache, and their last_activity
+    bumps go to the activity tracker, so most turns only insert their messages.
+    """
+    existing = load_session_info({turn.session_id for turn in turns})
+    
+    new_sessions = {}
+    renames = {}
+    touches = {}
+    message_rows = []
+    for turn in turns:
+        info = existing.get(turn.session_id)
+        if info is None:
+            # Create new session in database with contextual name
+            new_sessions.setdefault(turn.session_id, {
+                'session_id': turn.session_id,
+                'session_name': generate_contextual_session_name(turn.user_message),
+                'created_at': turn.received_at,
+                'last_activity': turn.responded_at
+            })['last_activity'] = turn.responded_at
+        elif info.session_name.startswith('New Chat -') or turn.session_id in renames:
+            # The first message names a placeholder session
+            renames.setdefault(turn.session_id, {
+                'target_session_id': turn.session_id,
+                'contextual_name': generate_contextual_session_name(turn.user_message)
+            })['last_activity'] = turn.responded_at
+        else:
+            touches[turn.session_id] = turn.responded_at
+        
+        message_rows.append({'session_id': turn.session_id, 'message_text': turn.user_message,
+                             'is_user': True, 'timestamp': turn.received_at})
+        message_rows.append({'session_id': turn.session_id, 'message_text': turn.bot_response,
+                             'is_user': False, 'timestamp': turn.responded_at})
+    
+    try:
+        if new_sessions:
+            # Two first turns of a new session (a double submit, chat and stream) both find it missing
+            inserted = insert_new_sessions(list(new_sessions.values()))
+            for session_id in set(new_sessions) - inserted:
+                touches[session_id] = new_sessions.pop(session_id)['last_activity']
+        if renames:
+            # Update session name if it's still using the placeholder "New Chat" format
+            sessions_table = ChatSession.__table__
+            db.session.execute(
+                db.update(sessions_table)
+                .where(sessions_table.c.session_id == db.bindparam('target_session_id'))
+                .values(
+                    last_activity=db.bindparam('last_activity'),
+                    session_name=db.case(
+                        (sessions_table.c.session_name.like('New Chat -%'), db.bindparam('contextual_name')),
+                        else_=sessions_table.c.session_name
+                    )
+                ),
+                list(renames.values())
+            )
+        db.session.execute(db.insert(ChatMessage), message_rows)
+        db.session.commit()
+    except Exception:
+        # A cached session may have been deleted by another process; look them up again next time
+        db.session.rollback()
+        session_cache.invalidate(existing)
+        raise
+    
+    for row in new_sessions.values():
+        session_cache.put(SessionInfo(row['session_id'], row['session_name'], row['last_activity']))
+    for row in renames.values():
+        session_cache.put(SessionInfo(row['target_session_id'], row['contextual_name'], row['last_activity']))
+    for session_id, when in touches.items():
+        touch_session(session_id, when)
+
+def flush_chat_turns(turns):
+    """Write-behind flush of buffered chat turns"""
+    with database_context():
+        save_chat_turns(turns)
+
+def persist_chat_turn(session_id, user_message, bot_response, received_at):
+    """Store a completed chat turn, directly or through the write-behind buffer"""
+    turn = ChatTurn(session_id, user_message, bot_response, received_at, datetime.utcnow())
+    if chat_writes is not None:
+        chat_writes.add(turn)
+    else:
+        save_chat_turns([turn])
+
+def read_session():
+    """Session for reads that need not see this request's uncommitted writes
+    
+    In SQLite production mode it uses the read-only pool, so reads never queue
+    for the writer connection; otherwise it is db.session.
+    """
+    if read_engine is None:
+        return db.session
+    if 'read_session' not in g:
+        g.read_session = Session(read_engine)
+    return g.read_session
+
+@app.teardown_request
+@app.teardown_appcontext
+def close_read_session(exc=None):
+    read = g.pop('read_session', None)
+    if read is not None:
+        read.close()
+
+def load_conversation_history(session_id):
+    """Recent messages of a session, oldest first, as context for the model"""
+    if CONVERSATION_HISTORY_LIMIT <= 0:
+        return None
+    
+    total_messages = db.select(func.count(ChatMessage.id)).where(ChatMessage.session_id == session_id)
+    rows = read_session().execute(
+        db.select(ChatMessage, total_messages.scalar_subquery()).where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(CONVERSATION_HISTORY_LIMIT)
+    ).all()
+    if not rows:
+        return []
+    
+    recent_messages = [msg.to_dict() for msg, _ in reversed(rows)]
+    return anchor_history(recent_messages, rows[0][1])
+
+def run_chat_job(session_id, user_message, received_at, budget=None):
+    """Generate and store a chat turn on a job worker thread"""
+    with app.app_context():
+        with timed('history'):
+            conversation_history = load_conversation_history(session_id)
+            read_session().commit()  # release the connection during generation
+        
+        with timed('inference'):
+            reply = get_ai_reply(user_message, conversation_history, session_id, budget)
+        with timed('persist'):
+            persist_chat_turn(session_id, user_message, reply.text, received_at)
+        
+        return {'response': reply.text, 'session_id': session_id, 'generation': reply.generation}
+
+def request_chat_message(data):
+    """The stripped message of a chat request body, or None if it has none"""
+    message = data.get('message') if isinstance(data, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return None
+    return message.strip()
+
+def request_generation_budget(endpoint, data):
+    """The endpoint's generation budget, tightened by the request's optional latency_budget_ms"""
+    latency_ms = data.get('latency_budget_ms')
+    if latency_ms is not None and (isinstance(latency_ms, bool) or not isinstance(latency_ms, (int, float))
+                                   or latency_ms <= 0):
+        raise ValueError('latency_budget_ms must be a positive number')
+    return generation_budget(endpoint, latency_ms)
+
+def is_admin_request():
+    """Whether the request carries the admin bearer token"""
+    supplied = request.headers.get('Authorization', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {ADMIN_TOKEN}".encode('utf-8'))
+
+def export_chat_data(compress=False):
+    """NDJSON chunks of every session and its messages, including writes still buffered"""
+    if chat_writes is not None:
+        chat_writes.flush()
+    session_activity.flush()
+    records = export_records(read_session(), ChatSession.__table__, ChatMessage.__table__)
+    return encode_ndjson(records, compress)
+
+def import_chat_data(stream, batch_size=None):
+    """Bulk-import an NDJSON export from a binary stream; returns the import report"""
+    report = import_ndjson(db.session, ChatSession.__table__, ChatMessage.__table__, stream,
+                           batch_size or IMPORT_BATCH_SIZE)
+    forget_conversation()
+    return report
+
+def run_purge_chunk(purge):
+    """One chunk of a background purge"""
+    with database_context():
+        more = purge_chunk(db.session, ChatSession.__table__, ChatMessage.__table__, purge, PURGE_CHUNK_SIZE)
+    if purge.session_id is None:
+        session_cache.clear()
+    return more
+
+def start_purge(purge):
+    """Delete the first chunk now and leave the rest, if any, to the background purger"""
+    if purge_chunk(db.session, ChatSession.__table__, ChatMessage.__table__, purge, PURGE_CHUNK_SIZE):
+        chat_purger.submit(purge)
+        return True
+    return False
+
+def archive_chunk(days=None):
+    """Archive one batch of sessions inactive for longer than the retention period"""
+    cutoff = datetime.utcnow() - timedelta(days=days or RETENTION_DAYS)
+    with database_context():
+        archived = archive_inactive_sessions(db.session, ChatSession.__table__, ChatMessage.__table__,
+                                             ArchivedSession.__table__, cutoff, ARCHIVE_BATCH_SIZE)
+    if archived:
+        session_cache.clear()
+    return archived
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to, per connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def encode_cursor(timestamp, row_id):
+    """Opaque pagination cursor for a (timestamp, id) keyset position"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def ensure_indexes():
+    """Create indexes added after a table was first created (create_all only creates missing tables)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def bundle_shell_assets(html):
+    """Point the page at fingerprinted bundles of its scripts and stylesheet"""
+    html, bundles = bundle_page_assets(html, app.static_folder)
+    asset_bundles.update(bundles)
+    return html
+
+# Bundles by filename; older builds stay servable for pages still open in browsers
+asset_bundles = {}
+shell_page = ShellPage('index.html', rewrite=bundle_shell_assets)
+
+def compressed_response(asset, cache_control):
+    """Serve a precompressed asset in the best encoding the client accepts, or 304 if unchanged"""
+    if request.if_none_match.contains(asset.etag):
+        response = Response(status=304)
+    else:
+        accepted = {encoding for encoding, quality in request.accept_encodings if quality > 0}
+        encoding, body = asset.negotiate(accepted)
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(asset.etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', enable_sqlite_foreign_keys)
+    if SQLITE_OPTIMIZED:
+        set_pragmas(db.engine, SQLITE_PRAGMAS)
+        enable_wal(db.engine)
+        read_engine = create_read_engine(db.engine.url, int(os.environ.get("SQLITE_READ_POOL_SIZE", 8)),
+                                         SQLITE_PRAGMAS)
     db.create_all()
+    ensure_indexes()
+    search_index = create_search_index(db.engine)
+    
+    # Count and time SQL statements per endpoint
+    for engine in filter(None, (db.engine, read_engine)):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    
+    # Build the asset bundles at startup rather than on the first page view
+    try:
+        shell_page.get()
+    except FileNotFoundError:
+        logger.error("index.html file not found")
     
     @app.route('/')
     def index():
-        """Serve the main chat interface - serve static HTML file"""
+        """Serve the main chat interface from memory, revalidated by ETag"""
         try:
-            with open('index.html', 'r', encoding='utf-8') as f:
-                return f.read()
+            page = shell_page.get()
         except FileNotFoundError:
             return "Error: index.html file not found"
+        return compressed_response(page, 'no-cache')
+    
+    @app.route('/assets/<filename>')
+    def asset_bundle(filename):
+        """Serve a fingerprinted, precompressed bundle with far-future caching"""
+        bundle = asset_bundles.get(filename)
+        if bundle is None:
+            return jsonify({'error': 'Not found'}), 404
+        return compressed_response(bundle, IMMUTABLE_CACHE_CONTROL)
     
     @app.route('/api/chat', methods=['POST'])
     def chat():
         """Handle chat messages"""
         try:
-            data = request.get_json()
-            user_message = data.get('message', '').strip()
+            data = request.get_json(silent=True)
+            user_message = request_chat_message(data)
             
             if not user_message:
                 return jsonify({'error': 'Message is required'}), 400
             
-            # Generate or get session ID
-            if 'session_id' not in session:
-                import uuid
-                session['session_id'] = str(uuid.uuid4())
-                
-                # Create new session in database with contextual name
-                contextual_name = generate_contextual_session_name(user_message)
-                new_session = ChatSession(
-                    session_id=session['session_id'],
-                    session_name=contextual_name
-                )
-                db.session.add(new_session)
-                db.session.commit()
+            job_mode = data.get('mode') == 'job'
+            try:
+                budget = request_generation_budget('job' if job_mode else 'chat', data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            # Update session activity and name if needed
-            chat_session = ChatSession.query.filter_by(session_id=session['session_id']).first()
-            if chat_session:
-                chat_session.last_activity = datetime.utcnow()
-                
-                # Update session name if it's still using the placeholder "New Chat" format
-                if chat_session.session_name.startswith("New Chat -"):
-                    contextual_name = generate_contextual_session_name(user_message)
-                    chat_session.session_name = contextual_name
-                
-                db.session.commit()
+            received_at = datetime.utcnow()
+            session_id = current_chat_session_id()
             
-            # Save user message to database
-            user_msg = ChatMessage(
-                session_id=session['session_id'],
-                message_text=user_message,
-                is_user=True
-            )
-            db.session.add(user_msg)
+            # Job mode: hand the turn to the inference workers and return immediately
+            if job_mode:
+                try:
+                    job = chat_jobs.submit(run_chat_job, session_id, user_message, received_at, budget)
+                except QueueFullError as e:
+                    response = jsonify({'error': 'Too many requests, please retry later'})
+                    response.headers['Retry-After'] = str(e.retry_after)
+                    return response, 429
+                
+                return jsonify({
+                    'job_id': job.id,
+                    'status': job.status,
+                    'session_id': session_id
+                }), 202
             
             # Get conversation history for context
-            # recent_messages = ChatMessage.query.filter_by(
-            #     session_id=session['session_id']
-            # ).order_by(ChatMessage.timestamp.desc()).limit(10).all()
-            
-            # Convert to format expected by AI model
-            # conversation_history = [msg.to_dict() for msg in reversed(recent_messages)]
+            with timed('history'):
+                conversation_history = load_conversation_history(session_id)
+                read_session().commit()  # release the connection during generation
             
             # Get AI response
-            bot_response = get_ai_response(user_message)
+            with timed('inference'):
+                reply = get_ai_reply(user_message, conversation_history, session_id, budget)
             
-            # Save bot response to database
-            bot_msg = ChatMessage(
-                session_id=session['session_id'],
-                message_text=bot_response,
-                is_user=False
-            )
-            db.session.add(bot_msg)
-            db.session.commit()
+            # Save the session update and both messages in one short transaction
+            with timed('persist'):
+                persist_chat_turn(session_id, user_message, reply.text, received_at)
             
             return jsonify({
-                'response': bot_response,
-                'session_id': session['session_id']
+                'response': reply.text,
+                'session_id': session_id,
+                'generation': reply.generation
             })
             
         except Exception as e:
@@ -214,18 +801,132 @@ with app.app_context():
                 'error': 'Internal server error'
             }), 500
     
+    @app.route('/api/chat/stream', methods=['POST'])
+    def chat_stream():
+        """Handle chat messages, streaming the response as Server-Sent Events"""
+        data = request.get_json(silent=True)
+        user_message = request_chat_message(data)
+        
+        if not user_message:
+            return jsonify({'error': 'Message is required'}), 400
+        
+        try:
+            budget = request_generation_budget('stream', data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        received_at = datetime.utcnow()
+        session_id = current_chat_session_id()
+        
+        def generate():
+            stream = None
+            try:
+                yield sse_event('start', {'session_id': session_id})
+                
+                with timed('history'):
+                    conversation_history = load_conversation_history(session_id)
+                    read_session().commit()  # release the connection during generation
+                
+                stream = stream_ai_response(user_message, conversation_history, budget, session_id)
+                for chunk in stream:
+                    yield sse_event('token', {'token': chunk})
+                
+                # Persist the full exchange once generation has finished
+                with timed('persist'):
+                    persist_chat_turn(session_id, user_message, stream.result, received_at)
+                
+                yield sse_event('done', {'response': stream.result, 'session_id': session_id,
+                                         'generation': stream.generation})
+            except GeneratorExit:
+                # Client disconnected - stop generating
+                if stream is not None:
+                    stream.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Chat stream error: {e}")
+                db.session.rollback()
+                yield sse_event('error', {'error': 'Internal server error'})
+        
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    @app.route('/api/jobs/<job_id>')
+    def get_chat_job(job_id):
+        """Get the status or result of a queued chat job, optionally long-polling with ?wait=seconds"""
+        wait = min(request.args.get('wait', 0, type=float), 30)
+        job = chat_jobs.wait(job_id, wait) if wait > 0 else chat_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job.to_dict())
+    
     @app.route('/api/history')
     def get_chat_history():
-        """Get chat history for current session"""
+        """Get chat history for current session, newest page first
+        
+        ?before=<cursor> fetches the page of older messages (cursor from X-Prev-Cursor),
+        ?since=<cursor> fetches only messages newer than the cursor (from X-Latest-Cursor).
+        Responds 304 when the If-None-Match ETag still matches.
+        """
         try:
             if 'session_id' not in session:
                 return jsonify([])
             
-            messages = ChatMessage.query.filter_by(
-                session_id=session['session_id']
-            ).order_by(ChatMessage.timestamp.asc()).all()
+            session_id = session['session_id']
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+            before = request.args.get('before')
+            since = request.args.get('since')
             
-            return jsonify([msg.to_dict() for msg in messages])
+            # Cheap fingerprint of the session's messages, answered from the index
+            reads = read_session()
+            fingerprint = reads.execute(
+                db.select(
+                    func.count(ChatMessage.id), func.max(ChatMessage.id), func.max(ChatMessage.timestamp)
+                ).where(ChatMessage.session_id == session_id)
+            ).one()
+            etag = hashlib.sha1(
+                f"{session_id}|{'|'.join(map(str, fingerprint))}|{request.query_string.decode()}".encode('utf-8')
+            ).hexdigest()
+            if request.if_none_match.contains(etag):
+                not_modified = Response(status=304)
+                not_modified.set_etag(etag)
+                return not_modified
+            
+            position = (ChatMessage.timestamp, ChatMessage.id)
+            query = db.select(ChatMessage).where(ChatMessage.session_id == session_id)
+            try:
+                if since:
+                    since_timestamp, since_id = decode_cursor(since)
+                    query = query.where(db.tuple_(*position) > db.tuple_(since_timestamp, since_id))
+                    query = query.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+                else:
+                    if before:
+                        before_timestamp, before_id = decode_cursor(before)
+                        query = query.where(db.tuple_(*position) < db.tuple_(before_timestamp, before_id))
+                    query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            # Fetch one extra row to know whether another page exists
+            rows = reads.execute(query.limit(limit + 1)).scalars().all()
+            has_more = len(rows) > limit
+            messages = rows[:limit]
+            if not since:
+                messages.reverse()
+            
+            response = jsonify([msg.to_dict() for msg in messages])
+            if messages:
+                oldest, newest = messages[0], messages[-1]
+                response.headers['X-Latest-Cursor'] = encode_cursor(newest.timestamp, newest.id)
+                if has_more and not since:
+                    response.headers['X-Prev-Cursor'] = encode_cursor(oldest.timestamp, oldest.id)
+            elif since:
+                response.headers['X-Latest-Cursor'] = since
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
         except Exception as e:
             logger.error(f"History error: {e}")
             return jsonify([]), 500
@@ -237,19 +938,58 @@ with app.app_context():
             if 'session_id' not in session:
                 return jsonify({'success': True})
             
-            ChatMessage.query.filter_by(session_id=session['session_id']).delete()
-            db.session.commit()
-            return jsonify({'success': True})
+            # Messages written after this point are kept
+            session_id = session['session_id']
+            max_message_id = db.session.execute(
+                db.select(func.max(ChatMessage.id)).where(ChatMessage.session_id == session_id)
+            ).scalar()
+            pending = max_message_id is not None and start_purge(Purge(session_id, max_message_id, None))
+            forget_conversation(session_id)
+            return jsonify({'success': True, 'pending': pending})
         except Exception as e:
             logger.error(f"Clear history error: {e}")
             return jsonify({'error': 'Failed to clear history'}), 500
     
     @app.route('/api/sessions')
     def get_chat_sessions():
-        """Get all chat sessions"""
+        """Get a page of chat sessions, most recently active first
+        
+        Pass ?limit=N and the X-Next-Cursor header of the previous page as ?cursor=...
+        """
         try:
-            sessions = ChatSession.query.order_by(ChatSession.last_activity.desc()).all()
-            return jsonify([s.to_dict() for s in sessions])
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+            cursor = request.args.get('cursor')
+            
+            # Message count and last message time as correlated subqueries on the session_id index
+            message_count = db.select(func.count(ChatMessage.id)).where(
+                ChatMessage.session_id == ChatSession.session_id
+            ).scalar_subquery()
+            last_message_at = db.select(func.max(ChatMessage.timestamp)).where(
+                ChatMessage.session_id == ChatSession.session_id
+            ).scalar_subquery()
+            
+            query = db.select(ChatSession, message_count, last_message_at).order_by(
+                ChatSession.last_activity.desc(), ChatSession.id.desc()
+            )
+            if cursor:
+                try:
+                    cursor_activity, cursor_id = decode_cursor(cursor)
+                except ValueError:
+                    return jsonify({'error': 'Invalid cursor'}), 400
+                query = query.where(db.or_(
+                    ChatSession.last_activity < cursor_activity,
+                    db.and_(ChatSession.last_activity == cursor_activity, ChatSession.id < cursor_id)
+                ))
+            
+            # Fetch one extra row to know whether another page exists
+            rows = read_session().execute(query.limit(limit + 1)).all()
+            page = rows[:limit]
+            
+            response = jsonify([s.to_dict(message_count=count, last_message_at=last_at) for s, count, last_at in page])
+            if len(rows) > limit:
+                last_session = page[-1][0]
+                response.headers['X-Next-Cursor'] = encode_cursor(last_session.last_activity, last_session.id)
+            return response
         except Exception as e:
             logger.error(f"Sessions error: {e}")
             return jsonify([]), 500
@@ -268,6 +1008,7 @@ with app.app_context():
             )
             db.session.add(new_session)
             db.session.commit()
+            session_cache.put(SessionInfo(new_session_id, new_session.session_name, new_session.last_activity))
             
             # Switch to new session
             session['session_id'] = new_session_id
@@ -275,7 +1016,7 @@ with app.app_context():
             return jsonify({
                 'success': True,
                 'session_id': new_session_id,
-                'session': new_session.to_dict()
+                'session': new_session.to_dict(message_count=0)
             })
         except Exception as e:
             logger.error(f"Create session error: {e}")
@@ -286,16 +1027,14 @@ with app.app_context():
         """Switch to a different chat session"""
         try:
             # Verify session exists
-            chat_session = ChatSession.query.filter_by(session_id=session_id).first()
-            if not chat_session:
+            if session_id not in load_session_info([session_id]):
                 return jsonify({'error': 'Session not found'}), 404
             
             # Switch to session
             session['session_id'] = session_id
             
-            # Update last activity
-            chat_session.last_activity = datetime.utcnow()
-            db.session.commit()
+            # Update last activity with the next coalesced flush
+            touch_session(session_id, datetime.utcnow())
             
             return jsonify({'success': True})
         except Exception as e:
@@ -306,13 +1045,13 @@ with app.app_context():
     def delete_chat_session(session_id):
         """Delete a chat session and all its messages"""
         try:
-            chat_session = ChatSession.query.filter_by(session_id=session_id).first()
-            if not chat_session:
+            # Set-based delete without loading the session's messages
+            if not delete_sessions(db.session, ChatSession.__table__, ChatMessage.__table__, [session_id]):
+                db.session.rollback()
                 return jsonify({'error': 'Session not found'}), 404
-            
-            # Delete session (messages will be deleted due to cascade)
-            db.session.delete(chat_session)
             db.session.commit()
+            session_cache.invalidate([session_id])
+            forget_conversation(session_id)
             
             # If this was the current session, clear it
             if session.get('session_id') == session_id:
@@ -327,22 +1066,193 @@ with app.app_context():
     def delete_all_chat_sessions():
         """Delete all chat sessions and messages"""
         try:
-            ChatMessage.query.delete()
-            ChatSession.query.delete()
-            db.session.commit()
+            # Sessions created after this point are kept
+            max_session_id = db.session.execute(db.select(func.max(ChatSession.id))).scalar()
+            pending = max_session_id is not None and start_purge(Purge(None, None, max_session_id))
+            session_cache.clear()
+            forget_conversation()
             
             # Clear current session
             session.pop('session_id', None)
             
-            return jsonify({'success': True})
+            return jsonify({'success': True, 'pending': pending})
         except Exception as e:
             logger.error(f"Delete all sessions error: {e}")
             return jsonify({'error': 'Failed to delete sessions'}), 500
     
+    @app.route('/api/search')
+    def search_chat_history():
+        """Full-text search of all messages, grouped by session with the best match first
+        
+        ?q= words that must all match, ?limit=N sessions per page and ?per_session=N
+        highlighted messages per session; pass the X-Next-Cursor header of the
+        previous page as ?cursor=... Snippets are HTML with the matches in <mark>.
+        """
+        if search_index is None:
+            return jsonify({'error': 'Search is not available'}), 503
+        
+        terms = search_terms(request.args.get('q', ''))
+        if not terms:
+            return jsonify({'error': 'Query is required'}), 400
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        per_session = min(max(request.args.get('per_session', 3, type=int), 1), 10)
+        cursor = request.args.get('cursor')
+        try:
+            offset = decode_offset_cursor(cursor) if cursor else 0
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        try:
+            # Fetch one extra session to know whether another page exists
+            reads = read_session()
+            groups = search_index.search(reads.connection(), terms, limit + 1, offset, per_session)
+            page = groups[:limit]
+            sessions = {s.session_id: s for s in reads.execute(
+                db.select(ChatSession).where(ChatSession.session_id.in_([group.session_id for group in page]))
+            ).scalars()}
+            
+            results = []
+            for group in page:
+                chat_session = sessions.get(group.session_id)
+                if chat_session is None:
+                    continue
+                results.append({
+                    'session_id': group.session_id,
+                    'session_name': chat_session.session_name,
+                    'last_activity': chat_session.last_activity.isoformat(),
+                    'score': group.score,
+                    'match_count': group.match_count,
+                    'messages': [{'id': match.id, 'is_user': match.is_user,
+                                  'timestamp': match.timestamp.isoformat(), 'snippet': match.snippet}
+                                 for match in group.messages]
+                })
+            
+            response = jsonify(results)
+            if len(groups) > limit:
+                response.headers['X-Next-Cursor'] = encode_offset_cursor(offset + limit)
+            return response
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            db.session.rollback()
+            return jsonify({'error': 'Search failed'}), 500
+    
+    @app.route('/api/export')
+    def export_chats():
+        """Stream all sessions and messages as NDJSON, session by session (?gzip=true to compress)"""
+        if not is_admin_request():
+            return jsonify({'error': 'Forbidden'}), 403
+        
+        compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+        filename = f"chats-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.ndjson{'.gz' if compress else ''}"
+        return Response(stream_with_context(export_chat_data(compress)),
+                        mimetype='application/gzip' if compress else 'application/x-ndjson',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    
+    @app.route('/api/import', methods=['POST'])
+    def import_chats():
+        """Bulk-import an NDJSON export (plain or gzip) in batched transactions"""
+        if not is_admin_request():
+            return jsonify({'error': 'Forbidden'}), 403
+        
+        try:
+            return jsonify(import_chat_data(request.stream))
+        except Exception as e:
+            logger.error(f"Import error: {e}")
+            db.session.rollback()
+            return jsonify({'error': 'Import failed'}), 500
+    
     @app.route('/health')
     def health():
         """Health check endpoint"""
-        return jsonify({'status': 'healthy'})
+        health_data = {
+            'status': 'healthy',
+            'model': registry.status()
+        }
+        if batch_scheduler is not None:
+            # Only prompts without conversation history are batched
+            health_data['batching'] = dict(batch_scheduler.stats(), active=CONVERSATION_HISTORY_LIMIT <= 0)
+        if inference_client is not None:
+            health_data['inference_pool'] = inference_pool_stats() or {'ready_workers': 0, 'error': 'unreachable'}
+        health_data['jobs'] = chat_jobs.stats()
+        if response_cache is not None:
+            health_data['response_cache'] = response_cache.stats()
+        if intent_router is not None:
+            health_data['intents'] = intent_router.stats()
+        if chat_writes is not None:
+            health_data['write_behind'] = chat_writes.stats()
+        health_data['retention'] = chat_purger.stats()
+        health_data['session_cache'] = dict(session_cache.stats(), activity=session_activity.stats())
+        health_data['startup'] = startup_report()
+        return jsonify(health_data)
+    
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics in the text exposition format"""
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('export-chats')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--gzip/--no-gzip', 'compress', default=None, help='compress (default: when PATH ends in .gz)')
+def export_chats_command(path, compress):
+    """Export all sessions and messages to an NDJSON file"""
+    if compress is None:
+        compress = path.endswith('.gz')
+    with open(path, 'wb') as f:
+        for chunk in export_chat_data(compress):
+            f.write(chunk)
+
+@app.cli.command('import-chats')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, help='rows per transaction (default: IMPORT_BATCH_SIZE)')
+def import_chats_command(path, batch_size):
+    """Import an NDJSON export (plain or gzip), skipping sessions that already exist"""
+    with open(path, 'rb') as f:
+        report = import_chat_data(f, batch_size)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command('archive-chats')
+@click.option('--days', type=float, help='archive sessions inactive for longer (default: RETENTION_DAYS)')
+def archive_chats_command(days):
+    """Move sessions past the retention period into the archive table now"""
+    days = days or RETENTION_DAYS
+    if days <= 0:
+        raise click.UsageError('Pass --days or set RETENTION_DAYS')
+    archived = 0
+    while True:
+        count = archive_chunk(days)
+        if not count:
+            break
+        archived += count
+    click.echo(f"Archived {archived} sessions")
+
+@app.cli.command('restore-chat')
+@click.argument('session_id')
+def restore_chat_command(session_id):
+    """Move an archived session and its messages back into the chat tables"""
+    archived = ArchivedSession.query.filter_by(session_id=session_id).first()
+    if archived is None:
+        raise click.ClickException(f"No archived session {session_id}")
+    report = import_chat_data(io.BytesIO(archived.payload))
+    # Kept in the archive if a live session with the same ID already exists
+    if report['sessions'] == 1:
+        db.session.delete(archived)
+        db.session.commit()
+    click.echo(json.dumps(report, indent=2))
+
+def startup_report():
+    """Import time and memory of this worker process"""
+    memory = process_memory()
+    return {
+        'pid': os.getpid(),
+        'import_seconds': APP_IMPORT_SECONDS,
+        'rss_mb': round(memory['rss_bytes'] / 2 ** 20, 1),
+        'pss_mb': round(memory['pss_bytes'] / 2 ** 20, 1) if 'pss_bytes' in memory else None
+    }
+
+APP_IMPORT_SECONDS = time.perf_counter() - _import_started
+IMPORT_SECONDS.set(APP_IMPORT_SECONDS, module='app')
+logger.info(f"Worker {os.getpid()} ready: app imported in {APP_IMPORT_SECONDS:.2f}s, "
+            f"RSS {process_memory()['rss_bytes'] / 2 ** 20:.0f} MB")
 
 if __name__ == '__main__':
     def run_app():
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Dynamic micro-batching scheduler for chat model inference
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    __slots__ = ('message', 'budget', 'future', 'enqueued_at')
+
+    def __init__(self, message, budget=None):
+        self.message = message
+        self.budget = budget
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """Gathers concurrent prompts into batches and runs one generate call per batch"""
+
+    def __init__(self, model_provider, max_batch_size=8, window_ms=10):
+        self.model_provider = model_provider
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                self._worker.start()
+
+    def submit(self, message, budget=None):
+        """Queue a prompt with its generation budget and return a Future for its reply"""
+        self._ensure_worker()
+        pending = _PendingRequest(message, budget)
+        self._queue.put(pending)
+        return pending.future
+
+    def get_reply(self, message, budget=None, timeout=None):
+        """Queue a prompt and block until its reply is ready"""
+        return self.submit(message, budget).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.monotonic()
+            self._record(batch, started)
+
+            try:
+                model = self.model_provider()
+                results = model.get_replies([p.message for p in batch], [p.budget for p in batch])
+            except Exception as e:
+                logger.error(f"Batch generation error: {e}")
+                for pending in batch:
+                    pending.future.set_exception(e)
+                continue
+
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+
+    def _record(self, batch, started):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            size = len(batch)
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            for pending in batch:
+                wait = started - pending.enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+    def stats(self):
+        """Batch-size and queue-wait statistics since start"""
+        with self._stats_lock:
+            return {
+                'batches': self._batches,
+                'requests': self._requests,
+                'queued': self._queue.qsize(),
+                'mean_batch_size': self._requests / self._batches if self._batches else 0.0,
+                'batch_sizes': dict(sorted(self._batch_sizes.items())),
+                'mean_queue_wait_ms': 1000 * self._wait_total / self._requests if self._requests else 0.0,
+                'max_queue_wait_ms': 1000 * self._wait_max,
+                'max_batch_size': self.max_batch_size,
+                'window_ms': self.window * 1000
+            }
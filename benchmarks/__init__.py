@@ -0,0 +1,3 @@
+"""
+Performance tooling for the chat application
+"""
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compare CPU inference backends on this machine
+
+    python -m benchmarks.backends --backends fp32 int8 bf16 compile --threads 4
+
+Each backend runs in its own process so thread settings and resident memory
+are measured in isolation. Outputs are compared token by token against fp32.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_PROMPTS = [
+    "How do I buy a house?",
+    "What should I know before renting an apartment?",
+    "Is now a good time to invest in commercial real estate?",
+    "How much mortgage can I afford on a 60k salary?",
+]
+
+
+def run_backend(model_name, backend, prompts, repeats, num_threads, interop_threads, results, model_options=None):
+    """Load the model with one backend and time greedy generation (runs in a child process)"""
+    import torch
+    from chat_model import GENERATION_CONFIG, BrianChatModel
+    from metrics import process_memory
+
+    try:
+        rss_before = process_memory()['rss_bytes']
+        started = time.perf_counter()
+        chat_model = BrianChatModel(model_name, backend=backend, num_threads=num_threads,
+                                    interop_threads=interop_threads, **(model_options or {}))
+        chat_model.initialize()
+        load_seconds = time.perf_counter() - started
+
+        def generate(prompt):
+            inputs = chat_model.tokenizer(prompt, return_tensors='pt')
+            with torch.inference_mode():
+                outputs = chat_model.model.generate(
+                    inputs['input_ids'],
+                    attention_mask=inputs['attention_mask'],
+                    **chat_model._generation_kwargs(GENERATION_CONFIG['max_new_tokens']))
+            return outputs[0, inputs['input_ids'].shape[1]:].tolist()
+
+        # Warm-up pass (triggers compilation for the compile backend)
+        generate(prompts[0])
+
+        latencies = []
+        tokens = 0
+        outputs = {}
+        for _ in range(repeats):
+            for prompt in prompts:
+                started = time.perf_counter()
+                token_ids = generate(prompt)
+                latencies.append(time.perf_counter() - started)
+                tokens += len(token_ids)
+                outputs[prompt] = token_ids
+
+        results.put({
+            'backend': backend,
+            'load_seconds': load_seconds,
+            'mean_latency_ms': 1000 * statistics.mean(latencies),
+            'p95_latency_ms': 1000 * sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+            'tokens_per_second': tokens / sum(latencies),
+            'rss_mb': process_memory()['rss_bytes'] / 2 ** 20,
+            'model_rss_mb': (process_memory()['rss_bytes'] - rss_before) / 2 ** 20,
+            'threads': torch.get_num_threads(),
+            'outputs': outputs
+        })
+    except Exception as e:
+        results.put({'backend': backend, 'error': f"{type(e).__name__}: {e}"})
+
+
+def divergence(outputs, baseline):
+    """Exact-match rate and mean shared-prefix fraction of generated tokens versus the baseline"""
+    exact = 0
+    prefix_fractions = []
+    for prompt, expected in baseline.items():
+        actual = outputs.get(prompt, [])
+        exact += actual == expected
+        shared = 0
+        for a, b in zip(actual, expected):
+            if a != b:
+                break
+            shared += 1
+        prefix_fractions.append(shared / max(len(expected), 1))
+    return {
+        'exact_match_rate': exact / len(baseline),
+        'mean_shared_prefix': statistics.mean(prefix_fractions)
+    }
+
+
+def compare(model_name, backends, prompts, repeats=1, num_threads=None, interop_threads=None):
+    """Benchmark each backend in a fresh process; fp32 is always run as the baseline"""
+    backends = ['fp32'] + [b for b in backends if b != 'fp32']
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for backend in backends:
+        results = context.Queue()
+        process = context.Process(target=run_backend, args=(
+            model_name, backend, prompts, repeats, num_threads, interop_threads, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    baseline = reports[0].get('outputs')
+    for report in reports:
+        outputs = report.pop('outputs', None)
+        if baseline and outputs is not None:
+            report.update(divergence(outputs, baseline))
+    return reports
+
+
+def print_table(reports):
+    columns = [('backend', '{}'), ('load_seconds', '{:.2f}'), ('mean_latency_ms', '{:.0f}'),
+               ('p95_latency_ms', '{:.0f}'), ('tokens_per_second', '{:.1f}'), ('rss_mb', '{:.0f}'),
+               ('exact_match_rate', '{:.2f}'), ('mean_shared_prefix', '{:.2f}')]
+    print('  '.join(f"{name:>18}" for name, _ in columns))
+    for report in reports:
+        if 'error' in report:
+            print(f"{report['backend']:>18}  error: {report['error']}")
+            continue
+        print('  '.join(f"{fmt.format(report[name]):>18}" for name, fmt in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.environ.get("CHAT_MODEL_NAME", "gpt2"))
+    parser.add_argument('--backends', nargs='+', default=['fp32', 'int8', 'bf16', 'compile'])
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--threads', type=int, help='intra-op threads per process')
+    parser.add_argument('--interop-threads', type=int, help='inter-op threads per process')
+    parser.add_argument('--prompt', action='append', dest='prompts', help='prompt to generate from (repeatable)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    reports = compare(args.model, args.backends, args.prompts or DEFAULT_PROMPTS,
+                      args.repeats, args.threads, args.interop_threads)
+    print_table(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Load test the chat API
+
+    python -m benchmarks.load_test --concurrency 8 --requests 200 --fake-delay-ms 50 \\
+        --seed-sessions 10000 --seed-messages 20 --output run.json --baseline baseline.json
+
+By default the app runs in-process against a fresh SQLite database with a
+deterministic fake model, which also lets SQL queries be counted per endpoint.
+Use --real-model to generate with BrianChatModel, or --url to drive a running
+server over HTTP instead.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation_budget import ChatReply  # noqa: E402
+
+ENDPOINTS = ('chat', 'history', 'sessions')
+
+QUESTIONS = [
+    "How do I buy a house?",
+    "What are rental prices like in this neighborhood?",
+    "Should I get a fixed or variable mortgage?",
+    "Is this a good time to sell my condo?",
+    "What does an appraisal cost?",
+]
+
+
+class FakeChatModel:
+    """Deterministic stand-in for BrianChatModel with a fixed generation delay"""
+
+    def __init__(self, delay):
+        from conversation_cache import ConversationCache
+        self.delay = delay
+        self.model = None
+        self.conversation_cache = ConversationCache()
+
+    def initialize(self):
+        self.model = self
+
+    def get_response(self, message):
+        return self.get_responses([message])[0]
+
+    def get_responses(self, messages):
+        return [reply.text for reply in self.get_replies(messages)]
+
+    def get_replies(self, messages, budgets=None):
+        time.sleep(self.delay)
+        return [ChatReply(f"Brian's answer to: {message[:60]}", {'stop_reason': 'eos'}) for message in messages]
+
+    def get_conversation_reply(self, message, conversation_history, session_key=None, budget=None):
+        return self.get_replies([message], [budget])[0]
+
+
+class InProcessClient:
+    """Drives the Flask app through its test client, one cookie jar per worker"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """Drives a running server over HTTP"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, payload=None):
+        return self.session.request(method, self.base_url + path, json=payload).status_code
+
+
+class QueryCounter:
+    """Counts SQL statements and their time per endpoint via SQLAlchemy engine events"""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.seconds = {}
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before)
+            event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self.local.started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        endpoint = getattr(self.local, 'endpoint', None)
+        if endpoint is None:
+            return
+        elapsed = time.perf_counter() - self.local.started
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            self.seconds[endpoint] = self.seconds.get(endpoint, 0.0) + elapsed
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def seed_database(app, db, sessions, messages_per_session, batch_size=5000):
+    """Bulk insert realistic sessions and messages; returns the seeded session IDs"""
+    from app import ChatSession, ChatMessage
+
+    now = datetime.utcnow()
+    session_ids = []
+    with app.app_context():
+        session_rows, message_rows = [], []
+        for i in range(sessions):
+            session_id = str(uuid.uuid4())
+            session_ids.append(session_id)
+            started = now - timedelta(minutes=10 * i + messages_per_session)
+            session_rows.append({'session_id': session_id, 'session_name': f"Seeded chat {i}",
+                                 'created_at': started,
+                                 'last_activity': started + timedelta(minutes=messages_per_session)})
+            for j in range(messages_per_session):
+                message_rows.append({'session_id': session_id,
+                                     'message_text': random.choice(QUESTIONS) if j % 2 == 0 else "Seeded answer " * 10,
+                                     'is_user': j % 2 == 0,
+                                     'timestamp': started + timedelta(minutes=j)})
+            if len(message_rows) >= batch_size or i == sessions - 1:
+                db.session.execute(db.insert(ChatSession), session_rows)
+                if message_rows:
+                    db.session.execute(db.insert(ChatMessage), message_rows)
+                db.session.commit()
+                session_rows, message_rows = [], []
+    return session_ids
+
+
+def run_endpoint(endpoint, make_client, session_ids, concurrency, total_requests, query_counter):
+    """Fire `total_requests` at one endpoint from `concurrency` workers"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_worker = max(1, total_requests // concurrency)
+
+    def worker():
+        client = make_client()
+        if session_ids:
+            client.request('POST', f"/api/sessions/{random.choice(session_ids)}/switch")
+        if query_counter is not None:
+            query_counter.local.endpoint = endpoint
+
+        for _ in range(per_worker):
+            if endpoint == 'chat':
+                method, path, payload = 'POST', '/api/chat', {'message': random.choice(QUESTIONS)}
+            elif endpoint == 'history':
+                method, path, payload = 'GET', '/api/history', None
+            else:
+                method, path, payload = 'GET', '/api/sessions', None
+
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, payload)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status is None or status >= 400:
+                    errors[0] += 1
+
+        if query_counter is not None:
+            query_counter.local.endpoint = None
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': len(latencies) / wall,
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p95_ms': 1000 * percentile(latencies, 95),
+        'p99_ms': 1000 * percentile(latencies, 99),
+        'mean_ms': 1000 * statistics.mean(latencies)
+    }
+    if query_counter is not None:
+        result['queries_per_request'] = query_counter.counts.get(endpoint, 0) / len(latencies)
+        result['query_ms_per_request'] = 1000 * query_counter.seconds.get(endpoint, 0.0) / len(latencies)
+    return result
+
+
+def compare_to_baseline(results, baseline):
+    """Relative change of the headline numbers against a previous run"""
+    lines = []
+    for endpoint, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if not previous:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'requests_per_second', 'queries_per_request'):
+            if metric in current and previous.get(metric):
+                change = 100 * (current[metric] - previous[metric]) / previous[metric]
+                changes.append(f"{metric} {change:+.1f}%")
+        lines.append(f"{endpoint:>10}: " + ', '.join(changes))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: run the app in-process)')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+    parser.add_argument('--real-model', action='store_true', help='generate with BrianChatModel instead of the fake')
+    parser.add_argument('--fake-delay-ms', type=float, default=50)
+    parser.add_argument('--seed-sessions', type=int, default=1000)
+    parser.add_argument('--seed-messages', type=int, default=20, help='messages per seeded session')
+    parser.add_argument('--database-url', help='database for in-process runs (default: a temporary SQLite file)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    query_counter = None
+    session_ids = []
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        # Configure the app before it is imported; never seed the configured production database
+        os.environ["DATABASE_URL"] = args.database_url or \
+            f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+        from app import app, db, read_engine
+        from chat_model import DEFAULT_MODEL, registry
+
+        if not args.real_model:
+            registry.register(DEFAULT_MODEL, 'fake', factory=lambda: FakeChatModel(args.fake_delay_ms / 1000))
+
+        seed_started = time.perf_counter()
+        session_ids = seed_database(app, db, args.seed_sessions, args.seed_messages)
+        print(f"Seeded {args.seed_sessions} sessions x {args.seed_messages} messages "
+              f"in {time.perf_counter() - seed_started:.1f}s")
+
+        with app.app_context():
+            query_counter = QueryCounter(*filter(None, (db.engine, read_engine)))
+
+        def make_client():
+            return InProcessClient(app)
+
+    results = {
+        'started_at': datetime.utcnow().isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'endpoints': {}
+    }
+    for endpoint in args.endpoints:
+        result = run_endpoint(endpoint, make_client, session_ids, args.concurrency, args.requests, query_counter)
+        results['endpoints'][endpoint] = result
+        queries = f"  queries/req {result['queries_per_request']:.1f}" if 'queries_per_request' in result else ''
+        print(f"{endpoint:>10}: {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:7.1f}ms  "
+              f"p95 {result['p95_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  errors {result['errors']}{queries}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("Compared to baseline:")
+        for line in compare_to_baseline(results, baseline):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
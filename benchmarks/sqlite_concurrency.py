@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compare read/write concurrency on SQLite with and without the production mode
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 8 --seconds 10
+
+Each mode runs in its own process against a fresh, seeded SQLite file: writer
+threads post chat turns (with an instant fake model, so they only write) while
+reader threads page /api/history and /api/sessions. Reports read latency
+percentiles, throughput and failed requests ("database is locked") per mode.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {'default': 'false', 'optimized': 'true'}
+
+
+def run_mode(args):
+    """Seed a database and drive concurrent readers and writers (runs in a child process)"""
+    from benchmarks.load_test import QUESTIONS, FakeChatModel, InProcessClient, percentile, seed_database
+    from app import app, db
+    from chat_model import DEFAULT_MODEL, registry
+
+    registry.register(DEFAULT_MODEL, 'fake', factory=lambda: FakeChatModel(0))
+    session_ids = seed_database(app, db, args.seed_sessions, args.seed_messages)
+
+    lock = threading.Lock()
+    results = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(kind):
+        client = InProcessClient(app)
+        client.request('POST', f"/api/sessions/{random.choice(session_ids)}/switch")
+        while time.perf_counter() < deadline:
+            if kind == 'write':
+                method, path, payload = 'POST', '/api/chat', {'message': random.choice(QUESTIONS)}
+            else:
+                method, path, payload = 'GET', random.choice(('/api/history', '/api/sessions')), None
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, payload)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+            with lock:
+                results[kind].append(elapsed)
+                if status is None or status >= 400:
+                    results[f'{kind}_errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=('write',)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('read',)) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    with app.app_context():
+        journal_mode = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+    report = {'journal_mode': journal_mode}
+    for kind in ('read', 'write'):
+        latencies = results[kind] or [0.0]
+        report[kind] = {
+            'per_second': len(results[kind]) / wall,
+            'errors': results[f'{kind}_errors'],
+            'p50_ms': 1000 * percentile(latencies, 50),
+            'p95_ms': 1000 * percentile(latencies, 95),
+            'p99_ms': 1000 * percentile(latencies, 99)
+        }
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed-sessions', type=int, default=1000)
+    parser.add_argument('--seed-messages', type=int, default=20)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--run-mode', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args)
+        return
+
+    results = {}
+    for mode in args.modes:
+        env = dict(os.environ, SQLITE_OPTIMIZED=MODES[mode], CHAT_WRITE_BEHIND='false',
+                   DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'concurrency.db')}")
+        command = [sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--run-mode',
+                   '--writers', str(args.writers), '--readers', str(args.readers), '--seconds', str(args.seconds),
+                   '--seed-sessions', str(args.seed_sessions), '--seed-messages', str(args.seed_messages)]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        results[mode] = report = json.loads(output.stdout.strip().splitlines()[-1])
+        for kind in ('read', 'write'):
+            r = report[kind]
+            print(f"{mode:>10} {kind:>5}s ({report['journal_mode']}): {r['per_second']:8.1f}/s  "
+                  f"p50 {r['p50_ms']:7.1f}ms  p95 {r['p95_ms']:7.1f}ms  p99 {r['p99_ms']:7.1f}ms  "
+                  f"errors {r['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Report startup time and memory per worker process
+
+    python -m benchmarks.startup --workers 4
+
+Each worker imports the app, loads the chat model and reports its memory once
+every worker has loaded, so proportional set size (PSS) shows how much of the
+model is shared between workers through the memory-mapped weight snapshot.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_worker(loaded, measured, results):
+    """Import the app and load the model (runs in a child process)"""
+    report = {'pid': os.getpid()}
+    try:
+        started = time.perf_counter()
+        import app  # noqa: F401
+        from chat_model import DEFAULT_MODEL, registry
+        from metrics import process_memory
+        report['import_seconds'] = time.perf_counter() - started
+        report['import_rss_mb'] = process_memory()['rss_bytes'] / 2 ** 20
+
+        started = time.perf_counter()
+        registry.get(DEFAULT_MODEL)
+        report['load_seconds'] = time.perf_counter() - started
+    except Exception as e:
+        report['error'] = f"{type(e).__name__}: {e}"
+
+    # Measure once every worker has loaded, and stay alive until all have measured
+    loaded.wait()
+    if 'error' not in report:
+        memory = process_memory()
+        report['rss_mb'] = memory['rss_bytes'] / 2 ** 20
+        report['pss_mb'] = memory.get('pss_bytes', memory['rss_bytes']) / 2 ** 20
+    results.put(report)
+    measured.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    loaded = context.Barrier(args.workers)
+    measured = context.Barrier(args.workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(loaded, measured, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+
+    reports = [results.get() for _ in processes]
+    measured.wait()
+    for process in processes:
+        process.join()
+
+    columns = ('pid', 'import_seconds', 'load_seconds', 'import_rss_mb', 'rss_mb', 'pss_mb')
+    print('  '.join(f"{name:>14}" for name in columns))
+    for report in reports:
+        if 'error' in report:
+            print(f"{report['pid']:>14}  error: {report['error']}")
+            continue
+        print('  '.join(f"{report[name]:>14.2f}" if isinstance(report[name], float) else f"{report[name]:>14}"
+                        for name in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,63 +3,335 @@
 Simple Hugging Face Chat Model for Brian Real Estate Assistant
 """
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
 import logging
+import os
+import sys
+import threading
+import time
+
+from batch_scheduler import BatchScheduler
+from conversation_cache import ConversationCache, ConversationState, common_prefix_length
+from generation_budget import BudgetCriteria, ChatReply, GenerationBudget, LatencyEstimate, plan_max_new_tokens
+from inference_pool import InferenceClient
+from intent_router import AnswerStore, IntentRouter
+from metrics import GENERATION_STOPS, IMPORT_SECONDS, MODEL_LOAD_SECONDS, record_generation, timed
+from response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "default"
+
+# Where memory-mapped weight snapshots are kept, shared by all worker processes ("" disables)
+MODEL_SNAPSHOT_DIR = os.environ.get("MODEL_SNAPSHOT_DIR", "model_snapshots")
+
+# Generation settings; part of the response cache key
+GENERATION_CONFIG = {
+    'max_new_tokens': 100,
+    'temperature': 0.8,
+    #'do_sample': True,
+}
+
+# Generation budgets per endpoint; a request may ask for a tighter latency budget (0 = no deadline)
+GENERATION_BUDGETS = {
+    endpoint: GenerationBudget(
+        latency_ms=float(os.environ.get(f"{endpoint.upper()}_LATENCY_BUDGET_MS", default_ms)) or None,
+        max_new_tokens=int(os.environ.get(f"{endpoint.upper()}_MAX_NEW_TOKENS",
+                                          GENERATION_CONFIG['max_new_tokens'])),
+        min_new_tokens=int(os.environ.get("GENERATION_MIN_NEW_TOKENS", 16)),
+        stop_at=os.environ.get("GENERATION_STOP_AT", "sentence") or None,
+        repeat_ngram=int(os.environ.get("GENERATION_REPEAT_NGRAM", 4)))
+    for endpoint, default_ms in (('default', 0), ('chat', 5000), ('stream', 15000), ('job', 30000))
+}
+
+
+def generation_budget(endpoint, latency_ms=None):
+    """The endpoint's generation budget, tightened to `latency_ms` when a request asks for less"""
+    budget = GENERATION_BUDGETS[endpoint]
+    if latency_ms and (not budget.latency_ms or latency_ms < budget.latency_ms):
+        budget = budget._replace(latency_ms=float(latency_ms))
+    return budget
+
+
+# The loaded history starts a whole number of this many messages into the session, so the
+# window does not slide by a message on every turn when the history limit binds
+CONVERSATION_HISTORY_CHUNK = int(os.environ.get("CONVERSATION_HISTORY_CHUNK", 16))
+
+# Share of the prompt budget earlier turns may fill; past it the oldest are dropped down to half of it
+HISTORY_SHARE = 0.75
+
+
+def anchor_history(recent_messages, total_messages):
+    """Trim the newest messages of a session with `total_messages` so they start on a chunk boundary
+
+    A window of the last N messages moves on every turn, and with absolute
+    positions a transcript whose first message changes shares no cached prefix.
+    """
+    dropped = -(total_messages - len(recent_messages)) % CONVERSATION_HISTORY_CHUNK
+    return recent_messages[dropped:]
+
+
+def history_start(turn_lengths, limit):
+    """Index of the first earlier turn kept in the prompt, given each turn's token count
+
+    Replays the conversation: whenever a turn takes the kept turns over `limit`
+    tokens, the oldest are dropped down to half of it. The start only moves on
+    those overflows, so the transcript prefix (and its cached key/values)
+    stays the same for the turns in between.
+    """
+    start, total = 0, 0
+    for i, length in enumerate(turn_lengths):
+        total += length
+        if total > limit:
+            while start <= i and total > limit // 2:
+                total -= turn_lengths[start]
+                start += 1
+    return start
+
+
+def build_conversation_turns(message, conversation_history):
+    """Transcript pieces for a conversation, tokenized one by one so earlier turns keep the same token ids"""
+    turns = []
+    for msg in conversation_history:
+        speaker = "User:" if msg['is_user'] else "Brian says:"
+        turns.append(f"{speaker} {msg['message_text']}\n")
+    turns.append(f"User: {message}\n")
+    turns.append("Brian says:")
+    return turns
+
 
 class BrianChatModel:
 
-    def __init__(self):
+    def __init__(self, model_name="gpt2", backend="fp32", num_threads=None, interop_threads=None,
+                 snapshot_dir=MODEL_SNAPSHOT_DIR):
         self.model = None
         self.tokenizer = None
-        self.model_name = "gpt2"
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        self.interop_threads = interop_threads
+        self.snapshot_dir = snapshot_dir
+        self.conversation_cache = ConversationCache(
+            max_bytes=int(float(os.environ.get("CONVERSATION_CACHE_MB", 256)) * 1024 * 1024))
+        self.latency = LatencyEstimate()
 
     def initialize(self):
         """Load the model"""
         logger.info("Loading chat model...")
+        started = time.perf_counter()
+
+        # torch and transformers are only imported once a model is actually needed
+        first_import = 'transformers' not in sys.modules
+        from transformers import AutoTokenizer
+        from inference_backends import apply_backend, configure_threads
+        from model_snapshot import load_pretrained
+        if first_import:
+            IMPORT_SECONDS.set(time.perf_counter() - started, module='inference')
+
+        configure_threads(self.num_threads, self.interop_threads)
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        self.model = apply_backend(load_pretrained(self.model_name, self.snapshot_dir), self.backend)
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
-        logger.info("✓ Model loaded")
+        self.tokenizer.padding_side = 'left'
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started, model=self.model_name)
+        logger.info(f"✓ Model loaded ({self.backend})")
 
     def get_response(self, message):
         """Generate response using Hugging Face model"""
+        return self.get_responses([message])[0]
+
+    def get_responses(self, messages):
+        """Generate responses for several messages with one batched generate call"""
+        return [reply.text for reply in self.get_replies(messages)]
+
+    def get_replies(self, messages, budgets=None):
+        """Generate replies for several messages with one batched generate call, each under its own budget"""
         if self.model is None:
             self.initialize()
 
         # Real estate context prompt
         # prompt = f"As a real estate assistant named Brian, answer this question: {message}\nBrian says:"
-        prompt = message
+        prompts = list(messages)
+
+        # Tokenize with attention mask, left-padded so every prompt ends where generation starts
+        with timed('tokenize'):
+            inputs = self.tokenizer(prompts, return_tensors='pt', padding=True)
+
+        outputs, criteria = self._generate(inputs['input_ids'], inputs['attention_mask'],
+                                           budgets or [None] * len(prompts))
+
+        # Decode
+        with timed('decode'):
+            responses = self.tokenizer.batch_decode(
+                [criteria.generated(outputs, row) for row in range(len(prompts))], skip_special_tokens=True)
+        return [ChatReply(self._extract_response(prompt, prompt + response), criteria.generation_info(row))
+                for row, (prompt, response) in enumerate(zip(prompts, responses))]
+
+    def get_conversation_response(self, message, conversation_history, session_key=None):
+        """Generate a response in the context of earlier turns"""
+        return self.get_conversation_reply(message, conversation_history, session_key).text
 
-        # Tokenize with attention mask
-        inputs = self.tokenizer(prompt, return_tensors='pt', padding=True)
-        input_ids = inputs['input_ids']
-        attention_mask = inputs['attention_mask']
+    def get_conversation_reply(self, message, conversation_history, session_key=None, budget=None):
+        """Generate a reply in the context of earlier turns, reusing the session's cached key/values"""
+        if self.model is None:
+            self.initialize()
+        import torch
+
+        with timed('tokenize'):
+            prompt, token_ids = self._encode_conversation(message, conversation_history)
+
+        input_ids = torch.tensor([token_ids])
+        outputs, criteria = self._generate(input_ids, torch.ones_like(input_ids), [budget],
+                                           past_key_values=self._take_cached_prefix(session_key, token_ids),
+                                           return_dict_in_generate=True)
+        self._store_prefix(session_key, token_ids, outputs.past_key_values)
+
+        with timed('decode'):
+            generated = self.tokenizer.decode(criteria.generated(outputs.sequences, 0), skip_special_tokens=True)
+        return ChatReply(self._extract_response(prompt, prompt + generated), criteria.generation_info(0))
+
+    def _generate(self, input_ids, attention_mask, budgets, stopping_criteria=(), **kwargs):
+        """Run generate with max_new_tokens sized to the budgets and the prompt, stopping each row early
+        at its deadline, a repetition or a sentence/paragraph boundary
+
+        Returns the generate outputs and the BudgetCriteria recording why and where each row stopped.
+        """
+        import torch
+        from transformers import StoppingCriteriaList
 
-        # Generate
-        with torch.no_grad():
+        budgets = [budget or GENERATION_BUDGETS['default'] for budget in budgets]
+        prompt_length = input_ids.shape[1]
+        room = self.model.config.max_position_embeddings - prompt_length
+        max_new_tokens = plan_max_new_tokens(budgets, input_ids.numel(), room, self.latency)
+        criteria = BudgetCriteria(self.tokenizer, prompt_length, budgets, max_new_tokens)
+
+        started = time.perf_counter()
+        with timed('generate'), torch.inference_mode():
             outputs = self.model.generate(
                 input_ids,
                 attention_mask=attention_mask,
-                max_length=input_ids.shape[1] + 100,
-                temperature=0.8,
-                #do_sample=True,
-                pad_token_id=self.tokenizer.pad_token_id,
-                num_return_sequences=1)
+                stopping_criteria=StoppingCriteriaList([criteria, *stopping_criteria]),
+                **self._generation_kwargs(max_new_tokens),
+                **kwargs)
+        criteria.finish(outputs.sequences if kwargs.get('return_dict_in_generate') else outputs)
 
-        # Decode
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        criteria.update_latency(self.latency, input_ids.numel())
+        record_generation(sum(criteria.lengths), time.perf_counter() - started)
+        for reason in criteria.reasons:
+            GENERATION_STOPS.inc(reason=reason)
+        return outputs, criteria
+
+    def _encode_conversation(self, message, conversation_history):
+        """Prompt text and token ids for a conversation, truncated to fit the context window"""
+        budget = self.model.config.max_position_embeddings - GENERATION_CONFIG['max_new_tokens']
+        turns = build_conversation_turns(message, conversation_history)
+        encoded = [self.tokenizer(turn)['input_ids'] for turn in turns]
+
+        # Drop the oldest turns in large steps, only when the history outgrows its share of the budget
+        start = history_start([len(ids) for ids in encoded[:-2]], int(budget * HISTORY_SHARE))
+        del turns[:start]
+        del encoded[:start]
+
+        # A long message may still not fit; this only shortens the current turn's prompt
+        while len(encoded) > 2 and sum(len(ids) for ids in encoded) > budget:
+            turns.pop(0)
+            encoded.pop(0)
+
+        token_ids = [token for ids in encoded for token in ids][-budget:]
+        return ''.join(turns), token_ids
+
+    def _take_cached_prefix(self, session_key, token_ids):
+        """The session's cached key/values cropped to the prefix shared with `token_ids`, or None
 
+        Generation then only runs the forward pass over tokens the cached state has not seen.
+        """
+        state = self.conversation_cache.take(session_key) if session_key else None
+        if state is None:
+            return None
+        reuse = min(common_prefix_length(state.token_ids, token_ids), len(token_ids) - 1)
+        if reuse <= 0:
+            return None
+        self._crop_cache(state.past_key_values, reuse)
+        self.conversation_cache.record_reuse(reuse)
+        return state.past_key_values
+
+    def _store_prefix(self, session_key, token_ids, past_key_values):
+        """Keep the prompt's state; the stored reply is appended as new tokens next turn"""
+        if session_key:
+            self._crop_cache(past_key_values, len(token_ids))
+            self.conversation_cache.put(session_key, ConversationState(token_ids, past_key_values))
+
+    @staticmethod
+    def _crop_cache(past_key_values, length):
+        excess = past_key_values.get_seq_length() - length
+        if excess > 0:
+            past_key_values.crop(-excess)
+
+    def stream_response(self, message, conversation_history=None, budget=None, session_key=None):
+        """Start generating in a background thread and return a ResponseStream of text chunks
+
+        With a conversation history the session's cached key/values are reused
+        and updated, as in get_conversation_reply.
+        """
+        if self.model is None:
+            self.initialize()
+        import torch
+        from transformers import TextIteratorStreamer
+
+        with timed('tokenize'):
+            if conversation_history is None:
+                prompt = message
+                token_ids = self.tokenizer(prompt)['input_ids']
+                session_key = None
+            else:
+                prompt, token_ids = self._encode_conversation(message, conversation_history)
+            input_ids = torch.tensor([token_ids])
+        past_key_values = self._take_cached_prefix(session_key, token_ids)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stream = ResponseStream(self, prompt, streamer)
+
+        def run():
+            try:
+                outputs, criteria = self._generate(input_ids, torch.ones_like(input_ids), [budget],
+                                                   streamer=streamer, stopping_criteria=[_CancelledCriteria(stream)],
+                                                   past_key_values=past_key_values, return_dict_in_generate=True)
+                self._store_prefix(session_key, token_ids, outputs.past_key_values)
+                # Chunks already streamed may include a repeated tail the criteria cut off
+                stream.kept_text = self.tokenizer.decode(criteria.generated(outputs.sequences, 0),
+                                                         skip_special_tokens=True)
+                stream.generation = criteria.generation_info(0)
+                if stream.cancelled.is_set():
+                    stream.generation['stop_reason'] = 'cancelled'
+            except Exception as e:
+                logger.error(f"Streaming generation error: {e}")
+                stream.error = e
+                streamer.end()
+            finally:
+                stream.finished.set()
+
+        threading.Thread(target=run, name="stream-generate", daemon=True).start()
+        return stream
+
+    def _generation_kwargs(self, max_new_tokens):
+        """Generation settings shared by the batched, conversation and streaming paths"""
+        return dict(
+            max_new_tokens=max_new_tokens,
+            pad_token_id=self.tokenizer.pad_token_id,
+            num_return_sequences=1,
+            **{k: v for k, v in GENERATION_CONFIG.items() if k != 'max_new_tokens'})
+
+    def _extract_response(self, prompt, response):
+        """Strip the prompt from a decoded generation and clean it up"""
         # Extract Brian's response
         if "Brian says:" in response:
             result = response.split("Brian says:")[-1].strip()
         else:
             result = response[len(prompt):].strip()
 
+        # Stop where the model starts writing the user's next turn
+        result = result.split("User:")[0].strip()
+
         # Clean up and ensure it's useful
         if not result or len(result) < 5:
             result = "As your real estate assistant, I'm here to help with property questions, buying, selling, and investments."
@@ -67,7 +339,296 @@ class BrianChatModel:
         return result
 
 
-def get_ai_response(user_message, conversation_history=None) -> str:
-    """Get AI response"""
-    brian_model = BrianChatModel()
-    return brian_model.get_response(user_message)
+class ResponseStream:
+    """Iterator over generated text chunks; once exhausted `result` holds the cleaned response
+    and `generation` its metadata
+
+    `result` is built from the tokens the stopping criteria kept, like the other
+    generation paths, so it can be shorter than the chunks streamed.
+    """
+
+    def __init__(self, chat_model, prompt, streamer):
+        self.chat_model = chat_model
+        self.prompt = prompt
+        self.streamer = streamer
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.result = None
+        self.generation = None
+        self.kept_text = None
+        self._chunks = []
+
+    def __iter__(self):
+        for chunk in self.streamer:
+            if chunk:
+                self._chunks.append(chunk)
+                yield chunk
+        self.finished.wait()
+        if self.error is not None:
+            raise self.error
+        text = ''.join(self._chunks) if self.kept_text is None else self.kept_text
+        self.result = self.chat_model._extract_response(self.prompt, self.prompt + text)
+
+    def cancel(self):
+        """Stop generation at the next token, e.g. when the client disconnects"""
+        self.cancelled.set()
+
+
+class AnswerStream:
+    """ResponseStream counterpart for a reply known up front, such as an FAQ answer"""
+
+    def __init__(self, reply):
+        self.result, self.generation = reply
+        self.error = None
+
+    def __iter__(self):
+        yield self.result
+
+    def cancel(self):
+        pass
+
+
+class _CancelledCriteria:
+    """Stopping criterion that ends generation once the owning stream has been cancelled"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        return torch.full((input_ids.shape[0],), self.stream.cancelled.is_set(),
+                          dtype=torch.bool, device=input_ids.device)
+
+
+class ModelRegistry:
+    """Process-wide registry that loads each named model once and shares it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._descriptions = {}
+        self._models = {}
+        self._load_locks = {}
+        self._states = {}
+        self._errors = {}
+        self._load_seconds = {}
+
+    def register(self, name, model_name="gpt2", factory=None, **options):
+        """Register a named model config; `factory` builds the model instance, `options` go to BrianChatModel"""
+        with self._lock:
+            self._configs[name] = factory or (lambda: BrianChatModel(model_name, **options))
+            self._descriptions[name] = dict(options, model_name=model_name)
+            self._models.pop(name, None)
+            self._load_locks.setdefault(name, threading.Lock())
+            self._states[name] = 'registered'
+            self._errors.pop(name, None)
+
+    def get(self, name=DEFAULT_MODEL):
+        """Return the loaded model for `name`, loading it on first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._configs:
+                raise KeyError(f"Unknown model: {name}")
+            load_lock = self._load_locks[name]
+
+        # Only one thread loads a given model; the others wait for it
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            self._states[name] = 'loading'
+            started = time.perf_counter()
+            try:
+                model = self._configs[name]()
+                model.initialize()
+            except Exception as e:
+                self._states[name] = 'failed'
+                self._errors[name] = str(e)
+                raise
+
+            self._models[name] = model
+            self._states[name] = 'ready'
+            self._load_seconds[name] = time.perf_counter() - started
+            self._errors.pop(name, None)
+            return model
+
+    def warm_up(self, name=DEFAULT_MODEL):
+        """Load the model and run a dummy generation pass"""
+        model = self.get(name)
+        model.get_response("Hello")
+        logger.info(f"✓ Model '{name}' warmed up")
+        return model
+
+    def warm_up_async(self, name=DEFAULT_MODEL):
+        """Warm the model up in a background thread"""
+        def run():
+            try:
+                self.warm_up(name)
+            except Exception as e:
+                logger.error(f"Model warm-up failed: {e}")
+
+        thread = threading.Thread(target=run, name=f"warmup-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def loaded_models(self):
+        return list(self._models.values())
+
+    def describe(self, name=DEFAULT_MODEL):
+        """Model name and options of a registered config, without loading it"""
+        return self._descriptions[name]
+
+    def is_ready(self, name=DEFAULT_MODEL):
+        return self._states.get(name) == 'ready'
+
+    def status(self):
+        """Readiness of every registered model"""
+        with self._lock:
+            models = {
+                name: {'state': self._states[name], 'error': self._errors.get(name),
+                       'load_seconds': self._load_seconds.get(name)}
+                for name in self._configs
+            }
+            for name, model in self._models.items():
+                if hasattr(model, 'conversation_cache'):
+                    models[name]['conversation_cache'] = model.conversation_cache.stats()
+        return {
+            'ready': all(m['state'] == 'ready' for m in models.values()),
+            'models': models
+        }
+
+
+registry = ModelRegistry()
+registry.register(
+    DEFAULT_MODEL,
+    os.environ.get("CHAT_MODEL_NAME", "gpt2"),
+    backend=os.environ.get("INFERENCE_BACKEND", "fp32"),
+    num_threads=int(os.environ.get("TORCH_NUM_THREADS", 0)) or None,
+    interop_threads=int(os.environ.get("TORCH_INTEROP_THREADS", 0)) or None
+)
+
+# Optional micro-batching of concurrent requests into one generate call
+batch_scheduler = None
+if os.environ.get("INFERENCE_BATCHING", "false").lower() in ("1", "true", "yes"):
+    batch_scheduler = BatchScheduler(
+        lambda: registry.get(DEFAULT_MODEL),
+        max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 8)),
+        window_ms=float(os.environ.get("BATCH_WINDOW_MS", 10))
+    )
+
+# Greedy decoding is deterministic, so repeated prompts can be served from cache
+response_cache = None
+if int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)) > 0:
+    response_cache = ResponseCache(
+        max_size=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+    )
+
+# Common questions answered from a curated, hot-reloaded answer store without running the model ("" disables)
+intent_router = None
+if os.environ.get("FAQ_ANSWERS_PATH", "faq_answers.json"):
+    intent_router = IntentRouter(AnswerStore(os.environ.get("FAQ_ANSWERS_PATH", "faq_answers.json")))
+
+# Optional out-of-process inference: generate in the pool served on this socket (see inference_pool.py)
+inference_client = None
+if os.environ.get("INFERENCE_SOCKET"):
+    # Long enough to wait for a free worker and then for its response
+    inference_client = InferenceClient(
+        os.environ["INFERENCE_SOCKET"],
+        timeout=2 * float(os.environ.get("INFERENCE_TIMEOUT", 60)) + 5
+    )
+
+
+def _generate_reply(user_message, budget):
+    if batch_scheduler is not None:
+        return batch_scheduler.get_reply(user_message, budget)
+    brian_model = registry.get(DEFAULT_MODEL)
+    return brian_model.get_replies([user_message], [budget])[0]
+
+
+def faq_reply(user_message, budget):
+    """The curated answer for a recognised FAQ, or None if the model has to answer"""
+    if intent_router is None:
+        return None
+    route = intent_router.route(user_message)
+    if route.answer is None:
+        return None
+    return ChatReply(route.answer, {'stop_reason': 'faq', 'intent': route.intent, 'new_tokens': 0,
+                                    'latency_budget_ms': budget.latency_ms})
+
+
+def get_ai_reply(user_message, conversation_history=None, session_key=None, budget=None) -> ChatReply:
+    """Get AI reply with its generation metadata; with a conversation history the earlier turns are used
+    as context. The latency budget counts from this call, so time spent queueing for the model is included."""
+    budget = (budget or GENERATION_BUDGETS['default']).start()
+    reply = faq_reply(user_message, budget)
+    if reply is not None:
+        return reply
+
+    if inference_client is not None:
+        def generate():
+            return inference_client.generate(user_message, conversation_history, session_key, budget)
+    elif conversation_history is not None:
+        def generate():
+            brian_model = registry.get(DEFAULT_MODEL)
+            return brian_model.get_conversation_reply(user_message, conversation_history, session_key, budget)
+    else:
+        def generate():
+            return _generate_reply(user_message, budget)
+
+    # Only context-free prompts repeat often enough to cache
+    if response_cache is None or conversation_history:
+        return generate()
+
+    replies = []
+
+    def generate_text():
+        replies.append(generate())
+        return replies[0].text
+
+    def cacheable(text):
+        # A reply cut short by its deadline depends on load at the time; don't serve it to others
+        return replies[0].generation.get('stop_reason') != 'deadline'
+
+    params = dict(GENERATION_CONFIG, conversation=conversation_history is not None, **budget.cache_params())
+    key = response_cache.make_key(user_message, registry.describe(DEFAULT_MODEL), params)
+    text = response_cache.get_or_generate(key, generate_text, cacheable)
+    if replies:
+        return replies[0]
+    return ChatReply(text, {'stop_reason': 'cached', 'new_tokens': 0, 'latency_budget_ms': budget.latency_ms})
+
+
+def get_ai_response(user_message, conversation_history=None, session_key=None) -> str:
+    """Get AI response; with a conversation history the earlier turns are used as context"""
+    return get_ai_reply(user_message, conversation_history, session_key).text
+
+
+def stream_ai_response(user_message, conversation_history=None, budget=None, session_key=None) -> ResponseStream:
+    """Get AI response as a stream of text chunks; `session_key` lets a conversation reuse its cached state"""
+    budget = (budget or GENERATION_BUDGETS['default']).start()
+    reply = faq_reply(user_message, budget)
+    if reply is not None:
+        return AnswerStream(reply)
+
+    if inference_client is not None:
+        return inference_client.stream(user_message, conversation_history, session_key, budget)
+    brian_model = registry.get(DEFAULT_MODEL)
+    return brian_model.stream_response(user_message, conversation_history, budget, session_key)
+
+
+def forget_conversation(session_key=None):
+    """Drop a session's cached conversation state (all sessions if None), e.g. after deleting messages
+
+    States held by pool workers are not reached from here; they are only reused for a
+    matching token prefix, so stale ones are harmless and age out of the LRU.
+    """
+    for brian_model in registry.loaded_models():
+        if session_key is None:
+            brian_model.conversation_cache.clear()
+        else:
+            brian_model.conversation_cache.discard(session_key)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Full-text search over chat messages
+
+SQLite databases get an FTS5 table kept in sync with chat_messages by triggers,
+PostgreSQL a generated tsvector column with a GIN index. Either way the index
+follows every insert and delete, including bulk imports and cascading deletes.
+"""
+
+import abc
+import base64
+import html
+import logging
+import re
+from collections import namedtuple
+
+from sqlalchemy import DateTime, bindparam, text
+
+logger = logging.getLogger(__name__)
+
+# Private-use characters marking matches, so highlighting survives escaping the message text
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+MAX_TERMS = 16
+
+SearchMatch = namedtuple('SearchMatch', 'id is_user timestamp snippet')
+SearchGroup = namedtuple('SearchGroup', 'session_id score match_count messages')
+
+
+def search_terms(query):
+    """Words of a search query, all of which must match; operators and quotes are not special"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def highlight(snippet):
+    """HTML of a snippet with matched words in <mark>"""
+    return html.escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+def encode_offset_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode('utf-8')).decode('ascii')
+
+
+def decode_offset_cursor(cursor):
+    """Inverse of encode_offset_cursor; raises ValueError for malformed cursors"""
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        if kind != 'offset' or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class SearchIndex(abc.ABC):
+    """Ranks sessions by their best-matching message and highlights each session's top matches
+
+    Subclasses provide the DDL, HITS_SQL selecting every matching message with
+    a rank (lower is better) for :query, and SNIPPETS_SQL highlighting the
+    messages :ids. Every hit is scored exactly once, in one statement that also
+    picks the page of sessions and their best messages; snippets are only built
+    for the messages returned.
+    """
+
+    HITS_SQL = None
+    SNIPPETS_SQL = None
+
+    PAGE_SQL = """
+        WITH hits AS MATERIALIZED ({hits}),
+        page AS MATERIALIZED (
+            SELECT session_id, -MIN(rank) AS score, COUNT(*) AS match_count
+            FROM hits
+            GROUP BY session_id
+            ORDER BY score DESC, session_id
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT page.session_id, page.score, page.match_count, ranked.id, ranked.is_user, ranked.timestamp
+        FROM page JOIN (
+            SELECT id, session_id, is_user, timestamp,
+                   ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY rank, id DESC) AS position
+            FROM hits
+            WHERE session_id IN (SELECT session_id FROM page)
+        ) AS ranked ON ranked.session_id = page.session_id
+        WHERE ranked.position <= :per_session
+        ORDER BY page.score DESC, page.session_id, ranked.position
+    """
+
+    def __init__(self):
+        self._page = text(self.PAGE_SQL.format(hits=self.HITS_SQL)).columns(timestamp=DateTime)
+        self._snippets = text(self.SNIPPETS_SQL).bindparams(bindparam('ids', expanding=True))
+
+    @abc.abstractmethod
+    def install(self, connection):
+        """Create the index and whatever keeps it in sync with chat_messages"""
+
+    @abc.abstractmethod
+    def match_query(self, terms):
+        """The :query parameter of HITS_SQL matching every one of terms"""
+
+    def search(self, connection, terms, limit=20, offset=0, per_session=3):
+        """SearchGroups for one page of sessions, best first"""
+        query = self.match_query(terms)
+        rows = connection.execute(self._page, {
+            'query': query, 'limit': limit, 'offset': offset, 'per_session': per_session
+        }).all()
+        if not rows:
+            return []
+
+        snippets = dict(connection.execute(self._snippets, {'query': query, 'ids': [row.id for row in rows]}).all())
+        groups = {}
+        for row in rows:
+            group = groups.setdefault(row.session_id, SearchGroup(row.session_id, row.score, row.match_count, []))
+            group.messages.append(SearchMatch(row.id, bool(row.is_user), row.timestamp,
+                                              highlight(snippets.get(row.id, ''))))
+        return list(groups.values())
+
+
+class SqliteSearchIndex(SearchIndex):
+    """FTS5 external-content table over chat_messages, ranked by bm25"""
+
+    HITS_SQL = """
+        SELECT m.session_id, m.id, m.is_user, m.timestamp, fts.rank
+        FROM (SELECT rowid, rank FROM chat_messages_fts WHERE chat_messages_fts MATCH :query) AS fts
+        JOIN chat_messages AS m ON m.id = fts.rowid
+    """
+
+    # Looked up by rowid without bm25, whose corpus statistics would be recomputed per row
+    SNIPPETS_SQL = f"""
+        SELECT m.id, snippet(chat_messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24)
+        FROM chat_messages AS m CROSS JOIN chat_messages_fts ON chat_messages_fts.rowid = m.id
+        WHERE chat_messages_fts MATCH :query AND m.id IN :ids
+    """
+
+    DDL = [
+        """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+               INSERT INTO chat_messages_fts (rowid, message_text) VALUES (new.id, new.message_text);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+               INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message_text)
+               VALUES ('delete', old.id, old.message_text);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF message_text ON chat_messages BEGIN
+               INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message_text)
+               VALUES ('delete', old.id, old.message_text);
+               INSERT INTO chat_messages_fts (rowid, message_text) VALUES (new.id, new.message_text);
+           END""",
+    ]
+
+    def install(self, connection):
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+        )).first()
+        if not exists:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE chat_messages_fts USING fts5("
+                "message_text, content='chat_messages', content_rowid='id', tokenize='porter unicode61')"
+            ))
+        for statement in self.DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # Index the messages written before search existed
+            connection.execute(text("INSERT INTO chat_messages_fts (chat_messages_fts) VALUES ('rebuild')"))
+            logger.info("Built the chat message search index")
+
+    def match_query(self, terms):
+        return ' '.join(f'"{term}"' for term in terms)
+
+
+class PostgresSearchIndex(SearchIndex):
+    """Generated tsvector column with a GIN index, ranked by ts_rank_cd"""
+
+    HITS_SQL = """
+        SELECT m.session_id, m.id, m.is_user, m.timestamp, -ts_rank_cd(m.search_vector, q) AS rank
+        FROM chat_messages AS m, plainto_tsquery('english', :query) AS q
+        WHERE m.search_vector @@ q
+    """
+
+    SNIPPETS_SQL = f"""
+        SELECT m.id, ts_headline('english', m.message_text, plainto_tsquery('english', :query),
+                                 'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8')
+        FROM chat_messages AS m
+        WHERE m.id IN :ids
+    """
+
+    DDL = [
+        "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', message_text)) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_search_vector ON chat_messages USING GIN (search_vector)",
+    ]
+
+    def install(self, connection):
+        for statement in self.DDL:
+            connection.execute(text(statement))
+
+    def match_query(self, terms):
+        return ' '.join(terms)
+
+
+def create_search_index(engine):
+    """Install the search index for the engine's database; None if it has no supported full-text search"""
+    index_class = {'sqlite': SqliteSearchIndex, 'postgresql': PostgresSearchIndex}.get(engine.dialect.name)
+    if index_class is None:
+        logger.error(f"Full-text search is not supported on {engine.dialect.name}")
+        return None
+
+    index = index_class()
+    try:
+        with engine.begin() as connection:
+            index.install(connection)
+    except Exception as e:
+        logger.error(f"Could not create the search index: {e}")
+        return None
+    return index
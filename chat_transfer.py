@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Streaming NDJSON export and batched import of chat sessions and messages
+
+Each line is one record: {"type": "session", ...} followed by that session's
+{"type": "message", ...} records, oldest first.
+"""
+
+import gzip
+import io
+import json
+import logging
+import time
+import zlib
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+SESSION_FIELDS = ('session_id', 'session_name', 'created_at', 'last_activity')
+MESSAGE_FIELDS = ('session_id', 'message_text', 'is_user', 'timestamp')
+
+
+def export_records(db_session, sessions_table, messages_table, batch_size=1000):
+    """Yield session and message records from one streamed, session-ordered query
+
+    Sessions are joined to their messages and read `batch_size` rows at a time
+    through a server-side cursor, so memory stays flat however much is exported.
+    """
+    s, m = sessions_table.c, messages_table.c
+    query = (
+        select(s.session_id, s.session_name, s.created_at, s.last_activity,
+               m.message_text, m.is_user, m.timestamp)
+        .select_from(sessions_table.outerjoin(messages_table, m.session_id == s.session_id))
+        .order_by(s.session_id, m.timestamp, m.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    current = None
+    for row in db_session.execute(query):
+        if row.session_id != current:
+            current = row.session_id
+            yield {'type': 'session', 'session_id': row.session_id, 'session_name': row.session_name,
+                   'created_at': row.created_at.isoformat(), 'last_activity': row.last_activity.isoformat()}
+        if row.timestamp is not None:
+            yield {'type': 'message', 'session_id': row.session_id, 'message_text': row.message_text,
+                   'is_user': row.is_user, 'timestamp': row.timestamp.isoformat()}
+
+
+def encode_ndjson(records, compress=False, chunk_size=64 * 1024):
+    """NDJSON bytes in chunks of about `chunk_size`, as one gzip stream when `compress` is set"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    started = time.perf_counter()
+    count = 0
+    buffer = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+        buffer.append(line)
+        size += len(line)
+        count += 1
+        if size >= chunk_size:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Exported {count} records in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def open_ndjson(stream):
+    """Text lines of an NDJSON stream, gunzipped if it starts with the gzip magic number"""
+    buffered = stream if isinstance(stream, io.BufferedReader) else io.BufferedReader(stream)
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        buffered = gzip.GzipFile(fileobj=buffered)
+    return io.TextIOWrapper(buffered, encoding='utf-8')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value)
+
+
+class ChatImporter:
+    """Bulk-inserts exported records in transactions of `batch_size` rows
+
+    Sessions that already exist are left alone along with their messages, so
+    re-running an import is harmless. Messages must follow their session record,
+    as they do in an export; others are rejected.
+    """
+
+    def __init__(self, db_session, sessions_table, messages_table, batch_size=5000):
+        self.db_session = db_session
+        self.sessions_table = sessions_table
+        self.messages_table = messages_table
+        self.batch_size = batch_size
+        self._sessions = []
+        self._messages = []
+        # Last session record seen, and whether it is being imported (None until its batch is flushed)
+        self._current = None
+        self._current_imported = None
+        # Session imported by an earlier batch whose messages may still be queued
+        self._carried = None
+        self.started = time.perf_counter()
+        self.stats = {'sessions': 0, 'messages': 0, 'skipped_sessions': 0, 'skipped_messages': 0,
+                      'rejected_messages': 0, 'errors': 0, 'batches': 0}
+        self.error_samples = []
+
+    def add(self, record):
+        """Queue one record; raises ValueError (or KeyError) for malformed ones"""
+        kind = record.get('type')
+        if kind == 'session':
+            row = {field: record[field] for field in SESSION_FIELDS}
+            row['created_at'] = _parse_time(row['created_at'])
+            row['last_activity'] = _parse_time(row['last_activity'])
+            self._sessions.append(row)
+            self._current, self._current_imported = row['session_id'], None
+        elif kind == 'message':
+            row = {field: record[field] for field in MESSAGE_FIELDS}
+            row['timestamp'] = _parse_time(row['timestamp'])
+            row['is_user'] = bool(row['is_user'])
+            if row['session_id'] != self._current:
+                self.stats['rejected_messages'] += 1
+                return
+            if self._current_imported is False:
+                self.stats['skipped_messages'] += 1
+                return
+            self._messages.append(row)
+        else:
+            raise ValueError(f"Unknown record type: {kind!r}")
+
+        if len(self._sessions) + len(self._messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued rows in one transaction"""
+        if not self._sessions and not self._messages:
+            return
+        session_ids = [row['session_id'] for row in self._sessions]
+        existing = set()
+        for start in range(0, len(session_ids), 500):
+            existing.update(self.db_session.execute(
+                select(self.sessions_table.c.session_id)
+                .where(self.sessions_table.c.session_id.in_(session_ids[start:start + 500]))
+            ).scalars())
+
+        new_sessions = list({row['session_id']: row for row in self._sessions
+                             if row['session_id'] not in existing}.values())
+        imported = {row['session_id'] for row in new_sessions}
+        messages = [row for row in self._messages
+                    if row['session_id'] in imported or row['session_id'] == self._carried]
+
+        if new_sessions:
+            self.db_session.execute(insert(self.sessions_table), new_sessions)
+        if messages:
+            self.db_session.execute(insert(self.messages_table), messages)
+        self.db_session.commit()
+
+        self.stats['sessions'] += len(new_sessions)
+        self.stats['skipped_sessions'] += len(self._sessions) - len(new_sessions)
+        self.stats['messages'] += len(messages)
+        self.stats['skipped_messages'] += len(self._messages) - len(messages)
+        self.stats['batches'] += 1
+        if self._current in session_ids:
+            self._current_imported = self._current in imported
+        self._carried = self._current if self._current_imported else None
+        self._sessions, self._messages = [], []
+
+    def record_error(self, line_number, error):
+        self.stats['errors'] += 1
+        if len(self.error_samples) < 10:
+            self.error_samples.append(f"line {line_number}: {error}")
+
+    def finish(self):
+        """Flush the rest and report counts and throughput"""
+        self.flush()
+        elapsed = time.perf_counter() - self.started
+        rows = self.stats['sessions'] + self.stats['messages']
+        report = dict(self.stats, seconds=round(elapsed, 3),
+                      rows_per_second=round(rows / elapsed) if elapsed else 0, error_samples=self.error_samples)
+        logger.info(f"Imported {rows} rows in {elapsed:.1f}s ({report['rows_per_second']} rows/s)")
+        return report
+
+
+def import_ndjson(db_session, sessions_table, messages_table, stream, batch_size=5000):
+    """Import an NDJSON export (plain or gzip) from a binary stream; returns the import report"""
+    importer = ChatImporter(db_session, sessions_table, messages_table, batch_size)
+    for line_number, line in enumerate(open_ndjson(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            importer.add(json.loads(line))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            importer.record_error(line_number, f"{type(e).__name__}: {e}")
+    return importer.finish()
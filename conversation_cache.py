@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Memory-bounded cache of per-session attention key/value state
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ConversationState:
+    """Token ids of a session's transcript and the past_key_values computed for them"""
+
+    __slots__ = ('token_ids', 'past_key_values', 'nbytes')
+
+    def __init__(self, token_ids, past_key_values):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.nbytes = cache_nbytes(past_key_values)
+
+
+def cache_nbytes(past_key_values):
+    """Memory held by the key/value tensors of a cache"""
+    return sum(layer.keys.nbytes + layer.values.nbytes
+               for layer in past_key_values.layers
+               if layer.keys is not None)
+
+
+def common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class ConversationCache:
+    """LRU cache of ConversationState per session, bounded by total tensor memory"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._states = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+
+    def take(self, session_key):
+        """Remove and return a session's state so only one request uses it at a time"""
+        with self._lock:
+            state = self._states.pop(session_key, None)
+            if state is None:
+                self.misses += 1
+                return None
+            self._bytes -= state.nbytes
+            self.hits += 1
+            return state
+
+    def put(self, session_key, state):
+        """Store a session's state, evicting least recently used sessions over the budget"""
+        if state.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._states.pop(session_key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._states[session_key] = state
+            self._bytes += state.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._states.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def record_reuse(self, tokens):
+        with self._lock:
+            self.reused_tokens += tokens
+
+    def discard(self, session_key):
+        with self._lock:
+            state = self._states.pop(session_key, None)
+            if state is not None:
+                self._bytes -= state.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._states),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reused_tokens': self.reused_tokens
+            }
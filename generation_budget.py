@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Latency budgets and stopping criteria for chat generation
+"""
+
+import re
+import threading
+import time
+from collections import namedtuple
+
+# Two lowercase letters before the punctuation, so "Mr.", "e.g." or the "14." of "14.5" do not count
+SENTENCE_END = re.compile(r'(?:[a-z]{2}|%)[.!?]["\')\]]*\s*$')
+
+# The model has started writing the user's next turn
+TURN_MARKER = 'User:'
+
+# A generated reply and its metadata (stop reason, tokens, timings) for the API response
+ChatReply = namedtuple('ChatReply', 'text generation')
+
+
+class GenerationBudget(namedtuple('GenerationBudget',
+                                  'latency_ms max_new_tokens min_new_tokens stop_at repeat_ngram deadline',
+                                  defaults=(None, 100, 16, 'sentence', 4, None))):
+    """How much a single generation may spend, and where it may stop early
+
+    latency_ms      wall-clock budget for generating, None for no limit
+    max_new_tokens  hard cap, lowered further to what the latency budget affords
+    min_new_tokens  tokens to generate before stopping at a boundary
+    stop_at         'sentence', 'paragraph' or None
+    repeat_ngram    stop once the last n generated tokens repeat earlier ones (0 disables)
+    deadline        epoch seconds, set by start()
+    """
+
+    def start(self):
+        """This budget with its deadline counting from now"""
+        if not self.latency_ms:
+            return self
+        return self._replace(deadline=time.time() + self.latency_ms / 1000)
+
+    def cache_params(self):
+        """Settings that shape the output; the latency budget is left out"""
+        return {'max_new_tokens': self.max_new_tokens, 'min_new_tokens': self.min_new_tokens,
+                'stop_at': self.stop_at, 'repeat_ngram': self.repeat_ngram}
+
+
+class LatencyEstimate:
+    """Moving averages of prefill time per prompt token and decode time per step"""
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.prefill_ms_per_token = None
+        self.decode_ms_per_step = None
+        self._lock = threading.Lock()
+
+    def _average(self, current, sample):
+        return sample if current is None else current + self.smoothing * (sample - current)
+
+    def update(self, prompt_tokens, prefill_ms, decode_steps, decode_ms):
+        with self._lock:
+            if prompt_tokens:
+                self.prefill_ms_per_token = self._average(self.prefill_ms_per_token, prefill_ms / prompt_tokens)
+            if decode_steps:
+                self.decode_ms_per_step = self._average(self.decode_ms_per_step, decode_ms / decode_steps)
+
+    def affordable_tokens(self, prompt_tokens, budget_ms):
+        """Tokens that fit in `budget_ms` after prefilling the prompt, or None before any measurement"""
+        with self._lock:
+            if self.decode_ms_per_step is None:
+                return None
+            prefill_ms = (self.prefill_ms_per_token or 0.0) * prompt_tokens
+            return int((budget_ms - prefill_ms) / self.decode_ms_per_step)
+
+
+def plan_max_new_tokens(budgets, prompt_tokens, room, latency):
+    """max_new_tokens for one generate call: the budgets' cap, the context room left and what time affords"""
+    limit = min(max(b.max_new_tokens for b in budgets), room)
+    deadlines = [b.deadline for b in budgets]
+    if all(deadlines):
+        affordable = latency.affordable_tokens(prompt_tokens, (max(deadlines) - time.time()) * 1000)
+        if affordable is not None:
+            limit = min(limit, affordable)
+    return max(limit, 1)
+
+
+def repeats_ngram(tokens, n):
+    """Whether the last n tokens already occurred earlier in `tokens`"""
+    last = tokens[-n:]
+    return any(tokens[i:i + n] == last for i in range(len(tokens) - n))
+
+
+class BudgetCriteria:
+    """Stopping criterion applying each row's budget in a (batched) generate call
+
+    Records per row why it stopped and how many generated tokens to keep.
+    """
+
+    def __init__(self, tokenizer, prompt_length, budgets, max_new_tokens):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.budgets = budgets
+        self.max_new_tokens = max_new_tokens
+        self.reasons = [None] * len(budgets)
+        self.lengths = [None] * len(budgets)
+        self.started = time.perf_counter()
+        self.first_step = None
+        self.finished = None
+        self.steps = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        if self.first_step is None:
+            self.first_step = time.perf_counter()
+        self.steps += 1
+
+        now = time.time()
+        for row, budget in enumerate(self.budgets):
+            if self.reasons[row] is None:
+                stop = self._check(input_ids[row, self.prompt_length:].tolist(), budget, now)
+                if stop is not None:
+                    self.reasons[row], self.lengths[row] = stop
+        return torch.tensor([reason is not None for reason in self.reasons], device=input_ids.device)
+
+    def _check(self, tokens, budget, now):
+        """(reason, tokens to keep) if this row should stop, else None"""
+        if self.tokenizer.eos_token_id in tokens:
+            return 'eos', tokens.index(self.tokenizer.eos_token_id)
+        if budget.deadline and now >= budget.deadline:
+            return 'deadline', len(tokens)
+
+        n = budget.repeat_ngram
+        if n and len(tokens) >= 2 * n and repeats_ngram(tokens, n):
+            # Keep the text up to where it started repeating itself
+            return 'repetition', len(tokens) - n
+
+        tail = self.tokenizer.decode(tokens[-6:], skip_special_tokens=True)
+        if TURN_MARKER in tail:
+            return 'turn_end', len(tokens)
+        if len(tokens) >= budget.min_new_tokens:
+            if tail.endswith('\n') and budget.stop_at is not None:
+                return 'paragraph', len(tokens)
+            if budget.stop_at == 'sentence' and SENTENCE_END.search(tail):
+                return 'sentence', len(tokens)
+        return None
+
+    def finish(self, sequences):
+        """Settle rows that ran to the end (eos or max_new_tokens) once generation has returned"""
+        self.finished = time.perf_counter()
+        eos_token_id = self.tokenizer.eos_token_id
+        for row in range(len(self.budgets)):
+            if self.reasons[row] is None:
+                tokens = sequences[row, self.prompt_length:].tolist()
+                if eos_token_id in tokens:
+                    self.reasons[row], self.lengths[row] = 'eos', tokens.index(eos_token_id)
+                else:
+                    self.reasons[row], self.lengths[row] = 'max_tokens', len(tokens)
+
+    def generated(self, sequences, row):
+        """Generated token ids of a row that are kept"""
+        return sequences[row, self.prompt_length:self.prompt_length + self.lengths[row]]
+
+    def update_latency(self, latency, prompt_tokens):
+        if self.first_step is not None:
+            latency.update(prompt_tokens, 1000 * (self.first_step - self.started),
+                           self.steps - 1, 1000 * (self.finished - self.first_step))
+
+    def generation_info(self, row):
+        """Response metadata for a row"""
+        budget = self.budgets[row]
+        return {
+            'stop_reason': self.reasons[row],
+            'new_tokens': self.lengths[row],
+            'max_new_tokens': self.max_new_tokens,
+            'latency_budget_ms': budget.latency_ms,
+            'generate_ms': round(1000 * ((self.finished or time.perf_counter()) - self.started), 1)
+        }
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+CPU inference backends for the chat model
+"""
+
+import logging
+import warnings
+
+import torch
+from transformers.pytorch_utils import Conv1D
+
+logger = logging.getLogger(__name__)
+
+# fp32: stock weights; int8: dynamic quantization of Linear layers;
+# bf16: bfloat16 weights where the CPU supports it; compile: torch.compile'd forward pass
+INFERENCE_BACKENDS = ('fp32', 'int8', 'bf16', 'compile')
+
+
+def configure_threads(num_threads=None, interop_threads=None):
+    """Set torch intra-op and inter-op thread counts for this process"""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only allowed before the first parallel operation in the process
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+
+def bf16_supported():
+    is_supported = getattr(torch.cpu, '_is_avx512_bf16_supported', None)
+    return bool(is_supported and is_supported())
+
+
+def conv1d_to_linear(model):
+    """Swap GPT-2's Conv1D projections for equivalent nn.Linear layers so they can be quantized"""
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+def apply_backend(model, backend):
+    """Return `model` prepared for the given backend"""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    if backend == 'int8':
+        conv1d_to_linear(model)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'bf16':
+        if bf16_supported():
+            model = model.to(torch.bfloat16)
+        else:
+            logger.warning("bf16 is not supported on this CPU, using fp32")
+    elif backend == 'compile':
+        model.forward = torch.compile(model.forward, dynamic=True)
+
+    return model
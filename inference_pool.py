@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+Out-of-process inference: a pool of model worker processes served over a Unix socket
+
+    python -m inference_pool --socket /tmp/brian-inference.sock --workers 2 --threads 2
+
+Web workers connect with InferenceClient (set INFERENCE_SOCKET), so web and
+inference processes can be scaled independently and every model copy has its
+own pinned torch threads.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from generation_budget import ChatReply, GenerationBudget
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceError(Exception):
+    """Generation failed in the inference pool"""
+
+
+class InferenceTimeout(InferenceError):
+    """No worker was free, or the worker did not answer, within the timeout"""
+
+
+class InferenceWorkerCrashed(InferenceError):
+    """The worker process died while handling a request"""
+
+
+def send_message(sock, message):
+    """Write one length-prefixed JSON frame"""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            if buffer:
+                raise ConnectionError("Connection closed mid-message")
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """Read one length-prefixed JSON frame; None when the peer closed the connection"""
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, struct.unpack('>I', header)[0])
+    if data is None:
+        raise ConnectionError("Connection closed mid-message")
+    return json.loads(data)
+
+
+def _worker_main(conn, model_factory, cores=None):
+    """Inference worker process: load one model and answer requests from the pool"""
+    try:
+        if cores and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        model = model_factory()
+        model.initialize()
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        op = request['op']
+        if op == 'cancel':
+            # Arrived after the stream it was meant for had already finished
+            continue
+        try:
+            if op == 'ping':
+                conn.send(('pong', None))
+            elif op == 'generate':
+                budget = GenerationBudget(*request['budget']) if request.get('budget') else None
+                if request['conversation_history'] is None:
+                    reply = model.get_replies([request['message']], [budget])[0]
+                else:
+                    reply = model.get_conversation_reply(
+                        request['message'], request['conversation_history'], request['session_key'], budget)
+                conn.send(('result', list(reply)))
+            elif op == 'stream':
+                budget = GenerationBudget(*request['budget']) if request.get('budget') else None
+                stream = model.stream_response(request['message'], request['conversation_history'], budget,
+                                               request['session_key'])
+                for chunk in stream:
+                    conn.send(('chunk', chunk))
+                    # The pool asks to stop when the client has gone away
+                    if conn.poll() and conn.recv()['op'] == 'cancel':
+                        stream.cancel()
+                conn.send(('result', [stream.result, stream.generation]))
+            else:
+                conn.send(('error', f"Unknown operation: {op}"))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, slot):
+        self.slot = slot
+        self.process = None
+        self.conn = None
+        self.state = 'starting'  # starting, idle, busy or failed
+        self.requests = 0
+        self.restarts = 0
+        self.last_used = time.monotonic()
+
+
+class InferenceWorkerPool:
+    """Fixed set of model processes; each handles one request at a time and is restarted if it dies or hangs"""
+
+    def __init__(self, model_factory, workers=2, threads_per_worker=None, request_timeout=60,
+                 load_timeout=600, health_interval=10, pin_cores=False, start_method='spawn'):
+        self.model_factory = model_factory
+        self.threads_per_worker = threads_per_worker
+        self.request_timeout = request_timeout
+        self.load_timeout = load_timeout
+        self.health_interval = health_interval
+        self.pin_cores = pin_cores
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = [_Worker(slot) for slot in range(workers)]
+        self._cond = threading.Condition()
+        self._affinity = OrderedDict()
+        self._stopped = threading.Event()
+        self.timeouts = 0
+        self.crashes = 0
+
+    def start(self):
+        for worker in self._workers:
+            self._spawn(worker)
+        threading.Thread(target=self._monitor, name="inference-health", daemon=True).start()
+
+    def _spawn(self, worker):
+        cores = None
+        if self.pin_cores and self.threads_per_worker:
+            first = worker.slot * self.threads_per_worker % (os.cpu_count() or 1)
+            cores = set(range(first, first + self.threads_per_worker))
+
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.model_factory, cores),
+                                        name=f"inference-worker-{worker.slot}", daemon=True)
+        process.start()
+        child_conn.close()
+        with self._cond:
+            worker.process, worker.conn, worker.state = process, parent_conn, 'starting'
+        threading.Thread(target=self._await_ready, args=(worker, process, parent_conn), daemon=True).start()
+
+    def _await_ready(self, worker, process, conn):
+        message = None
+        try:
+            if conn.poll(self.load_timeout):
+                message = conn.recv()
+        except (EOFError, OSError):
+            pass
+
+        ready = message is not None and message[0] == 'ready'
+        with self._cond:
+            if worker.process is not process:
+                return
+            worker.state = 'idle' if ready else 'failed'
+            self._cond.notify_all()
+        if ready:
+            logger.info(f"Inference worker {worker.slot} ready (pid {process.pid})")
+        else:
+            reason = message[1] if message else 'no response'
+            logger.error(f"Inference worker {worker.slot} failed to start: {reason}")
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process):
+        if process.is_alive():
+            process.kill()
+        process.join(timeout=5)
+
+    def _restart(self, worker):
+        logger.error(f"Restarting inference worker {worker.slot} (pid {worker.process.pid})")
+        self._kill(worker.process)
+        worker.conn.close()
+        worker.restarts += 1
+        if not self._stopped.is_set():
+            self._spawn(worker)
+
+    def _acquire(self, session_key=None):
+        """Take an idle worker, preferring the one holding the session's cached conversation state"""
+        deadline = time.monotonic() + self.request_timeout
+        with self._cond:
+            while True:
+                idle = [w for w in self._workers if w.state == 'idle']
+                if idle:
+                    preferred = self._affinity.get(session_key)
+                    worker = next((w for w in idle if w.slot == preferred), idle[0])
+                    worker.state = 'busy'
+                    worker.requests += 1
+                    return worker
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopped.is_set():
+                    self.timeouts += 1
+                    raise InferenceTimeout("No inference worker became available")
+                self._cond.wait(remaining)
+
+    def _release(self, worker, session_key=None):
+        with self._cond:
+            worker.state = 'idle'
+            worker.last_used = time.monotonic()
+            if session_key:
+                self._affinity[session_key] = worker.slot
+                self._affinity.move_to_end(session_key)
+                if len(self._affinity) > 10000:
+                    self._affinity.popitem(last=False)
+            self._cond.notify_all()
+
+    def _send(self, worker, request):
+        try:
+            worker.conn.send(request)
+        except (EOFError, OSError) as e:
+            self.crashes += 1
+            raise InferenceWorkerCrashed(f"Inference worker {worker.slot} exited: {e}")
+
+    def _receive(self, worker, timeout=None):
+        timeout = self.request_timeout if timeout is None else timeout
+        try:
+            if not worker.conn.poll(timeout):
+                self.timeouts += 1
+                raise InferenceTimeout(f"Inference worker {worker.slot} did not answer within {timeout}s")
+            return worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self.crashes += 1
+            raise InferenceWorkerCrashed(f"Inference worker {worker.slot} exited: {e}")
+
+    def generate(self, message, conversation_history=None, session_key=None, budget=None):
+        """Generate a complete reply, as [text, generation metadata], on a free worker"""
+        worker = self._acquire(session_key)
+        healthy = False
+        try:
+            self._send(worker, {'op': 'generate', 'message': message, 'conversation_history': conversation_history,
+                                'session_key': session_key, 'budget': budget})
+            kind, value = self._receive(worker)
+            healthy = True
+        finally:
+            if healthy:
+                self._release(worker, session_key)
+            else:
+                self._restart(worker)
+
+        if kind == 'error':
+            raise InferenceError(value)
+        return value
+
+    def stream(self, message, conversation_history=None, session_key=None, budget=None):
+        """Yield ('chunk', text) pairs as they are generated, then ('result', [cleaned response, metadata])"""
+        worker = self._acquire(session_key)
+        healthy = False
+        try:
+            self._send(worker, {'op': 'stream', 'message': message, 'conversation_history': conversation_history,
+                                'session_key': session_key, 'budget': budget})
+            while True:
+                kind, value = self._receive(worker)
+                # The worker is done (and reusable) once it sends a result or an error
+                healthy = kind != 'chunk'
+                if kind == 'error':
+                    raise InferenceError(value)
+                yield kind, value
+                if kind == 'result':
+                    return
+        except GeneratorExit:
+            # The client went away: stop generating, then drain the worker before reusing it
+            if not healthy:
+                healthy = self._drain(worker)
+            raise
+        finally:
+            if healthy:
+                self._release(worker, session_key)
+            else:
+                self._restart(worker)
+
+    def _drain(self, worker):
+        try:
+            self._send(worker, {'op': 'cancel'})
+            while self._receive(worker)[0] == 'chunk':
+                pass
+            return True
+        except InferenceError:
+            return False
+
+    def _monitor(self):
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        """Restart failed, dead or unresponsive workers; idle workers are pinged"""
+        for worker in self._workers:
+            with self._cond:
+                if worker.state == 'failed' or (worker.state == 'idle' and not worker.process.is_alive()):
+                    action = 'restart'
+                elif worker.state == 'idle':
+                    worker.state = 'busy'
+                    action = 'ping'
+                else:
+                    action = None
+
+            if action == 'restart':
+                self._restart(worker)
+            elif action == 'ping':
+                try:
+                    self._send(worker, {'op': 'ping'})
+                    healthy = self._receive(worker, timeout=5)[0] == 'pong'
+                except InferenceError:
+                    healthy = False
+                if healthy:
+                    self._release(worker)
+                else:
+                    self._restart(worker)
+
+    def stats(self):
+        with self._cond:
+            workers = [{'slot': w.slot, 'pid': w.process.pid if w.process else None, 'state': w.state,
+                        'requests': w.requests, 'restarts': w.restarts} for w in self._workers]
+        return {
+            'workers': workers,
+            'ready_workers': sum(1 for w in workers if w['state'] in ('idle', 'busy')),
+            'busy_workers': sum(1 for w in workers if w['state'] == 'busy'),
+            'requests': sum(w['requests'] for w in workers),
+            'restarts': sum(w['restarts'] for w in workers),
+            'timeouts': self.timeouts,
+            'crashes': self.crashes
+        }
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        for worker in self._workers:
+            if worker.process is not None:
+                self._kill(worker.process)
+
+
+class _InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests from one client connection until it closes"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+                if request is None:
+                    return
+                self.dispatch(request)
+            except (OSError, ValueError):
+                # Client went away or sent a malformed frame
+                return
+
+    def dispatch(self, request):
+        pool = self.server.pool
+        op = request.get('op')
+        args = (request.get('message'), request.get('conversation_history'), request.get('session_key'),
+                request.get('budget'))
+        try:
+            if op == 'stats':
+                send_message(self.request, {'result': pool.stats()})
+            elif op == 'generate':
+                send_message(self.request, {'result': pool.generate(*args)})
+            elif op == 'stream':
+                stream = pool.stream(*args)
+                try:
+                    for kind, value in stream:
+                        send_message(self.request, {kind: value})
+                finally:
+                    stream.close()
+            else:
+                send_message(self.request, {'error': f"Unknown operation: {op}"})
+        except InferenceError as e:
+            send_message(self.request, {'error': str(e), 'timeout': isinstance(e, InferenceTimeout)})
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket front end of an InferenceWorkerPool"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.pool = pool
+        super().__init__(socket_path, _InferenceRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class InferenceClient:
+    """Connection to an InferenceServer with the same calls as the in-process model; one socket per thread"""
+
+    def __init__(self, socket_path, timeout=120):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _request(self, payload):
+        for attempt in range(2):
+            sock = getattr(self._local, 'sock', None)
+            fresh = sock is None
+            if fresh:
+                sock = self._local.sock = self._connect()
+            try:
+                send_message(sock, payload)
+                response = recv_message(sock)
+                if response is None:
+                    raise ConnectionError("Inference server closed the connection")
+                break
+            except socket.timeout:
+                self._local.sock = None
+                sock.close()
+                raise InferenceTimeout(f"No response from the inference server within {self.timeout}s")
+            except OSError:
+                self._local.sock = None
+                sock.close()
+                # A kept-alive connection may have gone stale (e.g. server restart); retry once on a new one
+                if fresh or attempt:
+                    raise
+
+        if 'error' in response:
+            raise (InferenceTimeout if response.get('timeout') else InferenceError)(response['error'])
+        return response['result']
+
+    def generate(self, message, conversation_history=None, session_key=None, budget=None):
+        return ChatReply(*self._request({'op': 'generate', 'message': message,
+                                         'conversation_history': conversation_history,
+                                         'session_key': session_key, 'budget': budget}))
+
+    def stream(self, message, conversation_history=None, session_key=None, budget=None):
+        """Start a streamed generation on its own connection; closing it cancels generation"""
+        sock = self._connect()
+        send_message(sock, {'op': 'stream', 'message': message, 'conversation_history': conversation_history,
+                            'session_key': session_key, 'budget': budget})
+        return RemoteResponseStream(sock)
+
+    def stats(self):
+        return self._request({'op': 'stats'})
+
+
+class RemoteResponseStream:
+    """ResponseStream counterpart for generation running in the inference pool"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.error = None
+        self.result = None
+        self.generation = None
+
+    def __iter__(self):
+        try:
+            while True:
+                frame = recv_message(self.sock)
+                if frame is None:
+                    raise ConnectionError("Inference server closed the stream")
+                if 'chunk' in frame:
+                    yield frame['chunk']
+                elif 'result' in frame:
+                    self.result, self.generation = frame['result']
+                    return
+                else:
+                    self.error = InferenceError(frame['error'])
+                    raise self.error
+        except socket.timeout:
+            raise InferenceTimeout("Inference server stopped streaming")
+        finally:
+            self.sock.close()
+
+    def cancel(self):
+        """Stop generation, e.g. when the client disconnects"""
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=os.environ.get("INFERENCE_SOCKET", "/tmp/brian-inference.sock"))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get("INFERENCE_WORKERS", 2)))
+    parser.add_argument('--threads', type=int, help='torch threads per worker (default: cores / workers)')
+    parser.add_argument('--pin-cores', action='store_true', help='pin each worker to its own cores')
+    parser.add_argument('--timeout', type=float, default=float(os.environ.get("INFERENCE_TIMEOUT", 60)),
+                        help='seconds to wait for a free worker and for each response')
+    parser.add_argument('--model', default=os.environ.get("CHAT_MODEL_NAME", "gpt2"))
+    parser.add_argument('--backend', default=os.environ.get("INFERENCE_BACKEND", "fp32"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from chat_model import BrianChatModel
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    model_factory = functools.partial(BrianChatModel, args.model, backend=args.backend,
+                                      num_threads=threads, interop_threads=1)
+    pool = InferenceWorkerPool(model_factory, workers=args.workers, threads_per_worker=threads,
+                               request_timeout=args.timeout, pin_cores=args.pin_cores)
+    pool.start()
+
+    server = InferenceServer(args.socket, pool)
+    logger.info(f"Inference pool of {args.workers} workers x {threads} threads listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Intent classification and an FAQ fast path that answers common questions without the chat model
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+
+from metrics import INTENT_ANSWERS, INTENT_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Real estate categories in priority order; the first one found names the session
+CATEGORY_PATTERNS = [
+    ('buying', 'Buying Property', r'\bbuy|buying|purchase\b'),
+    ('selling', 'Selling Property', r'\bsell|selling|sale\b'),
+    ('rental', 'Rental Inquiry', r'\brent|rental|renting\b'),
+    ('investment', 'Investment Advice', r'\binvest|investment|investing\b'),
+    ('market', 'Market Analysis', r'\bmarket|price|value|appraisal\b'),
+    ('financing', 'Financing Help', r'\bmortgage|loan|financing\b'),
+    ('property', 'Property Search', r'\bcondo|apartment|house|home\b'),
+    ('location', 'Location Guide', r'\bneighborhood|area|location\b'),
+    ('commercial', 'Commercial Real Estate', r'\bcommercial|office|retail\b'),
+    ('first_time', 'First-Time Buyer', r'\bfirst.time|first time\b'),
+]
+CATEGORY_LABELS = {name: label for name, label, _ in CATEGORY_PATTERNS}
+
+# Greetings and politeness that do not change what is being asked
+FILLER = re.compile(r"^(?:(?:hi|hello|hey)(?: brian)?|brian|please|(?:can|could) you (?:please )?tell me)\s+")
+
+Route = namedtuple('Route', 'category intent answer')
+
+
+class IntentMatcher:
+    """Named patterns compiled into one alternation, so a message is scanned once however many there are"""
+
+    def __init__(self, patterns, flags=re.IGNORECASE):
+        self.names = [name for name, _ in patterns]
+        alternatives = [f"(?P<i{index}>{pattern})" for index, (_, pattern) in enumerate(patterns)]
+        self._regex = re.compile('|'.join(alternatives), flags) if patterns else None
+
+    def _name(self, match):
+        return self.names[int(match.lastgroup[1:])]
+
+    def find_all(self, text):
+        """Names of the patterns found anywhere in `text`, in pattern order"""
+        if self._regex is None:
+            return []
+        found = {int(match.lastgroup[1:]) for match in self._regex.finditer(text)}
+        return [self.names[index] for index in sorted(found)]
+
+    def first(self, text):
+        """Highest-priority pattern found in `text`, or None"""
+        found = self.find_all(text)
+        return found[0] if found else None
+
+    def fullmatch(self, text):
+        """The pattern matching all of `text`, or None"""
+        match = self._regex.fullmatch(text) if self._regex is not None else None
+        return self._name(match) if match else None
+
+
+CATEGORY_MATCHER = IntentMatcher([(name, pattern) for name, _, pattern in CATEGORY_PATTERNS])
+
+
+def normalize_question(text):
+    """Lowercase words only, without punctuation or a leading greeting"""
+    text = re.sub(r"[^a-z0-9'$% -]+", ' ', text.lower())
+    text = re.sub(r'\s+', ' ', text).strip()
+    while True:
+        stripped = FILLER.sub('', text)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+class AnswerStore:
+    """Curated FAQ answers from a JSON file, reloaded when the file's mtime changes
+
+    The file holds a list of {"intent", "questions", "answer"} entries; "questions"
+    are regexes that must match the whole normalized question, so only messages
+    that ask exactly that are answered from here.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = (IntentMatcher([]), {})
+        self.reloads = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _check(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                self._load(mtime)
+
+    def _load(self, mtime):
+        self._mtime = mtime
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                answers = {entry['intent']: entry['answer'] for entry in entries}
+                matcher = IntentMatcher([(entry['intent'], question)
+                                         for entry in entries for question in entry['questions']], flags=0)
+            except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+                # Keep serving the previous answers until the file is fixed
+                logger.error(f"Could not load FAQ answers from {self.path}: {e}")
+                return
+        else:
+            answers, matcher = {}, IntentMatcher([])
+
+        # Swapped as one tuple so lookups never see a matcher with another version's answers
+        self._entries = (matcher, answers)
+        self.reloads += 1
+        logger.info(f"Loaded {len(answers)} FAQ answers from {self.path}")
+
+    def lookup(self, question):
+        """(intent, answer) for a normalized question, or (None, None)"""
+        self._check()
+        matcher, answers = self._entries
+        intent = matcher.fullmatch(question)
+        return (intent, answers[intent]) if intent else (None, None)
+
+    def __len__(self):
+        return len(self._entries[1])
+
+
+class IntentRouter:
+    """Classifies each chat message and answers curated FAQs before the model is called"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.messages = 0
+        self._categories = {}
+        self._answered = {}
+
+    def route(self, message):
+        """Category and, for a known FAQ, its intent and answer (answer None: ask the model)"""
+        category = CATEGORY_MATCHER.first(message) or 'other'
+        intent, answer = self.store.lookup(normalize_question(message))
+
+        INTENT_MESSAGES.inc(intent=category)
+        if intent:
+            INTENT_ANSWERS.inc(intent=intent)
+        with self._lock:
+            self.messages += 1
+            self._categories[category] = self._categories.get(category, 0) + 1
+            if intent:
+                self._answered[intent] = self._answered.get(intent, 0) + 1
+        return Route(category, intent, answer)
+
+    def stats(self):
+        """Messages per category, FAQ answers per intent and model calls avoided"""
+        with self._lock:
+            answered = sum(self._answered.values())
+            return {
+                'messages': self.messages,
+                'model_calls_avoided': answered,
+                'hit_rate': answered / self.messages if self.messages else 0.0,
+                'faq_entries': len(self.store),
+                'categories': dict(self._categories),
+                'answered': {intent: {'hits': hits, 'hit_rate': hits / self.messages}
+                             for intent, hits in self._answered.items()}
+            }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Bounded in-process job queue that runs chat generation off the request threads
+"""
+
+import logging
+import math
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class ChatJob:
+    """A unit of queued work and its outcome"""
+
+    def __init__(self, func, args):
+        self.id = str(uuid.uuid4())
+        self.func = func
+        self.args = args
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'queue_wait_ms': round(1000 * ((self.started_at or time.time()) - self.created_at), 1)
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class ChatJobQueue:
+    """Fixed pool of worker threads fed by a bounded queue"""
+
+    def __init__(self, workers=2, max_queue_size=32, result_ttl=300):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"chat-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func, *args):
+        """Queue `func(*args)`; raises QueueFullError instead of blocking when full"""
+        self._ensure_workers()
+        self._prune()
+        job = ChatJob(func, args)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+                self._rejected += 1
+            raise QueueFullError(self.retry_after())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or `timeout` seconds pass (long-polling)"""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            job.status = 'running'
+            try:
+                job.result = job.func(*job.args)
+                job.status = 'done'
+            except Exception as e:
+                logger.error(f"Chat job error: {e}")
+                job.error = 'Internal server error'
+                job.status = 'failed'
+            job.finished_at = time.time()
+            self._record(job)
+            job.done.set()
+
+    def _record(self, job):
+        wait = job.started_at - job.created_at
+        with self._lock:
+            if job.status == 'done':
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._service_total += job.finished_at - job.started_at
+
+    def _prune(self):
+        """Forget finished jobs whose results are older than the TTL"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, based on current depth and service time"""
+        with self._lock:
+            finished = self._completed + self._failed
+            service_time = self._service_total / finished if finished else 1.0
+        return max(1, math.ceil(self._queue.qsize() * service_time / self.workers))
+
+    def stats(self):
+        """Queue depth and wait-time statistics"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                'depth': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'workers': self.workers,
+                'running': sum(1 for job in self._jobs.values() if job.status == 'running'),
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'mean_wait_ms': 1000 * self._wait_total / finished if finished else 0.0,
+                'max_wait_ms': 1000 * self._wait_max
+            }
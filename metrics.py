@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Lightweight Prometheus-style metrics for the chat application
+"""
+
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stage durations of the current request, reported in the Server-Timing header
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and callbacks that report component statistics at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, prefix, documentation, collect):
+        """Expose the numeric fields of `collect()` (a stats dict) as gauges named prefix_field"""
+        self._collectors.append((prefix, documentation, collect))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, documentation, collect in self._collectors:
+            stats = collect()
+            if stats is None:
+                continue
+            for field, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{field}"
+                lines.append(f"# HELP {name} {documentation}: {field.replace('_', ' ')}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'chat_stage_seconds', 'Time spent in each stage of handling a chat message', ['stage'])
+GENERATED_TOKENS = REGISTRY.counter(
+    'chat_generated_tokens_total', 'Tokens generated by the chat model')
+GENERATION_STOPS = REGISTRY.counter(
+    'chat_generation_stops_total', 'Why generation stopped (sentence, deadline, repetition, eos, ...)', ['reason'])
+INTENT_MESSAGES = REGISTRY.counter(
+    'chat_intent_messages_total', 'Chat messages by classified intent', ['intent'])
+INTENT_ANSWERS = REGISTRY.counter(
+    'chat_intent_answers_total', 'Messages answered from the FAQ store without calling the model', ['intent'])
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    'chat_generation_tokens_per_second', 'Generation throughput per generate call',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500))
+IMPORT_SECONDS = REGISTRY.gauge(
+    'app_import_seconds', 'Time taken to import the application and the inference libraries', ['module'])
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    'chat_model_load_seconds', 'Time taken to load the chat model', ['model'])
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', 'Requests currently being handled', ['endpoint'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'Request handling time', ['endpoint', 'method', 'status'])
+DB_QUERIES = REGISTRY.counter(
+    'db_queries_total', 'SQL statements executed', ['endpoint'])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'db_query_seconds', 'SQL statement execution time', ['endpoint'])
+
+
+def process_memory():
+    """Resident and proportional (shared pages split between processes) memory of this process in bytes"""
+    memory = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                field, value = line.split(':', 1)
+                if field in ('Rss', 'Pss'):
+                    memory[field.lower() + '_bytes'] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    if 'rss_bytes' not in memory:
+        try:
+            with open('/proc/self/statm') as f:
+                memory['rss_bytes'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            # ru_maxrss is the peak, in KiB on Linux
+            memory['rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return memory
+
+
+REGISTRY.register_collector('process', 'Worker process memory', process_memory)
+
+
+def start_request_timing():
+    """Begin collecting stage timings for the current request; returns the dict they are added to"""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def stop_request_timing():
+    _request_timings.set(None)
+
+
+def record_timing(stage, seconds):
+    """Add a duration to the current request's timings, if one is being collected"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    """Observe a block's duration in the stage histogram and the request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record_timing(stage, elapsed)
+
+
+def record_generation(new_tokens, seconds):
+    GENERATED_TOKENS.inc(new_tokens)
+    if seconds > 0:
+        TOKENS_PER_SECOND.observe(new_tokens / seconds)
+
+
+def server_timing_header(timings):
+    return ', '.join(f"{stage};dur={1000 * seconds:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped safetensors snapshots of model weights, shared between worker processes
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+
+import torch
+from safetensors.torch import save_file
+from transformers import AutoConfig, AutoModelForCausalLM
+
+logger = logging.getLogger(__name__)
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8,
+    'U8': torch.uint8, 'BOOL': torch.bool
+}
+
+
+def snapshot_path(snapshot_dir, model_name):
+    """Snapshot file for a hub model ID or local model path"""
+    filename = re.sub(r'[^A-Za-z0-9_.-]+', '--', model_name).strip('-')
+    return os.path.join(snapshot_dir, f"{filename}.safetensors")
+
+
+def load_safetensors_mmap(path):
+    """Tensors of a safetensors file as views of one private (copy-on-write) file mapping
+
+    Until a tensor is written to, its pages come straight from the page cache,
+    so every process mapping the same file shares one physical copy.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_size = struct.unpack('<Q', mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_size])
+    header.pop('__metadata__', None)
+
+    tensors = {}
+    for name, info in header.items():
+        start, end = info['data_offsets']
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        count = (end - start) // dtype.itemsize
+        if count:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=8 + header_size + start)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        tensors[name] = tensor.reshape(info['shape'])
+    return tensors
+
+
+def save_snapshot(model, path):
+    """Write the model's weights as a safetensors snapshot (atomically, as workers may race)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Store tied weights once, under their first name; tie_weights() restores the others on load
+    tensors = {}
+    seen = set()
+    for name, tensor in model.state_dict().items():
+        if tensor.data_ptr() not in seen:
+            seen.add(tensor.data_ptr())
+            tensors[name] = tensor.contiguous()
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save_file(tensors, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_from_snapshot(model_name, path):
+    """Build the model without allocating weights and point its parameters at the mapped snapshot"""
+    config = AutoConfig.from_pretrained(model_name)
+    with torch.device('meta'):
+        model = AutoModelForCausalLM.from_config(config)
+
+    model.load_state_dict(load_safetensors_mmap(path), strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, tensor in model.state_dict().items() if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot {path} is missing weights: {', '.join(missing)}")
+    # Non-persistent buffers (e.g. rotary inv_freq) are computed at init, never saved, so stay on meta
+    unset = [name for name, buffer in model.named_buffers() if buffer.is_meta]
+    if unset:
+        raise ValueError(f"Snapshot {path} cannot restore buffers: {', '.join(unset)}")
+    return model.eval()
+
+
+def load_pretrained(model_name, snapshot_dir=None):
+    """Load a causal LM, through a memory-mapped snapshot when `snapshot_dir` is set"""
+    if not snapshot_dir:
+        return AutoModelForCausalLM.from_pretrained(model_name)
+
+    path = snapshot_path(snapshot_dir, model_name)
+    if not os.path.exists(path):
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        try:
+            save_snapshot(model, path)
+        except OSError as e:
+            logger.error(f"Could not write model snapshot {path}: {e}")
+            return model
+        logger.info(f"Wrote model snapshot {path}")
+
+    try:
+        return load_from_snapshot(model_name, path)
+    except ValueError as e:
+        logger.error(f"{e}; loading {model_name} without the snapshot")
+        return AutoModelForCausalLM.from_pretrained(model_name)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Response cache for deterministic (greedy) chat generation
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """LRU + TTL cache of generated responses with single-flight generation"""
+
+    def __init__(self, max_size=1024, ttl=3600, store=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(message, model_name, params):
+        """Cache key for a normalized message, model and generation parameters"""
+        normalized = re.sub(r'\s+', ' ', message.strip()).lower()
+        payload = json.dumps([normalized, model_name, params], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return a fresh in-memory entry or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_generate(self, key, generate, cacheable=None):
+        """Return the cached response or run `generate` once for all concurrent callers
+
+        A generated value for which `cacheable(value)` is false is returned but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = self._load_from_store(key)
+            if value is None:
+                with self._lock:
+                    self.misses += 1
+                value = generate()
+                if cacheable is not None and not cacheable(value):
+                    future.set_result(value)
+                    return value
+                self._save_to_store(key, value)
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _load_from_store(self, key):
+        if self.store is None:
+            return None
+        try:
+            value = self.store.get(key, max_age=self.ttl)
+        except Exception as e:
+            logger.error(f"Response cache store error: {e}")
+            return None
+        if value is not None:
+            with self._lock:
+                self.store_hits += 1
+        return value
+
+    def _save_to_store(self, key, value):
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, value)
+        except Exception as e:
+            logger.error(f"Response cache store error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit, miss and coalesce counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'persistent': self.store is not None
+            }
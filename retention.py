@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Background purges and the retention policy that archives inactive chat sessions
+"""
+
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+
+logger = logging.getLogger(__name__)
+
+# A large delete finished in chunks: one session's messages up to max_message_id,
+# or (session_id None) every session up to max_session_id with its messages
+Purge = namedtuple('Purge', 'session_id max_message_id max_session_id')
+
+
+def delete_sessions(db_session, sessions_table, messages_table, session_ids):
+    """Set-based delete of sessions and their messages
+
+    Messages are deleted explicitly as well, for databases created before the
+    foreign key had ON DELETE CASCADE.
+    """
+    db_session.execute(delete(messages_table).where(messages_table.c.session_id.in_(session_ids)))
+    return db_session.execute(delete(sessions_table).where(sessions_table.c.session_id.in_(session_ids))).rowcount
+
+
+def purge_chunk(db_session, sessions_table, messages_table, purge, chunk_size=5000):
+    """Delete up to about `chunk_size` rows of a purge in one transaction; returns whether any are left"""
+    s, m = sessions_table.c, messages_table.c
+    if purge.session_id is not None:
+        message_ids = select(m.id).where(m.session_id == purge.session_id, m.id <= purge.max_message_id)
+    else:
+        # Empty the sessions first, so deleting them does not cascade into one giant statement
+        message_ids = (select(m.id).select_from(messages_table.join(sessions_table, s.session_id == m.session_id))
+                       .where(s.id <= purge.max_session_id))
+    deleted = db_session.execute(delete(messages_table).where(m.id.in_(message_ids.limit(chunk_size)))).rowcount
+
+    if purge.session_id is None and deleted < chunk_size:
+        session_ids = db_session.execute(
+            select(s.session_id).where(s.id <= purge.max_session_id).limit(chunk_size - deleted)
+        ).scalars().all()
+        if session_ids:
+            deleted += delete_sessions(db_session, sessions_table, messages_table, session_ids)
+    db_session.commit()
+    return deleted >= chunk_size
+
+
+def archive_payload(session_row, message_rows):
+    """A session and its messages as gzipped NDJSON in the export format, so an archive can be re-imported"""
+    records = [{'type': 'session', 'session_id': session_row.session_id, 'session_name': session_row.session_name,
+                'created_at': session_row.created_at.isoformat(),
+                'last_activity': session_row.last_activity.isoformat()}]
+    records.extend({'type': 'message', 'session_id': row.session_id, 'message_text': row.message_text,
+                    'is_user': row.is_user, 'timestamp': row.timestamp.isoformat()} for row in message_rows)
+    lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+    return gzip.compress(lines.encode('utf-8'))
+
+
+def archive_inactive_sessions(db_session, sessions_table, messages_table, archive_table, cutoff, batch_size=100):
+    """Move up to `batch_size` sessions inactive since before `cutoff` into the archive; returns how many
+
+    One transaction per call, oldest sessions first along the last_activity index.
+    """
+    s, m = sessions_table.c, messages_table.c
+    sessions = db_session.execute(
+        select(s.session_id, s.session_name, s.created_at, s.last_activity)
+        .where(s.last_activity < cutoff)
+        .order_by(s.last_activity, s.id)
+        .limit(batch_size)
+    ).all()
+    if not sessions:
+        return 0
+
+    session_ids = [row.session_id for row in sessions]
+    messages = {}
+    for row in db_session.execute(
+        select(m.session_id, m.message_text, m.is_user, m.timestamp)
+        .where(m.session_id.in_(session_ids))
+        .order_by(m.session_id, m.timestamp, m.id)
+    ):
+        messages.setdefault(row.session_id, []).append(row)
+
+    archived_at = datetime.utcnow()
+    db_session.execute(insert(archive_table), [{
+        'session_id': row.session_id,
+        'session_name': row.session_name,
+        'created_at': row.created_at,
+        'last_activity': row.last_activity,
+        'message_count': len(messages.get(row.session_id, [])),
+        'archived_at': archived_at,
+        'payload': archive_payload(row, messages.get(row.session_id, []))
+    } for row in sessions])
+    delete_sessions(db_session, sessions_table, messages_table, session_ids)
+    db_session.commit()
+    return len(sessions)
+
+
+class ChatPurger:
+    """Background thread that finishes large deletes in short transactions and applies retention
+
+    `purge_chunk(purge)` deletes one chunk and returns whether rows are left;
+    `archive_chunk()` archives one batch of inactive sessions and returns how
+    many. Pausing between chunks leaves the database to other writers.
+    """
+
+    def __init__(self, purge_chunk, archive_chunk=None, retention_interval=3600, pause=0.05, retry_delay=5):
+        self.purge_chunk = purge_chunk
+        self.archive_chunk = archive_chunk
+        self.retention_interval = retention_interval
+        self.pause = pause
+        self.retry_delay = retry_delay
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.next_retention = time.time()
+        self.purges = 0
+        self.purge_chunks = 0
+        self.failed_chunks = 0
+        self.archived_sessions = 0
+        self.retention_runs = 0
+        self.last_retention_at = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chat-purger", daemon=True)
+            self._thread.start()
+
+    def submit(self, purge):
+        """Finish a purge in the background"""
+        with self._lock:
+            self._pending.append(purge)
+        self._wakeup.set()
+
+    def _finish(self, purge):
+        while not self._stopped.is_set():
+            try:
+                more = self.purge_chunk(purge)
+            except Exception as e:
+                logger.error(f"Purge error: {e}")
+                self.failed_chunks += 1
+                return False
+            self.purge_chunks += 1
+            if not more:
+                self.purges += 1
+                return True
+            time.sleep(self.pause)
+        return False
+
+    def run_retention(self):
+        """Archive every session past the retention period, a batch per transaction; returns how many"""
+        archived = 0
+        while not self._stopped.is_set():
+            try:
+                count = self.archive_chunk()
+            except Exception as e:
+                logger.error(f"Retention error: {e}")
+                break
+            archived += count
+            if not count:
+                break
+            time.sleep(self.pause)
+
+        self.archived_sessions += archived
+        self.retention_runs += 1
+        self.last_retention_at = time.time()
+        if archived:
+            logger.info(f"Archived {archived} inactive chat sessions")
+        return archived
+
+    def _run(self):
+        while not self._stopped.is_set():
+            timeouts = [max(self.next_retention - time.time(), 0)] if self.archive_chunk else []
+            with self._lock:
+                if self._pending:
+                    # A chunk failed; try again shortly
+                    timeouts.append(self.retry_delay)
+            self._wakeup.wait(min(timeouts) if timeouts else None)
+            self._wakeup.clear()
+
+            while not self._stopped.is_set():
+                with self._lock:
+                    purge = self._pending[0] if self._pending else None
+                if purge is None:
+                    break
+                if not self._finish(purge):
+                    break
+                with self._lock:
+                    self._pending.popleft()
+
+            if self.archive_chunk and time.time() >= self.next_retention and not self._stopped.is_set():
+                self.run_retention()
+                self.next_retention = time.time() + self.retention_interval
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending_purges': pending,
+            'purges': self.purges,
+            'purge_chunks': self.purge_chunks,
+            'failed_chunks': self.failed_chunks,
+            'archived_sessions': self.archived_sessions,
+            'retention_runs': self.retention_runs,
+            'last_retention_at': self.last_retention_at
+        }
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+In-process cache of chat session metadata and coalesced last_activity updates
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+SessionInfo = namedtuple('SessionInfo', 'session_id session_name last_activity')
+
+
+class SessionCache:
+    """LRU cache of SessionInfo by session_id
+
+    Only sessions known to exist are cached. Entries expire after `ttl` seconds
+    so a session deleted by another worker process is eventually noticed;
+    deletes and renames in this process invalidate or replace them directly.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id):
+        """Cached SessionInfo, or None"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(session_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, info):
+        with self._lock:
+            self._entries[info.session_id] = (info, time.monotonic())
+            self._entries.move_to_end(info.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, session_id, last_activity):
+        """Record newer activity on a cached session without refreshing its expiry"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and last_activity > entry[0].last_activity:
+                self._entries[session_id] = (entry[0]._replace(last_activity=last_activity), entry[1])
+
+    def invalidate(self, session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class ActivityTracker:
+    """Coalesces last_activity bumps and writes them with `flush_func(updates)` on a background thread
+
+    `updates` maps each session_id touched since the last flush to its latest
+    activity time, so any number of bumps to a session costs one row in one
+    bulk UPDATE.
+    """
+
+    def __init__(self, flush_func, flush_interval=1.0):
+        self.flush_func = flush_func
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.touches = 0
+        self.flushes = 0
+        self.flushed_sessions = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="activity-flusher", daemon=True)
+            self._thread.start()
+
+    def touch(self, session_id, when):
+        with self._lock:
+            if when > self._pending.get(session_id, when.min):
+                self._pending[session_id] = when
+            self.touches += 1
+
+    def flush(self):
+        """Write every pending bump in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                updates, self._pending = self._pending, {}
+            if not updates:
+                return 0
+
+            try:
+                self.flush_func(updates)
+            except Exception as e:
+                logger.error(f"Activity flush error: {e}")
+                self.failed_flushes += 1
+                # Newer bumps made during the flush win over the failed ones
+                with self._lock:
+                    for session_id, when in updates.items():
+                        if when > self._pending.get(session_id, when.min):
+                            self._pending[session_id] = when
+                return 0
+
+            self.flushes += 1
+            self.flushed_sessions += len(updates)
+            return len(updates)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending_sessions': pending,
+            'touches': self.touches,
+            'flushes': self.flushes,
+            'flushed_sessions': self.flushed_sessions,
+            'failed_flushes': self.failed_flushes
+        }
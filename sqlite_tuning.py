@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+SQLite production mode: WAL, tuned pragmas, one serialized writer and a pool of read-only connections
+"""
+
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_file(database_url):
+    """Whether the URL names an on-disk SQLite database (in-memory ones cannot share WAL readers)"""
+    url = make_url(database_url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+        and url.query.get('mode') != 'memory'
+
+
+def connection_pragmas(busy_timeout_ms=5000, synchronous='NORMAL', cache_mb=64, mmap_mb=256):
+    """PRAGMA statements run on every new connection"""
+    return [
+        f"PRAGMA busy_timeout={int(busy_timeout_ms)}",
+        f"PRAGMA synchronous={synchronous}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size={-int(cache_mb * 1024)}",
+        f"PRAGMA mmap_size={int(mmap_mb * 2 ** 20)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def set_pragmas(engine, pragmas):
+    """Run `pragmas` on each connection the engine opens"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def writer_engine_options(busy_timeout_ms=5000):
+    """Engine options for the writer: a single pooled connection that threads queue for
+
+    Writes in this process wait their turn for the connection instead of
+    failing with "database is locked"; the busy timeout covers other processes.
+    """
+    return {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 30,
+        'connect_args': {'timeout': busy_timeout_ms / 1000, 'check_same_thread': False},
+    }
+
+
+def enable_wal(engine):
+    """Switch the database to write-ahead logging, so readers no longer block on the writer"""
+    with engine.connect() as connection:
+        mode = connection.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+    if str(mode).lower() != 'wal':
+        logger.error(f"Could not enable WAL for {engine.url.database}, journal mode is {mode}")
+    return mode
+
+
+def create_read_engine(url, pool_size=8, pragmas=()):
+    """Engine on the same database whose connections can only read
+
+    `pool_size` connections stay open; busier moments open extra ones rather
+    than queueing, since WAL readers never wait on each other and a request
+    waiting for a read connection would stall behind threads that re-take it.
+    """
+    engine = create_engine(url, pool_size=pool_size, max_overflow=-1,
+                           connect_args={'check_same_thread': False})
+    set_pragmas(engine, list(pragmas) + ["PRAGMA query_only=ON"])
+    return engine
@@ -12,6 +12,10 @@ class ChatApplication {
         this.sidebarOverlay = document.getElementById('sidebar-overlay');
         this.isLoading = false;
         this.currentSessionId = null;
+        this.sessionsCursor = null;
+        this.loadingSessions = false;
+        this.historyCursor = null;
+        this.loadingHistory = false;
         
         this.initializeEventListeners();
         this.loadChatSessions();
@@ -41,6 +45,12 @@ class ChatApplication {
         this.sidebarToggle.addEventListener('click', () => this.toggleSidebar());
         this.toggleBtn.addEventListener('click', () => this.toggleSidebar());
         
+        // Load more sessions when scrolling the sidebar
+        this.sessionsList.addEventListener('scroll', () => this.handleSessionsScroll());
+        
+        // Load older messages when scrolling up through a long conversation
+        this.chatMessages.addEventListener('scroll', () => this.handleMessagesScroll());
+        
         // Sidebar overlay click to close on mobile
         if (this.sidebarOverlay) {
             this.sidebarOverlay.addEventListener('click', () => this.closeSidebar());
@@ -1,10 +1,12 @@
 // Chat history functionality
 ChatApplication.prototype.loadChatHistory = async function() {
     try {
+        // Newest page first; older pages are fetched when scrolling up
         const response = await fetch('/api/history');
         if (!response.ok) return;
         
         const messages = await response.json();
+        this.historyCursor = response.headers.get('X-Prev-Cursor');
         
         // Clear existing messages
         this.clearChatDisplay();
@@ -24,6 +26,40 @@ ChatApplication.prototype.loadChatHistory = async function() {
     }
 };
 
+// Prepend the previous page of messages, keeping the visible messages in place
+ChatApplication.prototype.loadOlderMessages = async function() {
+    if (!this.historyCursor || this.loadingHistory) return;
+    
+    this.loadingHistory = true;
+    try {
+        const response = await fetch(`/api/history?before=${encodeURIComponent(this.historyCursor)}`);
+        if (!response.ok) return;
+        
+        const messages = await response.json();
+        this.historyCursor = response.headers.get('X-Prev-Cursor');
+        
+        const anchor = this.chatMessages.firstChild;
+        const previousHeight = this.chatMessages.scrollHeight;
+        
+        messages.forEach(msg => {
+            const messageText = this.addMessage(msg.message_text, msg.is_user ? 'user' : 'bot');
+            this.chatMessages.insertBefore(messageText.closest('.message-container'), anchor);
+        });
+        
+        this.chatMessages.scrollTop = this.chatMessages.scrollHeight - previousHeight;
+    } catch (error) {
+        console.log('Could not load older messages:', error);
+    } finally {
+        this.loadingHistory = false;
+    }
+};
+
+ChatApplication.prototype.handleMessagesScroll = function() {
+    if (this.chatMessages.scrollTop < 100) {
+        this.loadOlderMessages();
+    }
+};
+
 ChatApplication.prototype.clearHistory = async function() {
     if (!confirm('Are you sure you want to clear the chat history? This cannot be undone.')) {
         return;
@@ -16,7 +16,7 @@ ChatApplication.prototype.sendMessage = async function() {
     this.addMessage(message, 'user');
     
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -24,9 +24,8 @@ ChatApplication.prototype.sendMessage = async function() {
             body: JSON.stringify({ message: message })
         });
         
-        if (response.ok) {
-            const data = await response.json();
-            this.addMessage(data.response, 'bot');
+        if (response.ok && response.body) {
+            await this.readResponseStream(response);
             // Refresh sessions to update last message preview
             await this.loadChatSessions();
         } else {
@@ -43,6 +42,62 @@ ChatApplication.prototype.sendMessage = async function() {
     }
 };
 
+// Render a Server-Sent Events response token by token as it arrives
+ChatApplication.prototype.readResponseStream = async function(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let messageText = null;
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        
+        for (const rawEvent of events) {
+            const event = this.parseStreamEvent(rawEvent);
+            if (!event) continue;
+            
+            if (event.type === 'token') {
+                if (!messageText) {
+                    this.hideTypingIndicator();
+                    messageText = this.addMessage('', 'bot');
+                }
+                text += event.data.token;
+                messageText.innerHTML = this.formatMessage(text);
+                this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
+            } else if (event.type === 'done') {
+                // Replace the raw tokens with the cleaned-up final response
+                if (!messageText) {
+                    messageText = this.addMessage('', 'bot');
+                }
+                messageText.innerHTML = this.formatMessage(event.data.response);
+            } else if (event.type === 'error') {
+                throw new Error(event.data.error);
+            }
+        }
+    }
+};
+
+ChatApplication.prototype.parseStreamEvent = function(rawEvent) {
+    let type = 'message';
+    let data = '';
+    
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) {
+            type = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+            data += line.slice(6);
+        }
+    });
+    
+    return data ? { type: type, data: JSON.parse(data) } : null;
+};
+
 ChatApplication.prototype.addMessage = function(content, sender) {
     const messageContainer = document.createElement('div');
     messageContainer.className = `message-container ${sender}-message`;
@@ -75,6 +130,8 @@ ChatApplication.prototype.addMessage = function(content, sender) {
     
     this.chatMessages.appendChild(messageContainer);
     this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
+    
+    return messageText;
 };
 
 ChatApplication.prototype.formatMessage = function(message) {
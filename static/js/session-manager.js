@@ -5,6 +5,7 @@ ChatApplication.prototype.loadChatSessions = async function() {
         if (!response.ok) return;
         
         const sessions = await response.json();
+        this.sessionsCursor = response.headers.get('X-Next-Cursor');
         
         // If no sessions exist, create one automatically
         if (sessions.length === 0) {
@@ -32,8 +33,36 @@ ChatApplication.prototype.loadChatSessions = async function() {
     }
 };
 
-ChatApplication.prototype.renderSessions = function(sessions) {
-    this.sessionsList.innerHTML = '';
+// Fetch the next page of sessions when the sidebar is scrolled near its end
+ChatApplication.prototype.loadMoreSessions = async function() {
+    if (!this.sessionsCursor || this.loadingSessions) return;
+    
+    this.loadingSessions = true;
+    try {
+        const response = await fetch(`/api/sessions?cursor=${encodeURIComponent(this.sessionsCursor)}`);
+        if (!response.ok) return;
+        
+        const sessions = await response.json();
+        this.sessionsCursor = response.headers.get('X-Next-Cursor');
+        this.renderSessions(sessions, true);
+    } catch (error) {
+        console.log('Could not load more chat sessions:', error);
+    } finally {
+        this.loadingSessions = false;
+    }
+};
+
+ChatApplication.prototype.handleSessionsScroll = function() {
+    const list = this.sessionsList;
+    if (list.scrollTop + list.clientHeight >= list.scrollHeight - 100) {
+        this.loadMoreSessions();
+    }
+};
+
+ChatApplication.prototype.renderSessions = function(sessions, append = false) {
+    if (!append) {
+        this.sessionsList.innerHTML = '';
+    }
     
     sessions.forEach(session => {
         // Update current session based on server info
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+In-memory, precompressed serving of the shell page and fingerprinted asset bundles
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Fingerprinted assets never change under the same URL
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def minify_js(source):
+    """Conservative minification: drop indentation, blank lines and whole-line comments
+
+    Lines inside multi-line template literals are kept verbatim.
+    """
+    lines = []
+    in_template = False
+    in_comment = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_template:
+            lines.append(line)
+        elif in_comment:
+            in_comment = '*/' not in stripped
+            continue
+        elif stripped.startswith('/*'):
+            in_comment = '*/' not in stripped
+            continue
+        elif stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+        else:
+            continue
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.DOTALL)
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip()) + '\n'
+
+
+class CompressedAsset:
+    """Bytes of one asset with precomputed gzip/brotli variants and a content ETag"""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body)
+
+    def negotiate(self, accept_encodings):
+        """Smallest variant the client accepts, as (encoding or None, bytes)"""
+        choices = [(len(data), encoding, data) for encoding, data in self.variants.items()
+                   if encoding in accept_encodings]
+        if not choices:
+            return None, self.body
+        _, encoding, data = min(choices)
+        return encoding, data
+
+
+class AssetBundle(CompressedAsset):
+    """Files concatenated and minified into one asset named by its content hash"""
+
+    def __init__(self, name, paths, mimetype, minify):
+        source = ''.join(minify(open(path, encoding='utf-8').read()) for path in paths)
+        super().__init__(source.encode('utf-8'), mimetype)
+        stem, extension = os.path.splitext(name)
+        self.filename = f"{stem}.{self.etag[:12]}{extension}"
+
+
+class ShellPage:
+    """The HTML page held in memory and reloaded only when the file's mtime changes"""
+
+    def __init__(self, path, rewrite=None):
+        self.path = path
+        self.rewrite = rewrite
+        self._asset = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current page as a CompressedAsset; raises FileNotFoundError if the file is missing"""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        html = f.read()
+                    if self.rewrite is not None:
+                        html = self.rewrite(html)
+                    self._asset = CompressedAsset(html.encode('utf-8'), 'text/html')
+                    self._mtime = mtime
+                    logger.info(f"Loaded {self.path}")
+        return self._asset
+
+
+def bundle_page_assets(html, static_folder, url_prefix='/assets/'):
+    """Build bundles for the page's local scripts and stylesheets
+
+    Returns the rewritten HTML (one tag per bundle, in place of the first original tag)
+    and the bundles by filename.
+    """
+    bundles = {}
+
+    def replace_tags(html, pattern, name, mimetype, minify, tag):
+        sources = re.findall(pattern, html)
+        if not sources:
+            return html
+        paths = [os.path.join(static_folder, src.lstrip('/')[len('static/'):]) for src in sources]
+        bundle = AssetBundle(name, paths, mimetype, minify)
+        bundles[bundle.filename] = bundle
+
+        replaced = []
+
+        def substitute(match):
+            first = not replaced
+            replaced.append(match)
+            return tag.format(url=url_prefix + bundle.filename) if first else ''
+
+        html = re.sub(r'[ \t]*' + pattern + r'[ \t]*\n?', substitute, html)
+        return html
+
+    html = replace_tags(html, r'<script src="(/?static/js/[^"]+\.js)"></script>',
+                        'app.js', 'application/javascript', minify_js,
+                        '    <script src="{url}"></script>\n')
+    html = replace_tags(html, r'<link rel="stylesheet" href="(/?static/css/[^"]+\.css)">',
+                        'style.css', 'text/css', minify_css,
+                        '    <link rel="stylesheet" href="{url}">\n')
+    return html, bundles
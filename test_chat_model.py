@@ -0,0 +1,694 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from batch_scheduler import BatchScheduler
+from chat_model import BrianChatModel, ModelRegistry, anchor_history, build_conversation_turns, history_start
+from generation_budget import BudgetCriteria, ChatReply, GenerationBudget, LatencyEstimate, plan_max_new_tokens
+from inference_backends import apply_backend, conv1d_to_linear
+from intent_router import AnswerStore, CATEGORY_MATCHER, IntentRouter, normalize_question
+from inference_pool import (InferenceClient, InferenceError, InferenceServer, InferenceTimeout,
+                            InferenceWorkerPool)
+from metrics import MetricsRegistry
+from conversation_cache import ConversationCache, ConversationState, common_prefix_length
+from response_cache import ResponseCache
+from session_cache import ActivityTracker, SessionCache, SessionInfo
+from static_assets import minify_js
+
+
+class FakeChatModel:
+    """Stand-in for BrianChatModel that records how often it is loaded"""
+
+    loads = 0
+
+    def __init__(self):
+        self.model = None
+
+    def initialize(self):
+        FakeChatModel.loads += 1
+        self.model = object()
+
+    def get_response(self, message):
+        return self.get_responses([message])[0]
+
+    def get_responses(self, messages):
+        return [reply.text for reply in self.get_replies(messages)]
+
+    def get_replies(self, messages, budgets=None):
+        self.batches = getattr(self, 'batches', []) + [len(messages)]
+        return [ChatReply(f"echo: {m}", {'stop_reason': 'eos'}) for m in messages]
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.result = None
+        self.generation = {'stop_reason': 'eos'}
+
+    def __iter__(self):
+        yield from self.chunks
+        self.result = ''.join(self.chunks).strip()
+
+    def cancel(self):
+        pass
+
+
+class FakePoolModel(FakeChatModel):
+    """FakeChatModel for inference pool workers; 'crash' and 'hang' misbehave on purpose"""
+
+    def get_replies(self, messages, budgets=None):
+        if messages == ['crash']:
+            os._exit(1)
+        if messages == ['hang']:
+            time.sleep(30)
+        return super().get_replies(messages, budgets)
+
+    def get_conversation_reply(self, message, conversation_history, session_key=None, budget=None):
+        return ChatReply(f"echo: {message} after {len(conversation_history)}", {'stop_reason': 'eos'})
+
+    def stream_response(self, message, conversation_history=None, budget=None, session_key=None):
+        return FakeStream(['echo:', f' {message}'])
+
+
+class TestModelRegistry(unittest.TestCase):
+    """Tests for the process-wide model registry"""
+
+    def setUp(self):
+        FakeChatModel.loads = 0
+        self.registry = ModelRegistry()
+        self.registry.register('fake', factory=FakeChatModel)
+
+    def test_model_loaded_once(self):
+        """Concurrent callers share a single loaded instance"""
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('fake')))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(FakeChatModel.loads, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_warm_up_reports_ready(self):
+        """Warm-up loads the model and flips readiness"""
+        self.assertFalse(self.registry.status()['ready'])
+        self.registry.warm_up('fake')
+        status = self.registry.status()
+        self.assertTrue(status['ready'])
+        self.assertEqual(status['models']['fake']['state'], 'ready')
+
+    def test_unknown_model(self):
+        """Unregistered names raise KeyError"""
+        with self.assertRaises(KeyError):
+            self.registry.get('missing')
+
+
+class TestBatchScheduler(unittest.TestCase):
+    """Tests for the micro-batching inference scheduler"""
+
+    def setUp(self):
+        self.model = FakeChatModel()
+        self.scheduler = BatchScheduler(lambda: self.model, max_batch_size=4, window_ms=50)
+
+    def test_concurrent_prompts_are_batched(self):
+        """Prompts submitted together share a generate call and keep their own results"""
+        futures = [self.scheduler.submit(f"message {i}") for i in range(6)]
+        results = [f.result(timeout=5).text for f in futures]
+
+        self.assertEqual(results, [f"echo: message {i}" for i in range(6)])
+        self.assertLessEqual(max(self.model.batches), 4)
+        self.assertLess(len(self.model.batches), 6)
+
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['requests'], 6)
+        self.assertGreater(stats['mean_batch_size'], 1)
+
+    def test_errors_reach_every_caller(self):
+        """A failing batch raises in each waiting caller"""
+        def broken(messages, budgets):
+            raise RuntimeError("boom")
+        self.model.get_replies = broken
+
+        with self.assertRaises(RuntimeError):
+            self.scheduler.get_reply("hello", timeout=5)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for the response cache"""
+
+    def setUp(self):
+        self.cache = ResponseCache(max_size=2, ttl=60)
+        self.calls = 0
+
+    def generate(self):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+    def test_normalized_key(self):
+        """Whitespace and case differences map to the same key"""
+        params = {'max_new_tokens': 100}
+        self.assertEqual(ResponseCache.make_key("How do I  buy a house", "gpt2", params),
+                         ResponseCache.make_key(" how do i buy a house ", "gpt2", params))
+        self.assertNotEqual(ResponseCache.make_key("hello", "gpt2", params),
+                            ResponseCache.make_key("hello", "distilgpt2", params))
+
+    def test_hit_and_miss(self):
+        """Repeated keys are served from cache"""
+        self.assertEqual(self.cache.get_or_generate('a', self.generate), "answer 1")
+        self.assertEqual(self.cache.get_or_generate('a', self.generate), "answer 1")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_lru_and_ttl_eviction(self):
+        """Least recently used and expired entries are dropped"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+
+        self.cache.ttl = 0
+        self.cache.set('d', 4)
+        time.sleep(0.01)
+        self.assertIsNone(self.cache.get('d'))
+
+    def test_concurrent_requests_coalesce(self):
+        """Identical in-flight prompts share one generation"""
+        release = threading.Event()
+
+        def slow_generate():
+            release.wait(5)
+            return self.generate()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_generate('k', slow_generate)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        while self.cache.stats()['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ["answer 1"] * 4)
+
+
+class CharTokenizer:
+    """One token per character; id 0 is end of text"""
+
+    eos_token_id = 0
+
+    @staticmethod
+    def encode(text):
+        return [ord(c) for c in text]
+
+    @staticmethod
+    def decode(ids, skip_special_tokens=False):
+        return ''.join(chr(i) for i in ids if i)
+
+
+class TestGenerationBudget(unittest.TestCase):
+    """Tests for latency-budgeted stopping criteria"""
+
+    def run_criteria(self, text, budget):
+        """Feed `text` one token at a time; returns (reason, kept text)"""
+        import torch
+        prompt = CharTokenizer.encode("Q?")
+        criteria = BudgetCriteria(CharTokenizer, len(prompt), [budget], max_new_tokens=100)
+        tokens = list(prompt)
+        for token in CharTokenizer.encode(text):
+            tokens.append(token)
+            if criteria(torch.tensor([tokens]), None)[0]:
+                break
+        sequences = torch.tensor([tokens])
+        criteria.finish(sequences)
+        return criteria.reasons[0], CharTokenizer.decode(criteria.generated(sequences, 0).tolist())
+
+    def test_sentence_boundary(self):
+        """Generation stops at the first sentence end after the minimum length"""
+        budget = GenerationBudget(min_new_tokens=12, repeat_ngram=0)
+        self.assertEqual(self.run_criteria("Hi there. Prices rose 14.5% last year. More", budget),
+                         ('sentence', "Hi there. Prices rose 14.5% last year."))
+        self.assertEqual(self.run_criteria("Ask Mr. Smith", budget), ('max_tokens', "Ask Mr. Smith"))
+
+    def test_paragraph_and_turn_end(self):
+        """Paragraph mode waits for a line break; the user's next turn always stops generation"""
+        budget = GenerationBudget(min_new_tokens=5, stop_at='paragraph', repeat_ngram=0)
+        self.assertEqual(self.run_criteria("One. Two.\nThree", budget), ('paragraph', "One. Two.\n"))
+        self.assertEqual(self.run_criteria("Sure User: next", budget)[0], 'turn_end')
+
+    def test_repetition_is_trimmed(self):
+        """A repeated n-gram stops generation and is cut from the kept tokens"""
+        budget = GenerationBudget(stop_at=None, repeat_ngram=4)
+        self.assertEqual(self.run_criteria("abcdxabcdabcd", budget), ('repetition', "abcdx"))
+
+    def test_deadline_and_eos(self):
+        """An expired deadline stops at once; end of text is reported as eos"""
+        budget = GenerationBudget(latency_ms=1, stop_at=None, repeat_ngram=0).start()
+        time.sleep(0.01)
+        self.assertEqual(self.run_criteria("abc", budget), ('deadline', "a"))
+        self.assertEqual(self.run_criteria("ab\0", GenerationBudget(stop_at=None)), ('eos', "ab"))
+
+    def test_max_new_tokens_follows_budget(self):
+        """max_new_tokens is capped by the context room left and by what the latency budget affords"""
+        latency = LatencyEstimate()
+        budget = GenerationBudget(latency_ms=1000, max_new_tokens=100).start()
+        self.assertEqual(plan_max_new_tokens([budget], 10, room=1000, latency=latency), 100)
+        self.assertEqual(plan_max_new_tokens([budget], 10, room=30, latency=latency), 30)
+
+        latency.update(prompt_tokens=100, prefill_ms=100, decode_steps=10, decode_ms=200)
+        self.assertLess(plan_max_new_tokens([budget], 10, room=1000, latency=latency), 50)
+        # Longer prompts leave less of the budget for new tokens
+        self.assertLess(plan_max_new_tokens([budget], 500, room=1000, latency=latency),
+                        plan_max_new_tokens([budget], 10, room=1000, latency=latency))
+
+
+class TestIntentRouter(unittest.TestCase):
+    """Tests for intent classification and the FAQ answer store"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'faq.json')
+        self.write([{'intent': 'escrow', 'questions': ['what is escrow', 'how does escrow work'],
+                     'answer': 'Escrow holds the funds.'}])
+        self.router = IntentRouter(AnswerStore(self.path))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, entries, mtime=None):
+        with open(self.path, 'w') as f:
+            json.dump(entries, f)
+        if mtime is not None:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_categories_keep_priority(self):
+        """The single-pass matcher reports categories in priority order, not text order"""
+        self.assertEqual(CATEGORY_MATCHER.find_all("Should I rent or buy a condo?"), ['buying', 'rental', 'property'])
+        self.assertEqual(CATEGORY_MATCHER.first("Should I rent or buy?"), 'buying')
+        self.assertIsNone(CATEGORY_MATCHER.first("Hello there"))
+
+    def test_faq_answered_and_rest_falls_through(self):
+        """Only messages asking exactly a curated question get its answer"""
+        self.assertEqual(normalize_question("Hi Brian, what is ESCROW?"), 'what is escrow')
+        route = self.router.route("Hi Brian, what is ESCROW?")
+        self.assertEqual((route.intent, route.answer), ('escrow', 'Escrow holds the funds.'))
+
+        route = self.router.route("What is escrow on a rental in my area?")
+        self.assertIsNone(route.answer)
+        self.assertEqual(route.category, 'rental')
+
+        stats = self.router.stats()
+        self.assertEqual((stats['messages'], stats['model_calls_avoided']), (2, 1))
+        self.assertEqual(stats['answered']['escrow']['hit_rate'], 0.5)
+
+    def test_hot_reload(self):
+        """Edits to the answer file apply on the next lookup; a broken file keeps the previous answers"""
+        self.assertIsNotNone(self.router.route("what is escrow").answer)
+        self.write([{'intent': 'pmi', 'questions': ['what is pmi'], 'answer': 'Mortgage insurance.'}],
+                   mtime=time.time_ns() + 10 ** 9)
+        self.assertIsNone(self.router.route("what is escrow").answer)
+        self.assertEqual(self.router.route("What is PMI?").answer, 'Mortgage insurance.')
+
+        with open(self.path, 'w') as f:
+            f.write('[{"intent": ')
+        os.utime(self.path, ns=(time.time_ns() + 2 * 10 ** 9,) * 2)
+        self.assertEqual(self.router.route("what is pmi").answer, 'Mortgage insurance.')
+
+
+class TestSessionCache(unittest.TestCase):
+    def test_lru_eviction_and_expiry(self):
+        now = datetime.utcnow()
+        cache = SessionCache(max_entries=2, ttl=60)
+        for name in 'abc':
+            cache.put(SessionInfo(name, name.upper(), now))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c').session_name, 'C')
+
+        cache.touch('c', now + timedelta(seconds=5))
+        self.assertEqual(cache.get('c').last_activity, now + timedelta(seconds=5))
+        cache.invalidate(['c'])
+        self.assertIsNone(cache.get('c'))
+
+        cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(cache.get('b'))
+
+    def test_activity_bumps_coalesced(self):
+        flushed = []
+        tracker = ActivityTracker(flushed.append)
+        now = datetime.utcnow()
+        for seconds in (3, 1, 2):
+            tracker.touch('a', now + timedelta(seconds=seconds))
+        tracker.touch('b', now)
+
+        self.assertEqual(tracker.flush(), 2)
+        self.assertEqual(flushed, [{'a': now + timedelta(seconds=3), 'b': now}])
+        self.assertEqual(tracker.flush(), 0)
+
+    def test_failed_flush_keeps_newest_bumps(self):
+        def fail(updates):
+            raise RuntimeError('database unavailable')
+
+        tracker = ActivityTracker(fail)
+        now = datetime.utcnow()
+        tracker.touch('a', now)
+        tracker.flush()
+
+        flushed = []
+        tracker.flush_func = flushed.append
+        tracker.flush()
+        self.assertEqual(flushed, [{'a': now}])
+        self.assertEqual(tracker.stats()['failed_flushes'], 1)
+
+
+class TestConversationCache(unittest.TestCase):
+    """Tests for per-session conversation state"""
+
+    def make_state(self, token_ids, nbytes):
+        tensor = SimpleNamespace(nbytes=nbytes // 2)
+        past_key_values = SimpleNamespace(layers=[SimpleNamespace(keys=tensor, values=tensor)])
+        return ConversationState(token_ids, past_key_values)
+
+    def test_turns_keep_stable_prefix(self):
+        """Earlier turns render identically when the conversation grows"""
+        first = build_conversation_turns("Hi", [])
+        second = build_conversation_turns("More", [
+            {'message_text': 'Hi', 'is_user': True},
+            {'message_text': 'Hello!', 'is_user': False}
+        ])
+        self.assertEqual(second[0], first[0])
+        self.assertEqual(second[-1], "Brian says:")
+        self.assertEqual(common_prefix_length([1, 2, 3], [1, 2, 4, 5]), 2)
+
+    def test_take_gives_exclusive_ownership(self):
+        """A taken state is not handed out twice"""
+        cache = ConversationCache(max_bytes=1000)
+        cache.put('s1', self.make_state([1, 2], 100))
+        self.assertIsNotNone(cache.take('s1'))
+        self.assertIsNone(cache.take('s1'))
+
+    def test_memory_bounded_lru_eviction(self):
+        """Least recently used sessions are evicted to stay within the byte budget"""
+        cache = ConversationCache(max_bytes=250)
+        cache.put('s1', self.make_state([1], 100))
+        cache.put('s2', self.make_state([2], 100))
+        cache.put('s3', self.make_state([3], 100))
+
+        stats = cache.stats()
+        self.assertEqual(stats['sessions'], 2)
+        self.assertLessEqual(stats['bytes'], 250)
+        self.assertIsNone(cache.take('s1'))
+
+
+def save_tiny_gpt2(path, n_positions=512):
+    """Save a randomly initialized one-layer GPT-2 with a byte-level tokenizer, loadable offline by name"""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    vocab = {c: i for i, c in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+    vocab['<|endoftext|>'] = len(vocab)
+    tokenizer = Tokenizer(models.BPE(vocab, []))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token='<|endoftext|>').save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=n_positions, n_embd=16, n_layer=1, n_head=2,
+                        bos_token_id=len(vocab) - 1, eos_token_id=len(vocab) - 1)
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return path
+
+
+class TestInferenceBackends(unittest.TestCase):
+    """Tests for the CPU inference backends"""
+
+    def make_model(self):
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        torch.manual_seed(0)
+        config = GPT2Config(vocab_size=50, n_positions=32, n_embd=16, n_layer=1, n_head=2)
+        return GPT2LMHeadModel(config).eval()
+
+    def test_conv1d_to_linear_is_equivalent(self):
+        """Swapping Conv1D for nn.Linear leaves the logits unchanged"""
+        import torch
+        model = self.make_model()
+        input_ids = torch.tensor([[1, 2, 3, 4]])
+        with torch.inference_mode():
+            expected = model(input_ids).logits
+        conv1d_to_linear(model)
+        with torch.inference_mode():
+            actual = model(input_ids).logits
+        self.assertTrue(torch.allclose(expected, actual, atol=1e-5))
+
+    def test_int8_backend_quantizes_linear_layers(self):
+        """The int8 backend replaces Linear layers with dynamically quantized ones"""
+        from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+        model = apply_backend(self.make_model(), 'int8')
+        self.assertTrue(any(isinstance(m, DynamicQuantizedLinear) for m in model.modules()))
+
+    def test_unknown_backend(self):
+        """Unknown backend names are rejected"""
+        with self.assertRaises(ValueError):
+            apply_backend(self.make_model(), 'fp8')
+
+
+class TestConversationReuse(unittest.TestCase):
+    """Tests that long conversations keep reusing the session's cached key/values"""
+
+    def chat(self, n_positions, turns, stream=False):
+        """Run `turns` exchanges like the app does; returns the tokens reused on each turn after the first"""
+        with tempfile.TemporaryDirectory() as tmp:
+            model = BrianChatModel(save_tiny_gpt2(tmp, n_positions), snapshot_dir=None)
+            model.initialize()
+        history = []
+        reused = []
+        for turn in range(turns):
+            message = f"Question {turn} about the house?"
+            before = model.conversation_cache.stats()['reused_tokens']
+            budget = GenerationBudget(max_new_tokens=8, stop_at=None, repeat_ngram=0)
+            if stream:
+                list(model.stream_response(message, history, budget, session_key='s1'))
+            else:
+                model.get_conversation_reply(message, history, session_key='s1', budget=budget)
+            reused.append(model.conversation_cache.stats()['reused_tokens'] - before)
+            history += [{'message_text': message, 'is_user': True},
+                        {'message_text': f"Answer {turn}: prices are up.", 'is_user': False}]
+        return model.conversation_cache.stats(), reused[1:]
+
+    def test_long_conversation_reuses_whole_prefix(self):
+        """Every turn after the first reuses the previous prompt in full"""
+        stats, reused = self.chat(1024, 8)
+        self.assertEqual(stats['hits'], 7)
+        self.assertTrue(all(tokens > 0 for tokens in reused))
+        self.assertEqual(reused, sorted(reused))
+
+    def test_streamed_conversation_reuses_prefix(self):
+        """Streaming replies reuse and update the session's cached state like the non-streamed path"""
+        stats, reused = self.chat(1024, 8, stream=True)
+        self.assertEqual(stats['hits'], 7)
+        self.assertTrue(all(tokens > 0 for tokens in reused))
+        self.assertEqual(reused, sorted(reused))
+
+    def test_truncation_drops_chunks(self):
+        """Past the context window old turns go in large steps, so only an occasional turn misses the prefix"""
+        stats, reused = self.chat(700, 16)
+        self.assertEqual(stats['hits'], 15)
+        # Six turns fill the history's share of the window; dropping one turn at a time would miss from then on
+        self.assertLessEqual(sum(tokens < 20 for tokens in reused), 4)
+        self.assertGreater(sum(reused[8:]), 8 * 200)
+
+    def test_history_start_moves_only_on_overflow(self):
+        """The kept turns only change when they outgrow the limit, then drop to half of it"""
+        lengths = [30] * 12
+        starts = [history_start(lengths[:n], 100) for n in range(1, 13)]
+        self.assertEqual(starts, [0, 0, 0, 3, 3, 3, 6, 6, 6, 9, 9, 9])
+
+    def test_history_window_starts_on_chunk_boundary(self):
+        """The newest messages are trimmed to start a whole number of chunks into the session"""
+        with mock.patch('chat_model.CONVERSATION_HISTORY_CHUNK', 4):
+            self.assertEqual(anchor_history(list(range(10)), 10), list(range(10)))
+            # Messages 5..14 of a 15-message session start at 8
+            self.assertEqual(anchor_history(list(range(5, 15)), 15), list(range(8, 15)))
+            self.assertEqual(anchor_history(list(range(6, 16)), 16), list(range(8, 16)))
+
+
+class TestResponseStream(unittest.TestCase):
+    """Tests for streamed generation with a tiny model"""
+
+    def test_repetition_is_trimmed_from_result(self):
+        """A streamed reply stopped by repetition ends up as the same text as the non-streamed one"""
+        with tempfile.TemporaryDirectory() as tmp:
+            model = BrianChatModel(save_tiny_gpt2(tmp), snapshot_dir=None)
+            model.initialize()
+        budget = GenerationBudget(min_new_tokens=1, stop_at=None, repeat_ngram=6)
+        reply = model.get_replies(["Hi"], [budget])[0]
+
+        stream = model.stream_response("Hi", budget=budget)
+        chunks = list(stream)
+        self.assertEqual(stream.generation['stop_reason'], 'repetition')
+        self.assertEqual(stream.result, reply.text)
+        self.assertGreater(len(''.join(chunks)), len(stream.result))
+
+
+class TestBackendBenchmark(unittest.TestCase):
+    """Smoke test of the backend comparison tool against a tiny model"""
+
+    def test_one_backend_iteration(self):
+        import queue
+        from benchmarks.backends import run_backend
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results = queue.Queue()
+            run_backend(save_tiny_gpt2(tmp), 'fp32', ["How do I buy a house?"], 1, None, None, results,
+                        {'snapshot_dir': None})
+            report = results.get_nowait()
+
+        self.assertNotIn('error', report)
+        self.assertGreater(report['tokens_per_second'], 0)
+        self.assertTrue(report['outputs']["How do I buy a house?"])
+
+
+class TestModelSnapshot(unittest.TestCase):
+    """Tests for memory-mapped weight snapshots"""
+
+    def test_snapshot_round_trip(self):
+        """A model loaded from its snapshot has the same weights, tied and memory-mapped"""
+        import tempfile
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from model_snapshot import load_pretrained, snapshot_path
+
+        torch.manual_seed(0)
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=50, n_positions=32, n_embd=16, n_layer=1, n_head=2))
+        with tempfile.TemporaryDirectory() as tmp:
+            model_dir = f"{tmp}/model"
+            model.save_pretrained(model_dir)
+
+            first = load_pretrained(model_dir, f"{tmp}/snapshots")
+            self.assertTrue(os.path.exists(snapshot_path(f"{tmp}/snapshots", model_dir)))
+            loaded = load_pretrained(model_dir, f"{tmp}/snapshots")
+
+            self.assertFalse(loaded.training)
+            self.assertIs(loaded.lm_head.weight, loaded.transformer.wte.weight)
+            input_ids = torch.tensor([[1, 2, 3, 4]])
+            with torch.inference_mode():
+                expected = model.eval()(input_ids).logits
+                self.assertTrue(torch.equal(first(input_ids).logits, expected))
+                self.assertTrue(torch.equal(loaded(input_ids).logits, expected))
+
+
+    def test_model_with_non_persistent_buffers_falls_back(self):
+        """A model whose buffers a snapshot cannot restore is loaded normally instead"""
+        import torch
+        from transformers import LlamaConfig, LlamaForCausalLM
+        from model_snapshot import load_pretrained
+
+        torch.manual_seed(0)
+        model = LlamaForCausalLM(LlamaConfig(vocab_size=50, hidden_size=16, intermediate_size=32,
+                                             num_hidden_layers=1, num_attention_heads=2, num_key_value_heads=2,
+                                             max_position_embeddings=32)).eval()
+        with tempfile.TemporaryDirectory() as tmp:
+            model.save_pretrained(f"{tmp}/model")
+            load_pretrained(f"{tmp}/model", f"{tmp}/snapshots")
+            loaded = load_pretrained(f"{tmp}/model", f"{tmp}/snapshots")
+
+        self.assertFalse(any(buffer.is_meta for buffer in loaded.buffers()))
+        input_ids = torch.tensor([[1, 2, 3, 4]])
+        with torch.inference_mode():
+            self.assertTrue(torch.allclose(loaded(input_ids).logits, model(input_ids).logits, atol=1e-6))
+
+
+class TestInferencePool(unittest.TestCase):
+    """Tests for the out-of-process inference pool, its socket server and client"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = InferenceWorkerPool(FakePoolModel, workers=1, request_timeout=2, health_interval=60,
+                                        start_method='fork')
+        self.pool.start()
+        self.server = InferenceServer(os.path.join(self.tmp.name, 'inference.sock'), self.pool)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = InferenceClient(self.server.server_address, timeout=10)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.pool.stop()
+        self.tmp.cleanup()
+
+    def test_generate_and_stream(self):
+        self.assertEqual(self.client.generate('hello', budget=GenerationBudget(latency_ms=500).start()),
+                         ChatReply('echo: hello', {'stop_reason': 'eos'}))
+        self.assertEqual(self.client.generate('hello', [{'is_user': True, 'message_text': 'hi'}], 's1').text,
+                         'echo: hello after 1')
+
+        stream = self.client.stream('hello')
+        self.assertEqual(list(stream), ['echo:', ' hello'])
+        self.assertEqual(stream.result, 'echo: hello')
+        self.assertEqual(stream.generation, {'stop_reason': 'eos'})
+
+    def test_crashed_worker_is_restarted(self):
+        with self.assertRaises(InferenceError):
+            self.client.generate('crash')
+        self.assertEqual(self.client.generate('hello').text, 'echo: hello')
+        self.assertEqual(self.client.stats()['restarts'], 1)
+
+    def test_hung_worker_times_out_and_is_restarted(self):
+        with self.assertRaises(InferenceTimeout):
+            self.client.generate('hang')
+        self.assertEqual(self.client.generate('hello').text, 'echo: hello')
+
+        stats = self.client.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['ready_workers'], 1)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1))
+        histogram.observe(0.05, stage='generate')
+        histogram.observe(0.5, stage='generate')
+        histogram.observe(5, stage='generate')
+
+        text = registry.render()
+        self.assertIn('stage_seconds_bucket{stage="generate",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="generate",le="1"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="generate",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="generate"} 3', text)
+
+    def test_collector_exposes_numeric_stats(self):
+        registry = MetricsRegistry()
+        registry.register_collector('cache', 'Cache', lambda: {'hits': 3, 'persistent': True, 'sizes': {}})
+
+        text = registry.render()
+        self.assertIn('cache_hits 3', text)
+        self.assertNotIn('cache_persistent', text)
+        self.assertNotIn('cache_sizes', text)
+
+
+class TestStaticAssets(unittest.TestCase):
+
+    def test_minify_js_keeps_template_literals(self):
+        source = "// comment\n  const a = 1;\n\n  const t = `first\n    indented\n`;\n  call(a);\n"
+        self.assertEqual(minify_js(source), "const a = 1;\nconst t = `first\n    indented\n`;\ncall(a);\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
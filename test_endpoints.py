@@ -1,6 +1,28 @@
 import unittest
+import gzip
+import io
 import json
-from app import app, db
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
+from datetime import datetime, timedelta
+
+# The app builds its engine at import; point it at a throwaway database rather than instance/chat_history.db
+test_database_dir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(test_database_dir.name, 'chat_history.db')}"
+
+from app import app, db, archive_chunk, import_chat_data, session_activity, ArchivedSession, CachedResponse, chat_purger, ChatMessage, ChatSession, ChatTurn, DatabaseResponseStore, flush_chat_turns
+from chat_search import SearchIndex, SqliteSearchIndex
+from generation_budget import ChatReply
+from write_behind import WriteBehindBuffer
+from job_queue import ChatJobQueue
+import app as app_module
 
 
 class TestAllEndpoints(unittest.TestCase):
@@ -9,7 +31,6 @@ class TestAllEndpoints(unittest.TestCase):
     def setUp(self):
         """Set up test client"""
         app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.client = app.test_client()
         self.app_context = app.app_context()
         self.app_context.push()
@@ -25,6 +46,35 @@ class TestAllEndpoints(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Brian', response.data)
 
+    def test_index_page_cached(self):
+        """Test the shell page is revalidated by ETag and served precompressed"""
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        response = self.client.get('/', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_asset_bundle(self):
+        """Test scripts are served as one fingerprinted, immutable bundle"""
+        page = self.client.get('/').data.decode()
+        self.assertNotIn('/static/js/', page)
+        bundle_url = re.search(r'<script src="(/assets/app\.[0-9a-f]+\.js)">', page).group(1)
+
+        response = self.client.get(bundle_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn(b'class ChatApplication', response.data)
+
+        self.assertEqual(self.client.get('/assets/app.0000.js').status_code, 404)
+
+    def test_app_import_defers_inference_libraries(self):
+        """Test importing the app does not load torch or transformers"""
+        result = subprocess.run(
+            [sys.executable, '-c', "import app, sys; print('torch' in sys.modules, 'transformers' in sys.modules)"],
+            capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+
     def test_health_check(self):
         """Test health endpoint"""
         response = self.client.get('/health')
@@ -32,6 +82,59 @@ class TestAllEndpoints(unittest.TestCase):
         
         data = json.loads(response.data)
         self.assertEqual(data['status'], 'healthy')
+        self.assertIn('ready', data['model'])
+        self.assertIn('rss_mb', data['startup'])
+    
+    def test_health_reports_batching_inactive_with_history(self):
+        """Test /health says micro-batching is idle while conversations use their history"""
+        scheduler = mock.Mock(stats=mock.Mock(return_value={'batches': 0}))
+        with mock.patch('app.batch_scheduler', scheduler), mock.patch('app.CONVERSATION_HISTORY_LIMIT', 10):
+            self.assertFalse(json.loads(self.client.get('/health').data)['batching']['active'])
+        with mock.patch('app.batch_scheduler', scheduler), mock.patch('app.CONVERSATION_HISTORY_LIMIT', 0):
+            self.assertTrue(json.loads(self.client.get('/health').data)['batching']['active'])
+
+    def test_metrics(self):
+        """Test per-stage and per-endpoint metrics are exposed in Prometheus format"""
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Answer', {})):
+            self.client.post('/api/chat',
+                             data=json.dumps({'message': 'Hello Brian'}),
+                             content_type='application/json')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+
+        text = response.data.decode()
+        self.assertIn('chat_stage_seconds_count{stage="inference"}', text)
+        self.assertIn('db_queries_total{endpoint="chat"}', text)
+        self.assertIn('http_request_seconds_count{endpoint="chat",method="POST",status="200"}', text)
+        self.assertIn('chat_jobs_depth', text)
+
+    def test_failed_statement_does_not_skew_query_timing(self):
+        """Test a statement that raises leaves no start time behind for the next one"""
+        with db.engine.connect() as conn:
+            with self.assertRaises(Exception):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            conn.rollback()
+            with mock.patch('app.DB_QUERY_SECONDS') as query_seconds:
+                conn.exec_driver_sql('SELECT 1')
+            self.assertNotIn('query_started', conn.info)
+
+        elapsed = query_seconds.observe.call_args.args[0]
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertLess(elapsed, 1)
+
+    def test_server_timing_header(self):
+        """Test the optional Server-Timing header lists request stages"""
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Answer', {})), \
+             mock.patch('app.SERVER_TIMING', True):
+            response = self.client.post('/api/chat',
+                                        data=json.dumps({'message': 'Hello Brian'}),
+                                        content_type='application/json')
+
+        timing = response.headers['Server-Timing']
+        for stage in ('history', 'inference', 'persist', 'db', 'total'):
+            self.assertIn(f'{stage};dur=', timing)
 
     # def test_chat_endpoint(self):
     #     """Test basic chat functionality"""
@@ -52,12 +155,258 @@ class TestAllEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 400)
 
+    def test_chat_stream_empty_message(self):
+        """Test streaming chat with empty message"""
+        response = self.client.post('/api/chat/stream',
+                              data=json.dumps({'message': ''}),
+                              content_type='application/json')
+        
+        self.assertEqual(response.status_code, 400)
+
+    def test_chat_invalid_body(self):
+        """Test chat endpoints reject bodies that are not an object with a string message"""
+        for body in ('null', '[1]', '{"message": 42}', 'not json'):
+            for path in ('/api/chat', '/api/chat/stream'):
+                response = self.client.post(path, data=body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, f"{path} {body}")
+                self.assertEqual(json.loads(response.data), {'error': 'Message is required'})
+
+    def test_chat_stream_events(self):
+        """Test streaming chat sends start, token and done events and stores the turn"""
+        class Stream:
+            result = None
+            generation = {'stop_reason': 'sentence', 'new_tokens': 3}
+            
+            def __iter__(self):
+                yield from ['Buy', ' a', ' house.']
+                self.result = 'Buy a house.'
+            
+            def cancel(self):
+                pass
+        
+        with mock.patch('app.stream_ai_response', return_value=Stream()) as ai:
+            response = self.client.post('/api/chat/stream',
+                                  data=json.dumps({'message': 'Test message'}),
+                                  content_type='application/json')
+            body = response.get_data(as_text=True)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = [(event, json.loads(data)) for event, data in
+                  re.findall(r'event: (\w+)\ndata: (.*)\n\n', body)]
+        self.assertEqual([event for event, _ in events], ['start', 'token', 'token', 'token', 'done'])
+        self.assertEqual(ai.call_args.args[0], 'Test message')
+        self.assertEqual(ai.call_args.args[3], events[0][1]['session_id'])
+        self.assertEqual(''.join(data['token'] for event, data in events if event == 'token'), 'Buy a house.')
+        
+        done = events[-1][1]
+        self.assertEqual(done['response'], 'Buy a house.')
+        self.assertEqual(done['session_id'], events[0][1]['session_id'])
+        self.assertEqual(done['generation'], Stream.generation)
+        
+        if app_module.chat_writes is not None:
+            app_module.chat_writes.flush()
+        history = json.loads(self.client.get('/api/history').data)
+        self.assertEqual([(m['message_text'], m['is_user']) for m in history],
+                         [('Test message', True), ('Buy a house.', False)])
+
+    def test_chat_generation_budget(self):
+        """Test the chat endpoint's budget can be tightened per request and its metadata is returned"""
+        generation = {'stop_reason': 'sentence', 'new_tokens': 12}
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Answer', generation)) as ai:
+            response = self.client.post('/api/chat',
+                                        data=json.dumps({'message': 'Hello', 'latency_budget_ms': 250}),
+                                        content_type='application/json')
+        
+        self.assertEqual(json.loads(response.data)['generation'], generation)
+        self.assertEqual(ai.call_args.args[3].latency_ms, 250)
+        
+        response = self.client.post('/api/chat',
+                                    data=json.dumps({'message': 'Hello', 'latency_budget_ms': 'soon'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chat_faq_skips_model(self):
+        """Test a curated FAQ is answered from the answer store without loading the model"""
+        with mock.patch('chat_model.registry.get', side_effect=AssertionError('model called')):
+            response = self.client.post('/api/chat',
+                                        data=json.dumps({'message': 'What is escrow?'}),
+                                        content_type='application/json')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['generation']['stop_reason'], 'faq')
+        self.assertEqual(data['generation']['intent'], 'escrow')
+        self.assertIn('intents', json.loads(self.client.get('/health').data))
+
+    def test_chat_uses_conversation_history(self):
+        """Test earlier turns are passed to the model as context"""
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('First answer', {})) as ai:
+            self.client.post('/api/sessions')
+            self.client.post('/api/chat',
+                             data=json.dumps({'message': 'First question'}),
+                             content_type='application/json')
+            self.client.post('/api/chat',
+                             data=json.dumps({'message': 'Second question'}),
+                             content_type='application/json')
+        
+        history = ai.call_args.args[1]
+        self.assertEqual([m['message_text'] for m in history], ['First question', 'First answer'])
+
+    def test_chat_turn_single_commit(self):
+        """Test a chat turn is written with one commit after generation"""
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Answer', {})), \
+             mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            self.client.post('/api/chat',
+                             data=json.dumps({'message': 'How do I buy a house?'}),
+                             content_type='application/json')
+            commits = commit.call_count
+        
+        # One commit for the whole turn (plus one ending the history read when reads share the writer)
+        self.assertEqual(commits, 1 if app_module.read_engine is not None else 2)
+        session_id = json.loads(self.client.get('/api/history').data)[0]['session_id']
+        chat_session = ChatSession.query.filter_by(session_id=session_id).first()
+        self.assertTrue(chat_session.session_name.startswith('Buying Property'))
+
+    def test_concurrent_first_turns_share_new_session(self):
+        """Test a first turn racing another one that already created its session still stores its messages"""
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        app_module.save_chat_turns([ChatTurn(session_id, 'How do I buy a house?', 'First answer', now, now)])
+        
+        # The second request looked the session up before the first one committed it
+        later = now + timedelta(seconds=1)
+        with mock.patch('app.load_session_info', return_value={}):
+            app_module.save_chat_turns([ChatTurn(session_id, 'Is renting better?', 'Second answer', later, later)])
+        session_activity.flush()
+        
+        self.assertEqual(ChatSession.query.filter_by(session_id=session_id).count(), 1)
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 4)
+        db.session.expire_all()
+        self.assertEqual(ChatSession.query.filter_by(session_id=session_id).one().last_activity, later)
+
+    def test_export_import_round_trip(self):
+        """Test sessions stream out as gzipped NDJSON and import back in batches, skipping existing ones"""
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        flush_chat_turns([ChatTurn(session_id, f'Question {i}', f'Answer {i}', now, now) for i in range(3)])
+        headers = {'Authorization': 'Bearer secret'}
+        
+        with mock.patch('app.ADMIN_TOKEN', 'secret'):
+            self.assertEqual(self.client.get('/api/export').status_code, 403)
+            response = self.client.get('/api/export?gzip=true', headers=headers)
+            self.assertEqual(response.mimetype, 'application/gzip')
+            exported = response.data
+            
+            records = [json.loads(line) for line in gzip.decompress(exported).splitlines()]
+            ours = [r for r in records if r['session_id'] == session_id]
+            self.assertEqual([r['type'] for r in ours], ['session'] + ['message'] * 6)
+            
+            ChatMessage.query.filter_by(session_id=session_id).delete()
+            ChatSession.query.filter_by(session_id=session_id).delete()
+            db.session.commit()
+            
+            with mock.patch('app.IMPORT_BATCH_SIZE', 2):
+                response = self.client.post('/api/import', data=exported, headers=headers)
+        
+        report = json.loads(response.data)
+        self.assertEqual((report['sessions'], report['messages']), (1, 6))
+        self.assertEqual(report['skipped_sessions'], sum(1 for r in records if r['type'] == 'session') - 1)
+        self.assertEqual(report['errors'], 0)
+        self.assertGreater(report['batches'], 1)
+        texts = [m.message_text for m in ChatMessage.query.filter_by(session_id=session_id)
+                 .order_by(ChatMessage.timestamp, ChatMessage.id)]
+        self.assertEqual(texts[:2], ['Question 0', 'Answer 0'])
+        self.assertEqual(len(texts), 6)
+
+    def test_import_batches_split_sessions(self):
+        """Test messages keep their session's import decision across batch boundaries"""
+        existing, new = str(uuid.uuid4()), str(uuid.uuid4())
+        now = datetime.utcnow()
+        flush_chat_turns([ChatTurn(existing, 'Question', 'Answer', now, now)])
+        
+        def session_record(session_id):
+            return {'type': 'session', 'session_id': session_id, 'session_name': 'Imported',
+                    'created_at': now.isoformat(), 'last_activity': now.isoformat()}
+        
+        def message_record(session_id, i):
+            return {'type': 'message', 'session_id': session_id, 'message_text': f'Message {i}',
+                    'is_user': i % 2 == 0, 'timestamp': now.isoformat()}
+        
+        records = ([session_record(existing)] + [message_record(existing, i) for i in range(3)] +
+                   [session_record(new)] + [message_record(new, i) for i in range(5)] +
+                   [session_record(str(uuid.uuid4())), {'type': 'message', 'session_id': existing}, 'not json'])
+        data = '\n'.join(json.dumps(r) if isinstance(r, dict) else r for r in records).encode('utf-8')
+        report = import_chat_data(io.BytesIO(data), batch_size=2)
+        
+        self.assertEqual((report['sessions'], report['messages']), (2, 5))
+        self.assertEqual((report['skipped_sessions'], report['skipped_messages']), (1, 3))
+        self.assertEqual((report['rejected_messages'], report['errors']), (0, 2))
+        self.assertEqual(ChatMessage.query.filter_by(session_id=new).count(), 5)
+        self.assertEqual(ChatMessage.query.filter_by(session_id=existing).count(), 2)
+
+    def test_write_behind_flushes_batched_turns(self):
+        """Test buffered turns are bulk-written on flush and on stop"""
+        buffer = WriteBehindBuffer(flush_chat_turns, max_pending=100, flush_interval=60)
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        for i in range(3):
+            buffer.add(ChatTurn(session_id, f'Question {i}', 'Answer', now, now))
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 0)
+        
+        buffer.stop()
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 6)
+        self.assertEqual(ChatSession.query.filter_by(session_id=session_id).count(), 1)
+        self.assertEqual(buffer.stats()['flushes'], 1)
+
+    def test_chat_job_mode(self):
+        """Test job mode queues the turn and the job can be polled"""
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Queued answer', {})):
+            response = self.client.post('/api/chat',
+                                  data=json.dumps({'message': 'Test message', 'mode': 'job'}),
+                                  content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            job_id = json.loads(response.data)['job_id']
+            
+            response = self.client.get(f'/api/jobs/{job_id}?wait=5')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['result']['response'], 'Queued answer')
+
+    def test_chat_job_queue_full(self):
+        """Test a full job queue is rejected with 429 and Retry-After"""
+        release = threading.Event()
+        started = threading.Event()
+        jobs = ChatJobQueue(workers=1, max_queue_size=1)
+        jobs.submit(lambda: (started.set(), release.wait()))
+        started.wait(5)
+        jobs.submit(release.wait)
+        
+        try:
+            with mock.patch('app.chat_jobs', jobs):
+                response = self.client.post('/api/chat',
+                                      data=json.dumps({'message': 'Test message', 'mode': 'job'}),
+                                      content_type='application/json')
+        finally:
+            release.set()
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_unknown_chat_job(self):
+        """Test polling an unknown job"""
+        response = self.client.get('/api/jobs/does-not-exist')
+        self.assertEqual(response.status_code, 404)
+
     def test_get_chat_history(self):
         """Test getting chat history"""
         # Send a message first
-        self.client.post('/api/chat', 
-                        data=json.dumps({'message': 'Test message'}),
-                        content_type='application/json')
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Test answer', {})):
+            self.client.post('/api/chat', 
+                            data=json.dumps({'message': 'Test message'}),
+                            content_type='application/json')
         
         response = self.client.get('/api/history')
         self.assertEqual(response.status_code, 200)
@@ -66,6 +415,29 @@ class TestAllEndpoints(unittest.TestCase):
         self.assertIsInstance(data, list)
         self.assertGreater(len(data), 0)
 
+    def test_get_chat_history_pages(self):
+        """Test newest-first pagination, since cursors and ETag revalidation"""
+        self.client.post('/api/sessions')
+        with mock.patch('app.get_ai_reply', return_value=ChatReply('Answer', {})):
+            for i in range(3):
+                self.client.post('/api/chat',
+                                 data=json.dumps({'message': f'Question {i}'}),
+                                 content_type='application/json')
+        
+        newest = self.client.get('/api/history?limit=4')
+        texts = [m['message_text'] for m in json.loads(newest.data)]
+        self.assertEqual(texts, ['Question 1', 'Answer', 'Question 2', 'Answer'])
+        
+        older = self.client.get(f"/api/history?limit=4&before={newest.headers['X-Prev-Cursor']}")
+        self.assertEqual([m['message_text'] for m in json.loads(older.data)], ['Question 0', 'Answer'])
+        self.assertNotIn('X-Prev-Cursor', older.headers)
+        
+        since = self.client.get(f"/api/history?since={newest.headers['X-Latest-Cursor']}")
+        self.assertEqual(json.loads(since.data), [])
+        
+        cached = self.client.get('/api/history?limit=4', headers={'If-None-Match': newest.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
     def test_clear_chat_history(self):
         """Test clearing chat history"""
         response = self.client.post('/api/clear-history')
@@ -82,6 +454,73 @@ class TestAllEndpoints(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIsInstance(data, list)
 
+    def test_get_sessions_paginated(self):
+        """Test keyset pagination of the session list"""
+        for _ in range(3):
+            self.client.post('/api/sessions')
+        
+        first = self.client.get('/api/sessions?limit=2')
+        self.assertEqual(len(json.loads(first.data)), 2)
+        cursor = first.headers.get('X-Next-Cursor')
+        self.assertTrue(cursor)
+        
+        second = self.client.get(f'/api/sessions?limit=2&cursor={cursor}')
+        self.assertEqual(second.status_code, 200)
+        first_ids = {s['session_id'] for s in json.loads(first.data)}
+        second_ids = {s['session_id'] for s in json.loads(second.data)}
+        self.assertFalse(first_ids & second_ids)
+        self.assertIn('message_count', json.loads(second.data)[0])
+
+    def test_get_sessions_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get('/api/sessions?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search(self):
+        """Test full-text search ranks, groups, highlights and pages, and follows deletes"""
+        word = f"zq{uuid.uuid4().hex[:8]}"
+        best, other = str(uuid.uuid4()), str(uuid.uuid4())
+        now = datetime.utcnow()
+        flush_chat_turns([
+            ChatTurn(best, f'Is {word} near <b>schools</b>?', f'{word} has great {word} schools', now, now),
+            ChatTurn(other, f'Tell me about {word} prices', 'Prices are rising', now, now)
+        ])
+        
+        response = self.client.get(f'/api/search?q={word.upper()}+schools')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)
+        self.assertEqual([r['session_id'] for r in results], [best])
+        self.assertEqual(results[0]['match_count'], 2)
+        snippets = [m['snippet'] for m in results[0]['messages']]
+        self.assertIn(f'<mark>{word}</mark>', snippets[0])
+        self.assertTrue(any('&lt;b&gt;<mark>schools</mark>&lt;/b&gt;' in snippet for snippet in snippets))
+        
+        first = self.client.get(f'/api/search?q={word}&limit=1')
+        self.assertEqual(json.loads(first.data)[0]['session_id'], best)
+        second = self.client.get(f"/api/search?q={word}&limit=1&cursor={first.headers['X-Next-Cursor']}")
+        self.assertEqual([r['session_id'] for r in json.loads(second.data)], [other])
+        self.assertNotIn('X-Next-Cursor', second.headers)
+        
+        self.client.delete(f'/api/sessions/{best}')
+        results = json.loads(self.client.get(f'/api/search?q={word}').data)
+        self.assertEqual([r['session_id'] for r in results], [other])
+        
+        self.assertEqual(self.client.get('/api/search?q=+"*').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/search?q={word}&cursor=bad').status_code, 400)
+
+    def test_search_index_requires_overrides(self):
+        """Test a search index missing its dialect hooks fails when built, not on first search"""
+        class Incomplete(SearchIndex):
+            HITS_SQL = SqliteSearchIndex.HITS_SQL
+            SNIPPETS_SQL = SqliteSearchIndex.SNIPPETS_SQL
+
+            def install(self, connection):
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+        SqliteSearchIndex()
+
     def test_create_session(self):
         """Test creating new session"""
         response = self.client.post('/api/sessions')
@@ -103,6 +542,21 @@ class TestAllEndpoints(unittest.TestCase):
         # Accept either 200 or redirect status
         self.assertIn(response.status_code, [200, 302])
 
+    def test_switch_session_coalesces_activity(self):
+        """Test switching writes nothing until the coalesced flush, which reorders the session list"""
+        first = json.loads(self.client.post('/api/sessions').data)['session_id']
+        self.client.post('/api/sessions')
+        
+        with mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            for _ in range(3):
+                self.assertEqual(self.client.post(f'/api/sessions/{first}/switch').status_code, 200)
+            self.assertEqual(commit.call_count, 0)
+        self.assertEqual(self.client.post(f'/api/sessions/{uuid.uuid4()}/switch').status_code, 404)
+        
+        session_activity.flush()
+        sessions = json.loads(self.client.get('/api/sessions?limit=1').data)
+        self.assertEqual(sessions[0]['session_id'], first)
+
     def test_delete_session(self):
         """Test deleting a session"""
         # Create session first
@@ -115,6 +569,55 @@ class TestAllEndpoints(unittest.TestCase):
         # Accept either 200 or redirect status
         self.assertIn(response.status_code, [200, 302])
 
+    def test_delete_session_removes_messages(self):
+        """Test a session's messages are deleted with it"""
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        flush_chat_turns([ChatTurn(session_id, 'Question', 'Answer', now, now)])
+        
+        response = self.client.delete(f'/api/sessions/{session_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 0)
+        self.assertEqual(self.client.delete(f'/api/sessions/{session_id}').status_code, 404)
+
+    def test_clear_history_purges_in_background(self):
+        """Test a large clear finishes in chunks on the background purger"""
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        flush_chat_turns([ChatTurn(session_id, f'Question {i}', f'Answer {i}', now, now) for i in range(5)])
+        with self.client.session_transaction() as flask_session:
+            flask_session['session_id'] = session_id
+        
+        with mock.patch('app.PURGE_CHUNK_SIZE', 3):
+            data = json.loads(self.client.post('/api/clear-history').data)
+            self.assertTrue(data['pending'])
+            deadline = time.time() + 5
+            while ChatMessage.query.filter_by(session_id=session_id).count() and time.time() < deadline:
+                db.session.rollback()
+                time.sleep(0.05)
+        
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 0)
+        self.assertGreater(chat_purger.stats()['purge_chunks'], 0)
+
+    def test_retention_archives_inactive_sessions(self):
+        """Test sessions past the retention period move to the archive and can be re-imported"""
+        session_id = str(uuid.uuid4())
+        long_ago = datetime.utcnow() - timedelta(days=4000)
+        flush_chat_turns([ChatTurn(session_id, 'Old question', 'Old answer', long_ago, long_ago)])
+        
+        while archive_chunk(days=3650):
+            pass
+        
+        self.assertIsNone(ChatSession.query.filter_by(session_id=session_id).first())
+        self.assertEqual(ChatMessage.query.filter_by(session_id=session_id).count(), 0)
+        archived = ArchivedSession.query.filter_by(session_id=session_id).one()
+        self.assertEqual(archived.message_count, 2)
+        
+        report = import_chat_data(io.BytesIO(archived.payload))
+        self.assertEqual((report['sessions'], report['messages']), (1, 2))
+        db.session.delete(archived)
+        db.session.commit()
+
     def test_delete_all_sessions(self):
         """Test deleting all sessions"""
         # Create a session first
@@ -124,6 +627,63 @@ class TestAllEndpoints(unittest.TestCase):
         # Accept either 200 or redirect status
         self.assertIn(response.status_code, [200, 302])
 
+    def test_database_response_store(self):
+        """Test the persistent response cache tier"""
+        store = DatabaseResponseStore()
+        store.set('test-key', 'Cached answer')
+        
+        self.assertEqual(store.get('test-key', max_age=60), 'Cached answer')
+        self.assertIsNone(store.get('missing-key', max_age=60))
+
+    def test_response_store_frees_writer_during_generation(self):
+        """Test the persisted response cache lookup does not hold a database connection while generating"""
+        from chat_model import ResponseCache
+        checked_out = []
+        
+        class Model:
+            def get_conversation_reply(self, message, conversation_history, session_key=None, budget=None):
+                checked_out.append(db.engine.pool.checkedout())
+                return ChatReply('Zoning answer', {'stop_reason': 'eos'})
+        
+        cache = ResponseCache(store=DatabaseResponseStore())
+        with mock.patch('chat_model.response_cache', cache), \
+             mock.patch('chat_model.registry.get', return_value=Model()):
+            response = self.client.post('/api/chat',
+                                        data=json.dumps({'message': f'Zoning rules in town {uuid.uuid4()}?'}),
+                                        content_type='application/json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(checked_out, [0])
+
+    def test_database_response_store_is_bounded(self):
+        """Test expired cached responses are deleted and the table is capped at max_rows"""
+        CachedResponse.query.delete()
+        db.session.add(CachedResponse(cache_key='expired', response_text='Old answer',
+                                      created_at=datetime.utcnow() - timedelta(hours=2)))
+        db.session.commit()
+        
+        store = DatabaseResponseStore(max_rows=3, max_age=3600, prune_every=2)
+        for i in range(5):
+            store.set(f'key-{i}', f'Answer {i}')
+            time.sleep(0.001)
+        self.assertIsNone(db.session.get(CachedResponse, 'expired'))
+        self.assertLessEqual(CachedResponse.query.count(), 4)
+        
+        store.prune()
+        self.assertEqual(sorted(row.cache_key for row in CachedResponse.query), ['key-2', 'key-3', 'key-4'])
+
+    def test_sqlite_production_mode(self):
+        """Test WAL mode and the read-only connection pool"""
+        if app_module.read_engine is None:
+            self.skipTest("SQLite production mode is off for this database")
+
+        self.assertEqual(db.session.execute(db.text("PRAGMA journal_mode")).scalar().lower(), 'wal')
+        with app_module.read_engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql("PRAGMA query_only").scalar(), 1)
+            with self.assertRaises(Exception):
+                connection.exec_driver_sql("DELETE FROM chat_sessions")
+
     def test_invalid_endpoint(self):
         """Test 404 for invalid endpoints"""
         response = self.client.get('/invalid-endpoint')
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Write-behind buffer that batches database writes on a background flusher
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Bounded buffer of pending writes, flushed in batches by `flush_func(items)`"""
+
+    def __init__(self, flush_func, max_pending=1000, flush_interval=0.5):
+        self.flush_func = flush_func
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failed_flushes = 0
+        self.dropped_items = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+            self._thread.start()
+
+    def add(self, item):
+        """Queue a write; flushes in the caller's thread when the buffer is full"""
+        with self._lock:
+            self._pending.append(item)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything pending in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._pending)
+                self._pending.clear()
+            if not items:
+                return 0
+
+            try:
+                self.flush_func(items)
+            except Exception as e:
+                logger.error(f"Write-behind flush error: {e}")
+                self.failed_flushes += 1
+                self._requeue(items)
+                return 0
+
+            self.flushes += 1
+            self.flushed_items += len(items)
+            return len(items)
+
+    def _requeue(self, items):
+        """Put a failed batch back in front for the next flush, dropping what no longer fits"""
+        with self._lock:
+            room = max(self.max_pending - len(self._pending), 0)
+            kept = items[:room]
+            self._pending.extendleft(reversed(kept))
+            self.dropped_items += len(items) - len(kept)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'flushes': self.flushes,
+            'flushed_items': self.flushed_items,
+            'failed_flushes': self.failed_flushes,
+            'dropped_items': self.dropped_items
+        }